@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# spi/__init__.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Native (NumPy) implementation of the Summed Point Influence engine. This
+# package does not import arcpy; the ArcGIS raster and feature I/O lives in
+# spi.arcio and is only imported by the toolbox.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+from .costdist import CostSurface, CostWindow, cost_distance, cost_window
+from .influence import InfluenceAccumulator
+from .instrument import Instrumentation
+from .journal import RunJournal, inputs_digest
+from .pipeline import summed_influence
+from .query import query_sites
+
+__version__ = "2.1"
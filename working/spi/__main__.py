@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# spi/__main__.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Entry point for "python -m spi" (see spi/cli.py).
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import sys
+
+from .cli import main
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# archive.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Compact store for the per-feature cost distances of a run, in place of
+# zipping the full-extent intermediate rasters. Each feature is kept as its
+# cost distance window only, quantised (scaled uint16 by default, or
+# float16/float32), byte-plane delta coded and deflated, in one indexed
+# container file:
+#
+#     b"SPIARCH1" | frame | frame | ... | JSON index | footer
+#
+# The footer holds the index offset and length; the index holds the raster
+# shape and georeferencing and, for every feature, its chunk offset, size,
+# window position, fill value, maximum cost distance and quantisation.
+# Each frame is a small header (entry and chunk lengths), the feature's
+# index entry as JSON and then the chunk, so an archive left without its
+# index by a crash can still be read, or appended to, by scanning frames.
+#
+# Chunks are quantised and compressed by a thread pool (zlib releases the
+# GIL) while the run goes on, and written in the order the features were
+# added; any feature can later be read back on its own. A feature added
+# again (e.g. rerun after resuming) replaces its earlier entry.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import collections
+import json
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+from .costdist import CostWindow
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+MAGIC = b"SPIARCH1"
+FOOTER = struct.Struct("<QQ8s")
+FRAME = struct.Struct("<IQ")
+
+# Chunk encodings
+ENCODINGS = ("u16", "f16", "f32")
+DEFAULT_ENCODING = "u16"
+DEFAULT_LEVEL = 6
+
+# Scaled uint16: 0..U16_MAX hold values, U16_NAN is NoData
+U16_MAX = 65534
+U16_NAN = 65535
+
+# Largest finite float16
+F16_MAX = 65504.0
+
+# Default extension of archive files
+ARCHIVE_EXT = ".spia"
+
+
+##############################################################################
+# CLASSES
+##############################################################################
+class ArchiveWriter(object):
+    """
+    Name:     ArchiveWriter
+    Features: Appends per-feature cost distance windows to an archive,
+              compressing them on a thread pool as they arrive
+    """
+    def __init__(self, path, georef=None, encoding=DEFAULT_ENCODING,
+                 level=DEFAULT_LEVEL, threads=None, append=False):
+        """
+        Name:     ArchiveWriter.__init__
+        Inputs:   - str, archive file (path)
+                  - [optional] CostSurface, surface whose georeferencing
+                    is recorded (georef)
+                  - [optional] str, "u16" (scaled to the window's range,
+                    error under range/131068), "f16" (3 significant
+                    digits; windows beyond its range fall back to u16) or
+                    "f32" (encoding)
+                  - [optional] int, deflate level (level)
+                  - [optional] int, compression threads; all CPUs by
+                    default (threads)
+                  - [optional] bool, keep the features of an existing
+                    archive, complete or cut short by a crash, and add to
+                    it; otherwise the file is overwritten (append)
+        """
+        if encoding not in ENCODINGS:
+            raise ValueError("Unknown archive encoding %r (use %s)" % (
+                encoding, ", ".join(ENCODINGS)))
+        self.path = path
+        self.encoding = encoding
+        self.level = int(level)
+        self.index = {"version": 1, "encoding": encoding, "features": []}
+        end = None
+        if append and os.path.isfile(path):
+            index, end = read_index(path)
+            self.index["features"] = index["features"]
+            for key in ("shape", "cell_size", "x_min", "y_max"):
+                if key in index:
+                    self.index[key] = index[key]
+        if georef is not None:
+            self.index.update({
+                "shape": list(georef.shape), "cell_size": georef.cell_size,
+                "x_min": georef.x_min, "y_max": georef.y_max})
+        self._ids = set(_key(e["id"]) for e in self.index["features"])
+        self.raw_bytes = 0
+        self.bytes_written = 0
+        self.threads = threads or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=self.threads)
+        self._pending = collections.deque()
+        if end is None:
+            self._file = open(path, "wb")
+            self._file.write(MAGIC)
+        else:
+            # Drop the old index (or a torn last frame) and carry on
+            self._file = open(path, "r+b")
+            self._file.truncate(end)
+            self._file.seek(end)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, featID, window):
+        """
+        Name:     ArchiveWriter.add
+        Inputs:   - feature ID, int or str (featID)
+                  - CostWindow, the feature's cost distance; its block
+                    must not be changed afterwards (window)
+        Outputs:  None.
+        Features: Queues the window for compression and writes out any
+                  chunks already compressed
+        """
+        self._pending.append((featID, window, self._pool.submit(
+            encode_block, window.block, self.encoding, self.level)))
+        self._drain(block=len(self._pending) > 4*self.threads)
+
+    def add_array(self, featID, cd, fill=numpy.nan):
+        """
+        Name:     ArchiveWriter.add_array
+        Inputs:   - feature ID (featID)
+                  - numpy.ndarray, full-extent cost distance, NaN for
+                    NoData (cd)
+                  - [optional] float, value of the cells beyond the
+                    threshold, cropped away like the area outside a
+                    window (fill)
+        Outputs:  None.
+        """
+        self.add(featID, array_window(cd, fill))
+
+    def _drain(self, block=False):
+        """Writes finished chunks in the order they were added"""
+        while self._pending and (block or self._pending[0][2].done()):
+            featID, window, future = self._pending.popleft()
+            data, meta = future.result()
+            meta.update({
+                "id": _json_id(featID), "bytes": len(data),
+                "row0": int(window.row0), "col0": int(window.col0),
+                "rows": window.block.shape[0],
+                "cols": window.block.shape[1],
+                "fill": _json_float(window.fill),
+                "max_cost_dist": float(window.max_cost_dist)})
+            if "shape" not in self.index:
+                self.index["shape"] = list(window.shape)
+            head = json.dumps(dict(
+                meta, shape=self.index["shape"])).encode("utf-8")
+            frame = FRAME.pack(len(head), len(data))
+            meta["offset"] = self._file.tell() + len(frame) + len(head)
+            self._file.write(frame)
+            self._file.write(head)
+            self._file.write(data)
+
+            key = _key(featID)
+            if key in self._ids:
+                self.index["features"] = [
+                    e for e in self.index["features"]
+                    if _key(e["id"]) != key]
+            self._ids.add(key)
+            self.index["features"].append(meta)
+            self.raw_bytes += window.block.size*8
+            self.bytes_written += len(frame) + len(head) + len(data)
+            block = block and len(self._pending) > 4*self.threads
+
+    def flush(self):
+        """
+        Name:     ArchiveWriter.flush
+        Inputs:   None.
+        Outputs:  None.
+        Features: Waits for the queued chunks and writes them out; they
+                  can be recovered even if the index is never written
+        """
+        while self._pending:
+            self._drain(block=True)
+        self._file.flush()
+
+    def close(self):
+        """
+        Name:     ArchiveWriter.close
+        Inputs:   None.
+        Outputs:  None.
+        Features: Waits for the remaining chunks and writes the index
+        """
+        if self._file is None:
+            return
+        self.flush()
+        self._pool.shutdown()
+        self.index.setdefault("shape", [0, 0])
+        offset = self._file.tell()
+        data = json.dumps(self.index).encode("utf-8")
+        self._file.write(data)
+        self._file.write(FOOTER.pack(offset, len(data), MAGIC))
+        self.bytes_written += len(MAGIC) + len(data) + FOOTER.size
+        self._file.close()
+        self._file = None
+
+
+class ArchiveReader(object):
+    """
+    Name:     ArchiveReader
+    Features: Random access to the features of an archive
+    """
+    def __init__(self, path):
+        """
+        Name:     ArchiveReader.__init__
+        Inputs:   str, archive file (path)
+        Features: An archive without its index (the run crashed) is read
+                  by scanning its frames; complete is then False
+        """
+        self.path = path
+        self.index, _ = read_index(path)
+        self.complete = self.index.pop("complete")
+        self.shape = tuple(self.index.get("shape") or (0, 0))
+        self._entries = collections.OrderedDict(
+            (_key(e["id"]), e) for e in self.index["features"])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, featID):
+        return _key(featID) in self._entries
+
+    def ids(self):
+        """Feature IDs in the order they were archived"""
+        return [e["id"] for e in self._entries.values()]
+
+    def info(self, featID):
+        """Index entry of a feature"""
+        return self._entries[_key(featID)]
+
+    def window(self, featID):
+        """
+        Name:     ArchiveReader.window
+        Inputs:   feature ID (featID)
+        Outputs:  CostWindow, the feature's dequantised cost distance
+        """
+        e = self.info(featID)
+        with open(self.path, "rb") as f:
+            f.seek(e["offset"])
+            data = f.read(e["bytes"])
+        block = decode_block(data, e)
+        fill = numpy.nan if e["fill"] is None else e["fill"]
+        return CostWindow(e["row0"], e["col0"], block, fill,
+                          e["max_cost_dist"], self.shape)
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def _key(featID):
+    """Hashable, JSON-stable form of a feature ID"""
+    return json.dumps(_json_id(featID))
+
+
+def _json_id(featID):
+    """Feature ID as a JSON value"""
+    if isinstance(featID, numpy.generic):
+        return featID.item()
+    return featID
+
+
+def _json_float(value):
+    """Float as a JSON value, None for NaN"""
+    return None if numpy.isnan(value) else float(value)
+
+
+def read_index(path):
+    """
+    Name:     read_index
+    Inputs:   str, archive file (path)
+    Outputs:  tuple, (index dict with "complete" set, end of the last
+              whole frame)
+    Features: Reads the index at the end of the file; if there is none,
+              rebuilds it from the frames, stopping at a torn one
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not an SPI archive: %s" % path)
+        size = f.seek(0, os.SEEK_END)
+        if size >= len(MAGIC) + FOOTER.size:
+            f.seek(-FOOTER.size, os.SEEK_END)
+            offset, length, magic = FOOTER.unpack(f.read(FOOTER.size))
+            if magic == MAGIC and offset + length + FOOTER.size == size:
+                f.seek(offset)
+                index = json.loads(f.read(length).decode("utf-8"))
+                index["complete"] = True
+                return index, offset
+
+        # No index: scan the frames; a later frame for the same feature
+        # replaces an earlier one
+        entries = collections.OrderedDict()
+        shape = None
+        end = len(MAGIC)
+        f.seek(end)
+        while True:
+            frame = f.read(FRAME.size)
+            if len(frame) < FRAME.size:
+                break
+            head_len, data_len = FRAME.unpack(frame)
+            if end + FRAME.size + head_len + data_len > size:
+                break
+            try:
+                meta = json.loads(f.read(head_len).decode("utf-8"))
+            except ValueError:
+                break
+            shape = meta.pop("shape", shape)
+            meta["offset"] = end + FRAME.size + head_len
+            key = _key(meta["id"])
+            entries.pop(key, None)
+            entries[key] = meta
+            end = meta["offset"] + data_len
+            f.seek(end)
+    index = {"version": 1, "features": list(entries.values()),
+             "complete": False}
+    if shape is not None:
+        index["shape"] = shape
+    return index, end
+
+
+def array_window(cd, fill=numpy.nan):
+    """
+    Name:     array_window
+    Inputs:   - numpy.ndarray, full-extent cost distance, NaN for NoData
+                (cd)
+              - [optional] float, value of the cells beyond the threshold
+                (fill)
+    Outputs:  CostWindow, cropped to the cells holding anything but NaN
+              or the fill value
+    """
+    inside = ~numpy.isnan(cd)
+    if not numpy.isnan(fill):
+        inside &= cd != fill
+    rows = numpy.flatnonzero(inside.any(axis=1))
+    cols = numpy.flatnonzero(inside.any(axis=0))
+    cd_max = float(numpy.nanmax(cd)) if (~numpy.isnan(cd)).any() else 0.0
+    if not rows.size:
+        return CostWindow(0, 0, cd[:0, :0], fill, cd_max, cd.shape)
+    block = cd[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    return CostWindow(rows[0], cols[0], block, fill, cd_max, cd.shape)
+
+
+def _delta_planes(q):
+    """
+    Name:     _delta_planes
+    Inputs:   numpy.ndarray, 2D little-endian values (q)
+    Outputs:  bytes, each row's bytes regrouped most significant first and
+              differenced bytewise, which turns the smooth cost distance
+              surfaces into long runs for deflate
+    """
+    rows, cols = q.shape
+    size = q.dtype.itemsize
+    planes = q.view(numpy.uint8).reshape(rows, cols, size)[:, :, ::-1]
+    planes = numpy.ascontiguousarray(
+        planes.transpose(0, 2, 1)).reshape(rows, size*cols)
+    out = planes.copy()
+    out[:, 1:] -= planes[:, :-1]
+    return out.tobytes()
+
+
+def _undelta_planes(raw, shape, dtype):
+    """
+    Name:     _undelta_planes
+    Inputs:   - bytes, output of _delta_planes (raw)
+              - tuple, (rows, columns) (shape)
+              - str, value dtype (dtype)
+    Outputs:  numpy.ndarray, the original values
+    """
+    rows, cols = shape
+    size = numpy.dtype(dtype).itemsize
+    planes = numpy.frombuffer(raw, dtype=numpy.uint8).reshape(
+        rows, size*cols)
+    planes = numpy.cumsum(planes, axis=1, dtype=numpy.uint8)
+    values = planes.reshape(rows, size, cols).transpose(0, 2, 1)[:, :, ::-1]
+    return numpy.ascontiguousarray(values).view(dtype).reshape(shape)
+
+
+def encode_block(block, encoding=DEFAULT_ENCODING, level=DEFAULT_LEVEL):
+    """
+    Name:     encode_block
+    Inputs:   - numpy.ndarray, cost distances with NaN for NoData (block)
+              - [optional] str, "u16", "f16" or "f32" (encoding)
+              - [optional] int, deflate level (level)
+    Outputs:  tuple, (compressed bytes, dict of the encoding parameters)
+    """
+    finite = numpy.isfinite(block)
+    lo = float(block[finite].min()) if finite.any() else 0.0
+    hi = float(block[finite].max()) if finite.any() else 0.0
+    if encoding == "f16" and max(abs(lo), abs(hi)) > F16_MAX:
+        encoding = "u16"
+    meta = {"encoding": encoding}
+    if encoding == "u16":
+        scale = (hi - lo)/U16_MAX if hi > lo else 1.0
+        q = numpy.rint((numpy.where(finite, block, lo) - lo)/scale)
+        q = q.astype("<u2")
+        q[~finite] = U16_NAN
+        meta.update({"min": lo, "scale": scale})
+    elif encoding == "f16":
+        q = block.astype("<f2")
+    else:
+        q = block.astype("<f4")
+    return zlib.compress(_delta_planes(q), level), meta
+
+
+def decode_block(data, entry):
+    """
+    Name:     decode_block
+    Inputs:   - bytes, compressed chunk (data)
+              - dict, the chunk's index entry (entry)
+    Outputs:  numpy.ndarray, float64 cost distances with NaN for NoData
+    """
+    shape = (entry["rows"], entry["cols"])
+    encoding = entry["encoding"]
+    dtype = {"u16": "<u2", "f16": "<f2", "f32": "<f4"}[encoding]
+    q = _undelta_planes(zlib.decompress(data), shape, dtype)
+    if encoding == "u16":
+        block = entry["min"] + q*entry["scale"]
+        block[q == U16_NAN] = numpy.nan
+        return block
+    return q.astype(numpy.float64)
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# arcio.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# ArcGIS raster and feature I/O for the native SPI engine. This is the only
+# module in the package that imports arcpy.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import os
+
+import arcpy
+import numpy
+
+from . import output
+from . import rasterize
+from . import raster as spi_raster
+from .costdist import CostSurface
+from .query import site_fields, write_site_table
+from .validate import point_cells
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+# NoData value used when writing float arrays back to rasters
+OUT_NODATA = spi_raster.OUT_NODATA
+
+# Output extensions written directly by the engine (memory-mapped ENVI
+# rasters and tiled GeoTIFFs with statistics and overviews)
+ENVI_EXTS = spi_raster.ENVI_EXTS
+TIFF_EXTS = output.TIFF_EXTS
+
+# Rows read at a time when sampling cells of a CostGrid
+GRID_BLOCK_ROWS = 256
+
+
+##############################################################################
+# CLASSES
+##############################################################################
+class CostGrid(CostSurface):
+    """
+    Name:     CostGrid
+    Features: The grid of a cost raster (shape, cell size and corner)
+              without its cell values, for rasterising and validating
+              features when the run itself does not need the surface (the
+              ArcGIS engine); cell_values reads only the blocks of rows
+              that hold the requested cells
+    """
+    def __init__(self, raster):
+        """
+        Name:     CostGrid.__init__
+        Inputs:   str, path or layer name of the cost raster (raster)
+        """
+        ras = arcpy.Raster(raster)
+        self.raster = arcpy.sa.Float(ras)
+        self.values = None
+        self._shape = (int(ras.height), int(ras.width))
+        self.cell_size = float(ras.meanCellWidth)
+        self.x_min = float(ras.extent.XMin)
+        self.y_max = float(ras.extent.YMax)
+        self.nodata = None
+        self.spatial_ref = spatial_ref_wkt(raster)
+        self.epsg = spatial_ref_epsg(raster)
+        self._passable_count = None
+        self._digest = None
+
+    @property
+    def shape(self):
+        """Raster shape as (rows, columns)"""
+        return self._shape
+
+    @property
+    def size(self):
+        """Number of cells in the raster"""
+        return self._shape[0]*self._shape[1]
+
+    def cell_values(self, idx):
+        """
+        Name:     CostGrid.cell_values
+        Inputs:   numpy.ndarray, flat cell indexes (idx)
+        Outputs:  numpy.ndarray, the cost values of those cells, NaN for
+                  NoData
+        """
+        nrows, ncols = self._shape
+        idx = numpy.asarray(idx, dtype=numpy.int64)
+        out = numpy.full(idx.shape, numpy.nan)
+        rows = idx//ncols
+        for start in numpy.unique(rows//GRID_BLOCK_ROWS)*GRID_BLOCK_ROWS:
+            count = min(GRID_BLOCK_ROWS, nrows - start)
+            lower_left = arcpy.Point(
+                self.x_min, self.y_max - (start + count)*self.cell_size)
+            block = arcpy.RasterToNumPyArray(
+                self.raster, lower_left, ncols, count,
+                nodata_to_value=numpy.nan).astype(numpy.float64)
+            inside = (rows >= start) & (rows < start + count)
+            out[inside] = block.reshape(-1)[idx[inside] - start*ncols]
+        return out
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def spatial_ref_wkt(dataset):
+    """
+    Name:     spatial_ref_wkt
+    Inputs:   str, path or layer name of a raster or feature class
+              (dataset)
+    Outputs:  str, the dataset's coordinate system as WKT, or None if it
+              has none
+    """
+    sr = arcpy.Describe(dataset).spatialReference
+    if sr is None or not sr.name or sr.name == "Unknown":
+        return None
+    # exportToString appends the XY/Z/M domains after semicolons
+    return sr.exportToString().split(";")[0]
+
+
+def spatial_ref_epsg(dataset):
+    """
+    Name:     spatial_ref_epsg
+    Inputs:   str, path or layer name of a raster or feature class
+              (dataset)
+    Outputs:  int, EPSG (factory) code of the dataset's coordinate system,
+              or None for a custom or missing one
+    """
+    sr = arcpy.Describe(dataset).spatialReference
+    code = getattr(sr, "factoryCode", 0) if sr is not None else 0
+    return int(code) if code else None
+
+
+def define_projection(path, surface):
+    """
+    Name:     define_projection
+    Inputs:   - str, raster written by arcpy (path)
+              - CostSurface, surface whose coordinate system the raster
+                takes (surface)
+    Outputs:  None.
+    """
+    if not surface.spatial_ref:
+        return
+    sr = arcpy.SpatialReference()
+    sr.loadFromString(surface.spatial_ref)
+    arcpy.management.DefineProjection(path, sr)
+
+
+def load_cost_surface(raster):
+    """
+    Name:     load_cost_surface
+    Inputs:   str, path or layer name of the cost raster (raster)
+    Outputs:  CostSurface
+    Features: Reads the cost raster once into a float array with NoData
+              converted to NaN; ENVI rasters are memory-mapped instead.
+              The raster's coordinate system is kept for the outputs
+    """
+    path = arcpy.Describe(raster).catalogPath
+    if path and spi_raster.is_envi(path):
+        surface = spi_raster.read_envi(path)
+        if surface.spatial_ref is None:
+            surface.spatial_ref = spatial_ref_wkt(raster)
+        surface.epsg = surface.epsg or spatial_ref_epsg(raster)
+        return surface
+    ras = arcpy.Raster(raster)
+    values = arcpy.RasterToNumPyArray(
+        arcpy.sa.Float(ras), nodata_to_value=numpy.nan)
+    return CostSurface(
+        values, ras.meanCellWidth, ras.extent.XMin, ras.extent.YMax,
+        spatial_ref=spatial_ref_wkt(raster), epsg=spatial_ref_epsg(raster))
+
+
+def save_array(array, surface, out_path, integer=False):
+    """
+    Name:     save_array
+    Inputs:   - numpy.ndarray, 2D values with NaN for NoData (array)
+              - CostSurface, surface providing the georeferencing (surface)
+              - str, output raster path (out_path)
+              - [optional] bool, write an integer raster (integer)
+    Outputs:  None.
+    Features: Writes a float array aligned to the cost surface to a
+              raster in the cost surface's coordinate system
+    """
+    values = numpy.where(numpy.isnan(array), OUT_NODATA, array)
+    if integer:
+        values = values.astype(numpy.int32)
+    lower_left = arcpy.Point(surface.x_min, surface.y_min)
+    ras = arcpy.NumPyArrayToRaster(
+        values, lower_left, surface.cell_size, surface.cell_size,
+        OUT_NODATA)
+    ras.save(out_path)
+    # NumPyArrayToRaster only knows the corner and cell size
+    define_projection(out_path, surface)
+
+
+def save_result(acc, surface, out_path, names=None, integer=False):
+    """
+    Name:     save_result
+    Inputs:   - InfluenceAccumulator, finished accumulator (acc)
+              - CostSurface, surface providing the georeferencing (surface)
+              - str, output raster path (out_path)
+              - [optional] list, scenario names (names)
+              - [optional] bool, round to integers (integer)
+    Outputs:  list, paths of the rasters written
+    Features: Writes the SPI surface; ENVI (.dat, .bsq, .bin) and GeoTIFF
+              (.tif, .tiff) outputs are streamed a block of rows at a time
+              with statistics (and GeoTIFF overviews) gathered on the way
+              and hold one band per scenario, other formats get one raster
+              per scenario named <output>_<scenario>; all are written in
+              the cost surface's coordinate system
+    """
+    base, ext = os.path.splitext(out_path)
+    if acc.scenarios and not names:
+        names = ["s%d" % (k + 1) for k in range(acc.scenarios)]
+    if ext.lower() in ENVI_EXTS + TIFF_EXTS:
+        return output.save_result(acc, surface, out_path, names, integer)
+
+    result = acc.result(surface)
+    if integer:
+        result = numpy.where(
+            numpy.isnan(result), numpy.nan, numpy.trunc(result + 0.5))
+    if not acc.scenarios:
+        save_array(result, surface, out_path, integer)
+        return [out_path]
+    paths = []
+    for name, band in zip(names, result):
+        path = "%s_%s%s" % (base, name, ext)
+        save_array(band, surface, path, integer)
+        paths.append(path)
+    return paths
+
+
+def geometry_cells(surface, geom):
+    """
+    Name:     geometry_cells
+    Inputs:   - CostSurface, cost raster (surface)
+              - arcpy.Geometry, feature shape (geom)
+    Outputs:  numpy.ndarray, flat indexes of the cells the feature covers
+    """
+    if geom is None:
+        return numpy.empty(0, dtype=numpy.int64)
+    if geom.type == "point":
+        idx = surface.cell_index(geom.firstPoint.X, geom.firstPoint.Y)
+        return numpy.array([idx] if idx >= 0 else [], dtype=numpy.int64)
+    if geom.type == "multipoint":
+        xy = numpy.array([(p.X, p.Y) for p in geom]).reshape(-1, 2)
+        idx = point_cells(surface, xy[:, 0], xy[:, 1])
+        return numpy.unique(idx[idx >= 0])
+
+    # Parts are arrays of points; None separates a polygon's rings
+    rings = []
+    for part in geom:
+        ring = []
+        for pt in part:
+            if pt is None:
+                rings.append(ring)
+                ring = []
+            else:
+                ring.append((pt.X, pt.Y))
+        rings.append(ring)
+    if geom.type == "polygon":
+        return rasterize.polygon_cells(surface, rings)
+    return rasterize.line_cells(surface, rings)
+
+
+def read_feature_seeds(surface, feats, oid_field, weight_field=None,
+                       seeds_dir=None):
+    """
+    Name:     read_feature_seeds
+    Inputs:   - CostSurface, cost raster (surface)
+              - str, feature class or layer (feats)
+              - str, object ID field name (oid_field)
+              - [optional] str or list, weight field name, or a list of
+                names for one weighting scenario each (weight_field)
+              - [optional] str, folder where rasterised seeds are kept for
+                reuse across runs (seeds_dir)
+    Outputs:  list, (object ID, [flat cell index], weight) tuples; the
+              weight is a list when several weight fields are given
+    Features: Seeds points from the cell under them, polygons from every
+              cell whose centre they contain and lines from every cell
+              they cross; weights default to 1 and are NaN where null
+    """
+    fields = [oid_field, "SHAPE@"]
+    multi = isinstance(weight_field, (list, tuple))
+    if multi:
+        fields.extend(weight_field)
+    elif weight_field:
+        fields.append(weight_field)
+
+    ids = []
+    geoms = []
+    weights = []
+    with arcpy.da.SearchCursor(feats, fields) as cursor:
+        for row in cursor:
+            ids.append(row[0])
+            geoms.append(row[1])
+            # Null weights become NaN, reported by validation
+            values = [numpy.nan if w is None else float(w)
+                      for w in row[2:]]
+            if multi:
+                weights.append(values)
+            else:
+                weights.append(values[0] if weight_field else 1.0)
+
+    # Rasterise once per grid and geometry set
+    seeds = None
+    if seeds_dir:
+        if not os.path.isdir(seeds_dir):
+            os.makedirs(seeds_dir)
+        key = rasterize.seeds_key(surface, b"".join(
+            bytes(g.WKB) if g is not None else b"" for g in geoms))
+        seeds_path = os.path.join(seeds_dir, "seeds_%s.npz" % key)
+        if os.path.isfile(seeds_path):
+            seed_ids, seeds = rasterize.load_seeds(seeds_path)
+            if seed_ids != ids:
+                seeds = None
+    if seeds is None:
+        seeds = [geometry_cells(surface, g) for g in geoms]
+        if seeds_dir:
+            rasterize.save_seeds(seeds_path, ids, seeds)
+    return list(zip(ids, seeds, weights))
+
+
+def read_site_cells(surface, sites, id_field):
+    """
+    Name:     read_site_cells
+    Inputs:   - CostSurface, cost raster (surface)
+              - str, site feature class or layer (sites)
+              - str, site ID field name (id_field)
+    Outputs:  list, (site ID, flat cell index) pairs, -1 for sites off the
+              raster
+    Features: Sites are points; lines and polygons are sited at their
+              centroid
+    """
+    with arcpy.da.SearchCursor(sites, [id_field, "SHAPE@XY"]) as cursor:
+        rows = [(row[0], row[1]) for row in cursor]
+    return [(siteID, -1 if xy is None or xy[0] is None else
+             surface.cell_index(xy[0], xy[1])) for siteID, xy in rows]
+
+
+def save_site_table(out_path, sites, values, names=None):
+    """
+    Name:     save_site_table
+    Inputs:   - str, output table; .csv is written directly (out_path)
+              - list, (site ID, flat cell index) pairs (sites)
+              - numpy.ndarray, SPI per site from query_sites (values)
+              - [optional] list, scenario names (names)
+    Outputs:  None.
+    Features: Writes one row per site, with NoData sites as nulls (NaN)
+    """
+    if os.path.splitext(out_path)[1].lower() == ".csv":
+        write_site_table(out_path, sites, values, names)
+        return
+    ids = [siteID for siteID, _ in sites]
+    fields = site_fields(names)
+    values = numpy.asarray(values, dtype=numpy.float64).reshape(
+        len(sites), -1)
+    if all(isinstance(i, (int, numpy.integer)) for i in ids):
+        id_type = numpy.int64
+    else:
+        id_type = "U%d" % max([len(str(i)) for i in ids] + [1])
+    table = numpy.empty(len(ids), dtype=[("site", id_type)] + [
+        (name, numpy.float64) for name in fields])
+    table["site"] = ids
+    for k, name in enumerate(fields):
+        table[name] = values[:, k]
+    if arcpy.Exists(out_path):
+        arcpy.Delete_management(out_path)
+    arcpy.da.NumPyArrayToTable(table, out_path)
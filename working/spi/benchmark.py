@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# benchmark.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Reproducible SPI benchmark suite. Generates synthetic cost surfaces
+# (uniform, fractal and barrier-heavy terrain) and point or polygon feature
+# sets, runs the native engine through the same stages MYARCPYSPI.execute
+# runs (cost prep, calcCost, calcInfluence, summation, cleanup) and reports
+# wall time, memory and bytes written per stage as JSON.
+#
+# The heap engine runs calcCost and calcInfluence as two passes, as the
+# toolbox's non-streaming path does: calcCost writes every feature's cost
+# distance window to the work directory and calcInfluence reads them back
+# into the running sum, so each stage has its own time, memory and I/O.
+# The parallel and sweep engines fuse the two, so they report one
+# "features" stage instead. Memory per stage is the stage's own
+# high-water mark of this process (Linux, by resetting the kernel's peak
+# RSS before each stage; worker processes are not included) and the change
+# in resident memory over the stage; the process-wide peak so far is given
+# alongside. Bytes read and written are the process's I/O counters over
+# the stage (Linux); elsewhere bytes written falls back to the growth of
+# the work directory.
+#
+# -----
+# USAGE
+# -----
+#   python -m spi.benchmark --quick
+#   python -m spi.benchmark --quick --engine sweep
+#   python -m spi.benchmark --sizes 1000 5000 --terrains fractal \
+#       --features 10 100 1000 --kinds point polygon --caps 0 50 -o out.json
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy
+
+from . import raster
+from .costdist import CostSurface, CostWindow, cost_window
+from .influence import InfluenceAccumulator
+from .instrument import Instrumentation, io_counters
+from .pipeline import summed_influence
+from .rasterize import polygon_cells
+from .sweep import sweep_influence
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+TERRAINS = ("uniform", "fractal", "barriers")
+KINDS = ("point", "polygon")
+ENGINES = ("heap", "parallel", "sweep")
+
+# Linux memory counters: VmRSS/VmHWM, and writing "5" to clear_refs resets
+# VmHWM to the current RSS
+PROC_STATUS = "/proc/self/status"
+PROC_CLEAR_REFS = "/proc/self/clear_refs"
+
+# Full matrix: 1k^2 to 10k^2 cells and 10 to 5000 features; caps are given
+# in cells of median cost (0 is uncapped)
+DEFAULT_SIZES = (1000, 2000, 5000, 10000)
+DEFAULT_FEATURES = (10, 100, 1000, 5000)
+DEFAULT_CAPS = (0, 50)
+
+# Small matrix for a smoke run
+QUICK = dict(sizes=(64, 128), terrains=TERRAINS, features=(5, 20),
+             kinds=KINDS, caps=(0, 10))
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def synthetic_cost(size, terrain, seed=0):
+    """
+    Name:     synthetic_cost
+    Inputs:   - int, raster rows and columns (size)
+              - str, "uniform", "fractal" or "barriers" (terrain)
+              - [optional] int, random seed (seed)
+    Outputs:  numpy.ndarray, float32 cost surface with costs in [1, 100]
+              and NaN for NoData
+    Features: Fractal terrain is 1/f noise from spectral synthesis;
+              barrier terrain adds NoData walls with gaps and high-cost
+              ridges to fractal terrain
+    """
+    rng = numpy.random.default_rng(seed)
+    if terrain == "uniform":
+        return numpy.full((size, size), 10.0, dtype=numpy.float32)
+    if terrain not in TERRAINS:
+        raise ValueError("Unknown terrain: %s" % terrain)
+
+    noise = rng.standard_normal((size, size)).astype(numpy.float32)
+    spec = numpy.fft.rfft2(noise)
+    fy = numpy.fft.fftfreq(size)[:, None]
+    fx = numpy.fft.rfftfreq(size)[None, :]
+    freq = numpy.hypot(fx, fy)
+    freq[0, 0] = 1.0
+    spec /= freq**1.5
+    field = numpy.fft.irfft2(spec, s=(size, size)).astype(numpy.float32)
+    field -= field.min()
+    field /= max(float(field.max()), 1e-12)
+    cost = 1.0 + 99.0*field**2
+
+    if terrain == "barriers":
+        walls = max(2, size//100)
+        for _ in range(walls):
+            pos = int(rng.integers(0, size))
+            gap = int(rng.integers(0, size))
+            width = max(1, size//50)
+            if rng.random() < 0.5:
+                cost[pos, :] = numpy.nan
+                cost[pos, gap:gap + width] = 50.0
+            else:
+                cost[:, pos] = numpy.nan
+                cost[gap:gap + width, pos] = 50.0
+        ridges = rng.integers(0, size, walls)
+        cost[ridges, :] = numpy.fmax(cost[ridges, :], 100.0)
+    return cost.astype(numpy.float32)
+
+
+def synthetic_features(surface, count, kind, seed=0):
+    """
+    Name:     synthetic_features
+    Inputs:   - CostSurface, cost raster (surface)
+              - int, number of features (count)
+              - str, "point" or "polygon" (kind)
+              - [optional] int, random seed (seed)
+    Outputs:  list, (feature ID, [flat cell index], weight) tuples
+    Features: Places features on random passable cells; polygons are
+              squares of 1 to 10 cells a side, rasterised as the tool does
+    """
+    rng = numpy.random.default_rng(seed + 1)
+    nrows, ncols = surface.shape
+    passable = numpy.flatnonzero(surface.passable())
+    picks = rng.choice(passable, size=count, replace=count > passable.size)
+    features = []
+    for fid, idx in enumerate(picks):
+        weight = float(rng.integers(1, 500))
+        if kind == "point":
+            features.append((fid, [int(idx)], weight))
+            continue
+        row, col = divmod(int(idx), ncols)
+        half = 0.5*surface.cell_size*int(rng.integers(1, 11))
+        xc = surface.x_min + (col + 0.5)*surface.cell_size
+        yc = surface.y_max - (row + 0.5)*surface.cell_size
+        ring = [(xc - half, yc + half), (xc + half, yc + half),
+                (xc + half, yc - half), (xc - half, yc - half)]
+        features.append((fid, polygon_cells(surface, [ring]), weight))
+    return features
+
+
+def process_peak_rss():
+    """
+    Name:     process_peak_rss
+    Inputs:   None.
+    Outputs:  int, peak resident set size of this process since it started
+              in bytes (not since the last reset_peak_rss), None if
+              unknown
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss*1024
+
+
+def rss_status():
+    """
+    Name:     rss_status
+    Inputs:   None.
+    Outputs:  dict, current ("rss") and high-water ("hwm") resident set
+              size in bytes, or None where the OS does not report them
+    """
+    try:
+        with open(PROC_STATUS) as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return {"rss": int(fields["VmRSS"].split()[0])*1024,
+                "hwm": int(fields["VmHWM"].split()[0])*1024}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def reset_peak_rss():
+    """
+    Name:     reset_peak_rss
+    Inputs:   None.
+    Outputs:  bool, whether the high-water mark was reset to the current
+              RSS (Linux 4.0+)
+    """
+    try:
+        with open(PROC_CLEAR_REFS, "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class StageMemory(object):
+    """
+    Name:     StageMemory
+    Features: Memory and I/O of one stage: resets the high-water mark and
+              reads the I/O counters when the stage starts, and reads them
+              again, with the RSS change, at its end
+    """
+    def __init__(self, work=None):
+        """
+        Name:     StageMemory.__init__
+        Inputs:   [optional] str, work directory whose growth stands in
+                  for bytes written where there are no I/O counters (work)
+        """
+        self.work = work
+        self.reset = reset_peak_rss()
+        self.start = rss_status()
+        self.io = io_counters()
+        self.files = None
+        if self.io is None and work is not None:
+            self.files = dir_bytes(work)
+
+    def metrics(self):
+        """
+        Name:     StageMemory.metrics
+        Inputs:   None.
+        Outputs:  dict, stage_peak_rss (None where it cannot be isolated),
+                  rss_delta and process_peak_rss, and bytes_read and
+                  bytes_written (None where unknown), in bytes
+        """
+        end = rss_status()
+        peak = delta = None
+        if end is not None and self.start is not None:
+            delta = end["rss"] - self.start["rss"]
+            if self.reset:
+                peak = end["hwm"]
+        read = written = None
+        io = io_counters()
+        if self.io is not None and io is not None:
+            read = io["bytes_read"] - self.io["bytes_read"]
+            written = io["bytes_written"] - self.io["bytes_written"]
+        elif self.files is not None and os.path.isdir(self.work):
+            written = max(0, dir_bytes(self.work) - self.files)
+        return {"stage_peak_rss": peak, "rss_delta": delta,
+                "process_peak_rss": process_peak_rss(),
+                "bytes_read": read, "bytes_written": written}
+
+
+def dir_bytes(path):
+    """Total size in bytes of the files under path"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def save_window(path, window):
+    """Writes a CostWindow to an .npz file"""
+    numpy.savez(path, block=window.block, meta=numpy.array(
+        [window.row0, window.col0, window.fill, window.max_cost_dist]))
+
+
+def load_window(path, shape):
+    """CostWindow written by save_window, for a raster of this shape"""
+    with numpy.load(path) as f:
+        row0, col0, fill, max_cost_dist = f["meta"].tolist()
+        return CostWindow(row0, col0, f["block"], fill, max_cost_dist, shape)
+
+
+def run_case(size, terrain, count, kind, cap_cells, seed=0, work_dir=None,
+             engine="heap", workers=None, sweep_bytes=None):
+    """
+    Name:     run_case
+    Inputs:   - int, raster rows and columns (size)
+              - str, terrain type (terrain)
+              - int, number of features (count)
+              - str, feature kind (kind)
+              - float, cost cap in cells of median cost, 0 for none
+                (cap_cells)
+              - [optional] int, random seed (seed)
+              - [optional] str, parent folder for the work directory
+                (work_dir)
+              - [optional] str, "heap", "parallel" or "sweep" (engine)
+              - [optional] int, worker processes for the parallel engine;
+                all CPUs by default (workers)
+              - [optional] int, sweep batch memory budget in bytes
+                (sweep_bytes)
+    Outputs:  dict, case description and per-stage metrics
+    Features: Runs one SPI job stage by stage, as MYARCPYSPI.execute does
+    """
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine: %s" % engine)
+    stages = {}
+    work = tempfile.mkdtemp(prefix="spibench", dir=work_dir)
+
+    def record(name, seconds, memory):
+        stages[name] = {"wall_s": round(seconds, 6)}
+        stages[name].update(memory.metrics())
+
+    # Cost prep: write the surface and open it memory-mapped
+    values = synthetic_cost(size, terrain, seed)
+    memory = StageMemory(work)
+    t0 = time.perf_counter()
+    cost_path = os.path.join(work, "cost.dat")
+    raster.write_envi(cost_path, values,
+                      CostSurface(values, 30.0, 0.0, size*30.0))
+    surface = raster.read_envi(cost_path)
+    del values
+    record("cost_prep", time.perf_counter() - t0, memory)
+
+    max_cost = None
+    if cap_cells:
+        finite = surface.values[surface.passable()]
+        max_cost = float(cap_cells*numpy.median(finite))
+    features = synthetic_features(surface, count, kind, seed)
+
+    weighted = raster.create_envi(os.path.join(work, "spisum.dat"), surface)
+    if engine == "heap":
+        # calcCost: every feature's cost distance window to disk
+        cd_dir = os.path.join(work, "costdist")
+        os.mkdir(cd_dir)
+        memory = StageMemory(work)
+        t0 = time.perf_counter()
+        cells = 0
+        for k, (_, seeds, _) in enumerate(features):
+            window = cost_window(surface, seeds, max_cost)
+            save_window(os.path.join(cd_dir, "cd%d.npz" % k), window)
+            cells += window.block.size
+            del window
+        record("calcCost", time.perf_counter() - t0, memory)
+
+        # calcInfluence: read them back into the running sum
+        memory = StageMemory(work)
+        t0 = time.perf_counter()
+        acc = InfluenceAccumulator(surface.shape, weighted)
+        for k, (_, _, weight) in enumerate(features):
+            acc.add_window(load_window(
+                os.path.join(cd_dir, "cd%d.npz" % k), surface.shape), weight)
+        record("calcInfluence", time.perf_counter() - t0, memory)
+    else:
+        # Searches and accumulation are fused: one stage
+        counted = []
+
+        def tally(rec):
+            if rec["event"] == "feature":
+                counted.append(rec.get("window_cells") or 0)
+
+        inst = Instrumentation(callback=tally)
+        memory = StageMemory(work)
+        t0 = time.perf_counter()
+        if engine == "parallel":
+            acc = summed_influence(
+                surface, features, workers=workers or os.cpu_count() or 1,
+                max_cost=max_cost, weighted=weighted, instrument=inst)
+        else:
+            acc = sweep_influence(
+                surface, features, max_cost=max_cost, weighted=weighted,
+                instrument=inst, **(
+                    {"batch_bytes": sweep_bytes} if sweep_bytes else {}))
+        cells = sum(counted)
+        record("features", time.perf_counter() - t0, memory)
+
+    # Summation: normalise and write the output raster
+    memory = StageMemory(work)
+    t0 = time.perf_counter()
+    out = raster.create_envi(
+        os.path.join(work, "spi.dat"), surface, numpy.float32, -9999.0)
+    acc.result(surface, out, -9999.0)
+    out.flush()
+    del out
+    record("summation", time.perf_counter() - t0, memory)
+
+    # Cleanup
+    del acc, weighted, surface
+    memory = StageMemory()
+    t0 = time.perf_counter()
+    shutil.rmtree(work, ignore_errors=True)
+    record("cleanup", time.perf_counter() - t0, memory)
+
+    return {
+        "engine": engine, "size": size, "terrain": terrain,
+        "features": count, "kind": kind,
+        "cap_cells": cap_cells, "max_cost": max_cost, "seed": seed,
+        "window_cells": cells, "stages": stages,
+        "total_s": round(sum(s["wall_s"] for s in stages.values()), 6),
+    }
+
+
+def run_suite(sizes, terrains, features, kinds, caps, seed=0, work_dir=None,
+              log=None, engine="heap", workers=None, sweep_bytes=None):
+    """
+    Name:     run_suite
+    Inputs:   - list, raster sizes (sizes)
+              - list, terrain types (terrains)
+              - list, feature counts (features)
+              - list, feature kinds (kinds)
+              - list, caps in cells of median cost (caps)
+              - [optional] int, random seed (seed)
+              - [optional] str, parent folder for work directories
+                (work_dir)
+              - [optional] file, progress stream (log)
+              - [optional] str, "heap", "parallel" or "sweep" (engine)
+              - [optional] int, parallel worker processes (workers)
+              - [optional] int, sweep batch memory budget in bytes
+                (sweep_bytes)
+    Outputs:  list, one result dict per case
+    """
+    results = []
+    for case in itertools.product(sizes, terrains, features, kinds, caps):
+        if log is not None:
+            log.write("engine=%s size=%d terrain=%s features=%d kind=%s "
+                      "cap=%s\n" % ((engine,) + case))
+            log.flush()
+        results.append(run_case(*case, seed=seed, work_dir=work_dir,
+                                engine=engine, workers=workers,
+                                sweep_bytes=sweep_bytes))
+    return results
+
+
+def main(argv=None):
+    """
+    Name:     main
+    Inputs:   [optional] list, command line arguments (argv)
+    Outputs:  int, exit status
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m spi.benchmark",
+        description="Time SPI stages on synthetic cost surfaces.")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=DEFAULT_SIZES)
+    parser.add_argument("--terrains", nargs="+", choices=TERRAINS,
+                        default=TERRAINS)
+    parser.add_argument("--features", type=int, nargs="+",
+                        default=DEFAULT_FEATURES)
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=KINDS)
+    parser.add_argument("--caps", type=float, nargs="+", default=DEFAULT_CAPS,
+                        help="cost caps in cells of median cost; 0 = none")
+    parser.add_argument("--engine", choices=ENGINES, default="heap",
+                        help="heap (serial searches), parallel (worker "
+                        "processes) or sweep (batched sweeps)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parallel engine processes (default: all CPUs)")
+    parser.add_argument("--sweep-memory", type=int, default=None,
+                        help="sweep batch memory budget in MB")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--quick", action="store_true",
+                        help="run a small smoke-test matrix")
+    parser.add_argument("-o", "--output", default=None,
+                        help="JSON file to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    matrix = dict(sizes=args.sizes, terrains=args.terrains,
+                  features=args.features, kinds=args.kinds, caps=args.caps)
+    if args.quick:
+        matrix = QUICK
+    sweep_bytes = None
+    if args.sweep_memory:
+        sweep_bytes = args.sweep_memory*1024**2
+    results = run_suite(seed=args.seed, work_dir=args.work_dir,
+                        log=sys.stderr, engine=args.engine,
+                        workers=args.workers, sweep_bytes=sweep_bytes,
+                        **matrix)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# cache.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# On-disk cache of per-feature cost distance windows, shared across runs.
+# Entries are keyed by the cost surface content hash, the feature's source
+# cells and the maximum cost distance, so reruns with new weights or a few
+# added or removed features only search for the features that changed.
+# The cache is kept under a size budget by evicting the least recently used
+# entries.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import hashlib
+import os
+import uuid
+import zipfile
+
+import numpy
+
+from .costdist import CostWindow, cost_window
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+# Default size budget for the cache directory (10 GB)
+DEFAULT_MAX_BYTES = 10*1024**3
+
+# Extension of cache entry files
+ENTRY_EXT = ".npz"
+
+
+##############################################################################
+# CLASSES
+##############################################################################
+class CostDistanceCache(object):
+    """
+    Name:     CostDistanceCache
+    Features: Content-addressed store of CostWindows with LRU eviction;
+              safe to share between worker processes (a failed read is
+              treated as a miss, and an unreadable entry is removed)
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Name:     CostDistanceCache.__init__
+        Inputs:   - str, cache directory, created if missing (directory)
+                  - [optional] int, size budget in bytes (max_bytes)
+        """
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._size = sum(size for _, _, size in self._entries())
+
+    def key(self, surface, seeds, max_cost=None):
+        """
+        Name:     CostDistanceCache.key
+        Inputs:   - CostSurface, cost raster (surface)
+                  - list, flat cell indexes of the source (seeds)
+                  - [optional] float, maximum cost distance (max_cost)
+        Outputs:  str, hex digest identifying the result
+        """
+        h = hashlib.sha256(surface.digest().encode("ascii"))
+        h.update(numpy.unique(numpy.asarray(seeds, dtype=numpy.int64))
+                 .tobytes())
+        h.update(repr(float(max_cost) if max_cost else 0.0).encode("ascii"))
+        return h.hexdigest()
+
+    def path(self, key):
+        """Path of the entry file for key"""
+        return os.path.join(self.directory, key + ENTRY_EXT)
+
+    def get(self, key):
+        """
+        Name:     CostDistanceCache.get
+        Inputs:   str, entry key (key)
+        Outputs:  CostWindow, or None on a miss
+        Features: Loads an entry and marks it as recently used; a
+                  truncated or corrupt entry is deleted and counts as a
+                  miss
+        """
+        path = self.path(key)
+        try:
+            with numpy.load(path) as entry:
+                window = CostWindow(
+                    int(entry["row0"]), int(entry["col0"]), entry["block"],
+                    float(entry["fill"]), float(entry["max_cost_dist"]),
+                    tuple(entry["shape"]))
+            os.utime(path, None)
+            self.bytes_read += os.path.getsize(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError, KeyError, EOFError,
+                zipfile.BadZipFile):
+            self.misses += 1
+            self.discard(path)
+            return None
+        self.hits += 1
+        return window
+
+    def discard(self, path):
+        """Removes a bad entry file, if it is still there"""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        self._size -= size
+
+    def put(self, key, window):
+        """
+        Name:     CostDistanceCache.put
+        Inputs:   - str, entry key (key)
+                  - CostWindow, result to store (window)
+        Outputs:  None.
+        Features: Writes an entry atomically, then evicts old entries if
+                  the cache is over budget
+        """
+        path = self.path(key)
+        tmp = os.path.join(self.directory, "%s.tmp" % uuid.uuid4().hex)
+        with open(tmp, "wb") as f:
+            numpy.savez(
+                f, row0=window.row0, col0=window.col0, block=window.block,
+                fill=window.fill, max_cost_dist=window.max_cost_dist,
+                shape=numpy.asarray(window.shape))
+        size = os.path.getsize(tmp)
+        self._size += size
+        self.bytes_written += size
+        os.replace(tmp, path)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def window(self, surface, seeds, max_cost=None, stats=None,
+               lookup=True):
+        """
+        Name:     CostDistanceCache.window
+        Inputs:   - CostSurface, cost raster (surface)
+                  - list, flat cell indexes of the source (seeds)
+                  - [optional] float, maximum cost distance (max_cost)
+                  - [optional] dict, search counters filled on a miss
+                    (stats)
+                  - [optional] bool, look the result up first; False when
+                    the caller's own get already missed, so the miss is
+                    not counted twice (lookup)
+        Outputs:  CostWindow
+        Features: Returns the cached result, computing and storing it on a
+                  miss
+        """
+        key = self.key(surface, seeds, max_cost)
+        window = self.get(key) if lookup else None
+        if window is None:
+            window = cost_window(surface, seeds, max_cost, stats)
+            self.put(key, window)
+        return window
+
+    def evict(self):
+        """
+        Name:     CostDistanceCache.evict
+        Inputs:   None.
+        Outputs:  None.
+        Features: Removes least recently used entries until the cache is
+                  within its size budget
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._size = total
+
+    def _entries(self):
+        """List of (last used time, path, size) for every entry"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(ENTRY_EXT):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, path, st.st_size))
+        return entries
@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# cli.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Headless command-line runner. Runs any number of SPI jobs from a manifest
+# in one process, outside ArcGIS Pro: cost surfaces, rasterised features
+# and caches are loaded once and shared by every job that names them, and
+# arcpy is only imported for jobs that ask for the arcpy backend.
+#
+# -----
+# USAGE
+# -----
+#   python -m spi run manifest.yaml
+#   python -m spi run manifest.json --job villages --job roads
+#
+# A manifest (YAML if PyYAML is installed, otherwise JSON) holds optional
+# defaults and a list of jobs; relative paths are taken from the manifest's
+# folder:
+#
+#   defaults:
+#     cost: data/cost.dat          # ENVI raster (or any raster for arcpy)
+#     max_cost: 0
+#   jobs:
+#     - name: villages
+#       features: data/villages.geojson   # .csv, .geojson (or arcpy data)
+#       weight: [pop2010, pop2020]        # one output band per field
+#       output: out/villages_spi.tif      # ENVI or tiled GeoTIFF
+#     - name: villages_at_plots
+#       features: data/villages.geojson
+#       sites: data/plots.csv             # SPI at these sites only
+#       output: out/plots_spi.csv         # one row per site
+#
+# Job keys are listed in JOB_DEFAULTS.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+
+import numpy
+
+from . import output, raster
+from .archive import ArchiveWriter
+from .instrument import Instrumentation
+from .journal import RunJournal, inputs_digest
+from .pipeline import summed_influence
+from .query import query_sites, write_site_table
+from .validate import ValidationError, check_features
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+# Every job key and its default
+JOB_DEFAULTS = {
+    "name": None,
+    "cost": None,              # cost raster
+    "features": None,          # feature file, or feature class for arcpy
+    "output": None,            # output raster (ENVI or GeoTIFF for numpy)
+    "integer": False,          # round the output to integers
+    "weight": None,            # weight field, or a list for scenarios
+    "id_field": None,          # feature ID field
+    "x_field": "x",            # CSV x coordinate column
+    "y_field": "y",            # CSV y coordinate column
+    "backend": "numpy",        # "numpy" or "arcpy" (ArcGIS data I/O)
+    "engine": "heap",          # "heap", "sweep" or "cluster"
+    "max_cost": 0,             # maximum cost distance, 0 for none
+    "workers": 1,              # worker processes (heap engine)
+    "cluster_size": 10,        # cluster grid size in cells (cluster)
+    "sweep_memory_mb": 512,    # memory per batch (sweep)
+    "cache_dir": None,         # per-feature cost distance cache (heap)
+    "cache_size_mb": 10240,    # cache size budget
+    "work_dir": None,          # folder for the running sum
+    "journal": None,           # checkpoint folder to resume from (heap)
+    "checkpoint_every": 100,   # features between checkpoints
+    "archive": None,           # per-feature cost distance archive (.spia)
+    "archive_encoding": "u16", # "u16", "f16" or "f32"
+    "log": None,               # instrumentation JSON lines file
+    "sites": None,             # site file; SPI table at these sites only
+    "site_id_field": None,     # site ID field
+    "normaliser": None,        # SPI normaliser for sites (see spi.query)
+}
+
+# Keys holding paths resolved against the manifest folder
+PATH_KEYS = ("cost", "features", "output", "cache_dir", "work_dir",
+             "journal", "archive", "log", "sites")
+
+ENGINES = ("heap", "sweep", "cluster")
+
+# Job keys only the heap engine uses, with the values that leave them off
+HEAP_ONLY = (("workers", (None, 0, 1)), ("journal", (None, "")),
+             ("cache_dir", (None, "")))
+BACKENDS = ("numpy", "arcpy")
+
+
+##############################################################################
+# CLASSES
+##############################################################################
+class Runner(object):
+    """
+    Name:     Runner
+    Features: Runs SPI jobs, keeping cost surfaces, feature seeds and
+              caches loaded between jobs
+    """
+    def __init__(self, stream=None):
+        """
+        Name:     Runner.__init__
+        Inputs:   [optional] file, progress and summary stream (stream)
+        """
+        self.stream = stream
+        self.surfaces = {}
+        self.features = {}
+        self.caches = {}
+
+    def say(self, text):
+        """Writes a line to the progress stream"""
+        if self.stream is not None:
+            self.stream.write(text + "\n")
+            self.stream.flush()
+
+    def surface(self, job):
+        """
+        Name:     Runner.surface
+        Inputs:   dict, job (job)
+        Outputs:  CostSurface, loaded once per backend and path
+        """
+        key = (job["backend"], job["cost"])
+        if key not in self.surfaces:
+            if job["backend"] == "arcpy":
+                from . import arcio
+                self.surfaces[key] = arcio.load_cost_surface(job["cost"])
+            else:
+                self.surfaces[key] = raster.read_envi(job["cost"])
+        return self.surfaces[key]
+
+    def feature_seeds(self, job, surface):
+        """
+        Name:     Runner.feature_seeds
+        Inputs:   - dict, job (job)
+                  - CostSurface, the job's cost surface (surface)
+        Outputs:  list, (feature ID, [flat cell index], weight) tuples,
+                  read and rasterised once per surface and feature source
+        """
+        weight = job["weight"]
+        key = (job["backend"], job["cost"], job["features"],
+               json.dumps(weight), job["id_field"], job["x_field"],
+               job["y_field"])
+        if key not in self.features:
+            if job["backend"] == "arcpy":
+                import arcpy
+                from . import arcio
+                oid_field = job["id_field"] or arcpy.Describe(
+                    job["features"]).OIDFieldName
+                seeds_dir = None
+                if job["work_dir"]:
+                    seeds_dir = os.path.join(job["work_dir"], "seeds")
+                feats = arcio.read_feature_seeds(
+                    surface, job["features"], oid_field, weight, seeds_dir)
+            else:
+                from .features import read_features
+                feats = read_features(
+                    surface, job["features"], weight, job["id_field"],
+                    job["x_field"], job["y_field"])
+            self.features[key] = feats
+        return self.features[key]
+
+    def cache(self, job):
+        """CostDistanceCache for the job, or None"""
+        if not job["cache_dir"]:
+            return None
+        if job["cache_dir"] not in self.caches:
+            from .cache import CostDistanceCache
+            self.caches[job["cache_dir"]] = CostDistanceCache(
+                job["cache_dir"], int(job["cache_size_mb"])*1024**2)
+        return self.caches[job["cache_dir"]]
+
+    def site_cells(self, job, surface):
+        """
+        Name:     Runner.site_cells
+        Inputs:   - dict, job (job)
+                  - CostSurface, the job's cost surface (surface)
+        Outputs:  list, (site ID, flat cell index) pairs, -1 off the raster
+        """
+        if job["backend"] == "arcpy":
+            import arcpy
+            from . import arcio
+            id_field = job["site_id_field"] or arcpy.Describe(
+                job["sites"]).OIDFieldName
+            return arcio.read_site_cells(surface, job["sites"], id_field)
+        from .features import read_sites
+        return read_sites(surface, job["sites"], job["site_id_field"],
+                          job["x_field"], job["y_field"])
+
+    def query_job(self, job):
+        """
+        Name:     Runner.query_job
+        Inputs:   dict, job with "sites" set (job)
+        Outputs:  dict, job summary (name, output table, features, sites,
+                  normaliser and where it came from, searches, wall time)
+        Features: SPI at the job's sites by searches from the sites, with
+                  no output raster
+        """
+        t0 = time.perf_counter()
+        inst = Instrumentation(job["log"])
+        try:
+            with inst.stage("load"):
+                surface = self.surface(job)
+                features = self.feature_seeds(job, surface)
+                sites = self.site_cells(job, surface)
+            with inst.stage("validate"):
+                weights = None
+                if job["weight"]:
+                    weights = numpy.array([f[2] for f in features],
+                                          dtype=numpy.float64)
+                check_features(surface, [f[0] for f in features],
+                               weights=weights,
+                               seeds=[f[1] for f in features])
+            names = job["weight"] if isinstance(
+                job["weight"], (list, tuple)) else None
+            if names and len(names) == 1:
+                features = [(f, s, w[0]) for f, s, w in features]
+                names = None
+            normaliser = job["normaliser"]
+            values, info = query_sites(
+                surface, features, sites, float(job["max_cost"] or 0),
+                None if normaliser is None else float(normaliser),
+                cache=self.cache(job), instrument=inst)
+            with inst.stage("output"):
+                out_dir = os.path.dirname(os.path.abspath(job["output"]))
+                if not os.path.isdir(out_dir):
+                    os.makedirs(out_dir)
+                if job["backend"] == "arcpy":
+                    from . import arcio
+                    arcio.save_site_table(job["output"], sites, values,
+                                          names)
+                else:
+                    write_site_table(job["output"], sites, values, names,
+                                     job["site_id_field"] or "site")
+        finally:
+            inst.close()
+        if info["normaliser_source"] == "exact":
+            self.say("%s: finding the normaliser took one full search per "
+                     "feature; set normaliser: %r to skip this" % (
+                         job["name"], info["normaliser"]))
+        self.say(inst.summary())
+        return {
+            "name": job["name"], "outputs": [job["output"]],
+            "features": len(features), "sites": len(sites),
+            "normaliser": info["normaliser"],
+            "normaliser_source": info["normaliser_source"],
+            "searches": info["searches"],
+            "wall_s": round(time.perf_counter() - t0, 3),
+        }
+
+    def run_job(self, job):
+        """
+        Name:     Runner.run_job
+        Inputs:   dict, job with every key of JOB_DEFAULTS (job)
+        Outputs:  dict, job summary (name, outputs, features, maximum cost
+                  distance, output band statistics, wall time)
+        Features: Validates the features, runs the selected engine into a
+                  memory-mapped running sum and writes the output; jobs
+                  with sites go to query_job
+        """
+        if job["sites"]:
+            return self.query_job(job)
+        t0 = time.perf_counter()
+        inst = Instrumentation(job["log"])
+        stage = inst.stage
+        work = journal = archive = None
+        band_stats = []
+        try:
+            with stage("load"):
+                surface = self.surface(job)
+                features = self.feature_seeds(job, surface)
+            with stage("validate"):
+                weights = None
+                if job["weight"]:
+                    weights = numpy.array([f[2] for f in features],
+                                          dtype=numpy.float64)
+                check_features(surface, [f[0] for f in features],
+                               weights=weights,
+                               seeds=[f[1] for f in features])
+
+            # Running sum in a memory-mapped scratch file
+            names = job["weight"] if isinstance(
+                job["weight"], (list, tuple)) else None
+            parent = job["work_dir"] or os.path.dirname(
+                os.path.abspath(job["output"]))
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            work = tempfile.mkdtemp(prefix="spiwork", dir=parent)
+            sum_names = names if names and len(names) > 1 else None
+            weighted = raster.create_envi(
+                os.path.join(work, "spisum.dat"), surface,
+                band_names=sum_names)
+            if sum_names is None and names:
+                features = [(f, s, w[0]) for f, s, w in features]
+            else:
+                names = sum_names
+
+            max_cost = float(job["max_cost"] or 0)
+            engine = job["engine"]
+            if job["journal"]:
+                journal = RunJournal(
+                    job["journal"],
+                    inputs_digest(surface, features, max_cost),
+                    every=int(job["checkpoint_every"]))
+                if journal.done:
+                    self.say("%s: resuming after %d features" % (
+                        job["name"], len(journal.done)))
+            if job["archive"] and engine == "cluster":
+                self.say("%s: the cluster engine has no per-feature cost "
+                         "distances to archive" % job["name"])
+            elif job["archive"]:
+                # A resumed run adds to the archive it left behind
+                archive = ArchiveWriter(
+                    job["archive"], surface, job["archive_encoding"],
+                    append=bool(journal is not None and journal.done))
+            if engine == "cluster":
+                from .cluster import clustered_influence
+                acc, info = clustered_influence(
+                    surface, features, int(job["cluster_size"]),
+                    max_cost=max_cost, weighted=weighted, instrument=inst)
+                self.say("%s: %d features in %d clusters, %d searches, "
+                         "error bound %s" % (
+                             job["name"], info["features"],
+                             info["clusters"], info["searches"],
+                             info["error_bound"]))
+            elif engine == "sweep":
+                from .sweep import sweep_influence
+                acc = sweep_influence(
+                    surface, features, max_cost=max_cost, weighted=weighted,
+                    batch_bytes=int(job["sweep_memory_mb"])*1024**2,
+                    instrument=inst, archive=archive)
+            else:
+                acc = summed_influence(
+                    surface, features, workers=int(job["workers"]),
+                    max_cost=max_cost, weighted=weighted,
+                    cache=self.cache(job), instrument=inst,
+                    journal=journal, archive=archive)
+
+            with stage("output"):
+                out_dir = os.path.dirname(os.path.abspath(job["output"]))
+                if not os.path.isdir(out_dir):
+                    os.makedirs(out_dir)
+                if job["backend"] == "arcpy":
+                    from . import arcio
+                    outputs = arcio.save_result(
+                        acc, surface, job["output"], names,
+                        bool(job["integer"]))
+                else:
+                    outputs = output.save_result(
+                        acc, surface, job["output"], names,
+                        bool(job["integer"]), stats=band_stats)
+            if journal is not None:
+                journal.finish()
+            if archive is not None:
+                with stage("archive"):
+                    archive.close()
+                self.say("%s: archived %d features, %d bytes" % (
+                    job["name"], len(archive.index["features"]),
+                    archive.bytes_written))
+            max_cost_dist = acc.max_cost_dist
+            del acc, weighted
+        finally:
+            if archive is not None:
+                archive.close()
+            if work is not None:
+                shutil.rmtree(work, ignore_errors=True)
+            inst.close()
+        self.say(inst.summary())
+        return {
+            "name": job["name"], "outputs": outputs,
+            "features": len(features), "max_cost_dist": max_cost_dist,
+            "stats": [{k: v for k, v in st.items() if k != "hist"}
+                      for st in band_stats],
+            "wall_s": round(time.perf_counter() - t0, 3),
+        }
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def load_manifest(path):
+    """
+    Name:     load_manifest
+    Inputs:   str, YAML or JSON manifest file (path)
+    Outputs:  dict, manifest with "defaults" and "jobs"
+    Features: YAML needs PyYAML; JSON always works
+    """
+    with open(path) as f:
+        text = f.read()
+    if path.lower().endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise RuntimeError(
+                "Reading %s needs PyYAML (pip install pyyaml); or write "
+                "the manifest as JSON" % path)
+        manifest = yaml.safe_load(text)
+    else:
+        manifest = json.loads(text)
+    if isinstance(manifest, list):
+        manifest = {"jobs": manifest}
+    return manifest
+
+
+def manifest_jobs(manifest, base_dir="."):
+    """
+    Name:     manifest_jobs
+    Inputs:   - dict, loaded manifest (manifest)
+              - [optional] str, folder relative paths start from
+                (base_dir)
+    Outputs:  list, job dicts with every key of JOB_DEFAULTS
+    Features: Applies the defaults, resolves paths and checks each job
+    """
+    defaults = dict(JOB_DEFAULTS)
+    defaults.update(manifest.get("defaults") or {})
+    jobs = []
+    for k, entry in enumerate(manifest.get("jobs") or []):
+        job = dict(defaults)
+        job.update(entry)
+        unknown = set(job) - set(JOB_DEFAULTS)
+        if unknown:
+            raise ValueError("Job %d: unknown keys %s" % (
+                k + 1, ", ".join(sorted(unknown))))
+        if not job["name"]:
+            job["name"] = "job%d" % (k + 1)
+        for key in ("cost", "features", "output"):
+            if not job[key]:
+                raise ValueError("Job %s: no %s given" % (job["name"], key))
+        if job["engine"] not in ENGINES:
+            raise ValueError("Job %s: engine must be one of %s" % (
+                job["name"], ", ".join(ENGINES)))
+        if job["backend"] not in BACKENDS:
+            raise ValueError("Job %s: backend must be one of %s" % (
+                job["name"], ", ".join(BACKENDS)))
+        unused = [key for key, off in HEAP_ONLY if job[key] not in off]
+        if unused and job["engine"] != "heap" and not job["sites"]:
+            raise ValueError("Job %s: the %s engine does not use %s" % (
+                job["name"], job["engine"], ", ".join(unused)))
+        for key in PATH_KEYS:
+            path = job[key]
+            if not path or os.path.isabs(path):
+                continue
+            full = os.path.normpath(os.path.join(base_dir, path))
+            # arcpy inputs may also be layer names
+            if job["backend"] == "arcpy" and key in ("cost", "features") \
+                    and not os.path.exists(os.path.dirname(full)):
+                continue
+            job[key] = full
+        exts = raster.ENVI_EXTS + output.TIFF_EXTS
+        ext = os.path.splitext(job["output"])[1].lower()
+        if job["sites"]:
+            if job["backend"] == "numpy" and ext != ".csv":
+                raise ValueError(
+                    "Job %s: site tables are written as .csv" % job["name"])
+        elif job["backend"] == "numpy" and ext not in exts:
+            raise ValueError(
+                "Job %s: the numpy backend writes ENVI or GeoTIFF rasters "
+                "(%s)" % (job["name"], ", ".join(exts)))
+        jobs.append(job)
+    return jobs
+
+
+def run(args):
+    """
+    Name:     run
+    Inputs:   argparse.Namespace, parsed "run" arguments (args)
+    Outputs:  int, exit status; 1 if any job failed
+    Features: A job that fails is recorded with its error and traceback
+              and the remaining jobs still run
+    """
+    stream = None if args.quiet else sys.stderr
+    jobs = manifest_jobs(load_manifest(args.manifest),
+                         os.path.dirname(os.path.abspath(args.manifest)))
+    if args.job:
+        missing = sorted(set(args.job) - set(job["name"] for job in jobs))
+        if missing:
+            raise ValueError("No job named %s in %s (jobs: %s)" % (
+                ", ".join(missing), args.manifest,
+                ", ".join(job["name"] for job in jobs)))
+        jobs = [job for job in jobs if job["name"] in args.job]
+    runner = Runner(stream)
+    results = []
+    status = 0
+    for job in jobs:
+        runner.say("== %s" % job["name"])
+        try:
+            results.append(runner.run_job(job))
+        except ValidationError as e:
+            runner.say("%s: %s: %s" % (job["name"], e.errorType, e))
+            results.append({"name": job["name"], "error": str(e),
+                            "error_type": e.errorType})
+            status = 1
+        except Exception as e:
+            text = traceback.format_exc()
+            runner.say("%s: %s" % (job["name"], text.rstrip()))
+            results.append({"name": job["name"], "error": str(e),
+                            "error_type": type(e).__name__,
+                            "traceback": text})
+            status = 1
+    sys.stdout.write(json.dumps(results, indent=2, default=str) + "\n")
+    return status
+
+
+def main(argv=None):
+    """
+    Name:     main
+    Inputs:   [optional] list, command line arguments (argv)
+    Outputs:  int, exit status
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m spi",
+        description="Headless SPI runner (no ArcGIS Pro session needed).")
+    sub = parser.add_subparsers(dest="command")
+    p_run = sub.add_parser("run", help="run the jobs in a manifest")
+    p_run.add_argument("manifest", help="YAML or JSON job manifest")
+    p_run.add_argument("--job", action="append",
+                       help="only run the named job (repeatable)")
+    p_run.add_argument("-q", "--quiet", action="store_true",
+                       help="no progress or summary tables")
+    p_run.set_defaults(func=run)
+    args = parser.parse_args(argv)
+    if not getattr(args, "func", None):
+        parser.print_help()
+        return 2
+    return args.func(args)
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# cluster.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Approximate clustered SPI for very large feature counts (e.g. tens of
+# thousands of household points), where one cost distance search per
+# feature is too slow.
+#
+# Features on the same cells are merged first (their weights summed), which
+# is exact. Point features are then grouped on a grid of radius x radius
+# cells, and each group is searched once from its weighted medoid (the
+# representative). Cost distances are symmetric, so for a member i at cost
+# distance d_i from the representative the triangle inequality gives
+#
+#     |cd_rep(x) - d_i| <= cd_i(x) <= cd_rep(x) + d_i
+#
+# and the member is counted as max(cd_rep(x), d_i), the midpoint of that
+# range, which is off by at most min(cd_rep(x), d_i) <= d_i. Summed over
+# members, the distance sum of any cell is off by at most sum_i |w_i| d_i.
+#
+# The normaliser needs care too. Each representative is searched exactly,
+# so the clustered maximum M is no more than the exact M*, and a member
+# reaches at most d_i further than its representative, so M* is no more
+# than its representative's maximum plus d_i (or the maximum cost
+# distance, if smaller). By default the members whose limit is above the
+# running M are searched for their maxima, largest limit first, until no
+# limit is left above it; this usually takes a handful of searches and
+# makes M exact, so the SPI of any cell is off by at most
+#
+#     B = sum_i |w_i| d_i / M
+#
+# Without it, M* is only known to lie in [M, M+], M+ being the largest
+# limit, and the bound becomes
+#
+#     B = sum_i |w_i| d_i / M + sum_j |w_j| (M+ - M) / M+
+#
+# (the second sum over all features). The bound is reported with the
+# result.
+# Members further than max_offset from their representative, features that
+# cover several cells and members the representative cannot reach are
+# searched exactly.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import numpy
+
+from .costdist import cost_window
+from .influence import InfluenceAccumulator
+from .instrument import run_feature, stage
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+# Default cluster grid size in cells
+DEFAULT_RADIUS = 10
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def merge_features(features):
+    """
+    Name:     merge_features
+    Inputs:   list, (feature ID, [flat cell index], weight) tuples
+              (features)
+    Outputs:  list, ([feature IDs], seeds, summed weight) tuples, one per
+              distinct set of source cells
+    Features: Features on exactly the same cells have the same cost
+              distance, so merging them is exact
+    """
+    merged = {}
+    order = []
+    for featID, seeds, weight in features:
+        key = numpy.unique(numpy.asarray(seeds, dtype=numpy.int64)).tobytes()
+        if key in merged:
+            entry = merged[key]
+            entry[0].append(featID)
+            entry[2] = entry[2] + numpy.asarray(weight, dtype=numpy.float64)
+        else:
+            merged[key] = [[featID], seeds,
+                           numpy.asarray(weight, dtype=numpy.float64)]
+            order.append(key)
+    return [tuple(merged[key]) for key in order]
+
+
+def weighted_medoid(rows, cols, weights):
+    """
+    Name:     weighted_medoid
+    Inputs:   - numpy.ndarray, member rows (rows)
+              - numpy.ndarray, member columns (cols)
+              - numpy.ndarray, member weights (weights)
+    Outputs:  int, index of the member with the least weighted distance
+              to the others
+    """
+    dr = rows[:, None] - rows[None, :]
+    dc = cols[:, None] - cols[None, :]
+    return int(numpy.argmin(numpy.hypot(dr, dc).dot(weights)))
+
+
+def cluster_features(surface, features, radius=DEFAULT_RADIUS):
+    """
+    Name:     cluster_features
+    Inputs:   - CostSurface, cost raster (surface)
+              - list, merged ([feature IDs], seeds, weight) tuples
+                (features)
+              - [optional] int, cluster grid size in cells (radius)
+    Outputs:  tuple, (list of (representative, [members]) index tuples,
+              list of indexes of features to search exactly)
+    Features: Groups single-cell features by grid square; features
+              covering several cells are left out
+    """
+    ncols = surface.shape[1]
+    radius = max(1, int(radius))
+    groups = {}
+    exact = []
+    for k, (_, seeds, _) in enumerate(features):
+        if len(seeds) != 1:
+            exact.append(k)
+            continue
+        row, col = divmod(int(seeds[0]), ncols)
+        groups.setdefault((row//radius, col//radius), []).append(k)
+
+    clusters = []
+    for members in groups.values():
+        cells = numpy.array([int(features[k][1][0]) for k in members])
+        rows, cols = numpy.divmod(cells, ncols)
+        weights = numpy.array([
+            numpy.sum(features[k][2]) for k in members], dtype=numpy.float64)
+        rep = members[weighted_medoid(
+            rows.astype(numpy.float64), cols.astype(numpy.float64),
+            numpy.abs(weights))]
+        clusters.append((rep, members))
+    return clusters, exact
+
+
+def clustered_influence(surface, features, radius=DEFAULT_RADIUS,
+                        progress=None, max_cost=None, weighted=None,
+                        max_offset=None, instrument=None,
+                        exact_normaliser=True):
+    """
+    Name:     clustered_influence
+    Inputs:   - CostSurface, cost raster (surface)
+              - list, (feature ID, [flat cell index], weight) tuples; the
+                weight may be a length-K vector of scenario weights
+                (features)
+              - [optional] int, cluster grid size in cells (radius)
+              - [optional] function, called as progress(featID, cd_max)
+                after each search, with the representative's ID for a
+                cluster (progress)
+              - [optional] float, maximum cost distance (max_cost)
+              - [optional] numpy.ndarray, zeroed float64 array to
+                accumulate into (weighted)
+              - [optional] float, members further than this cost distance
+                from their representative are searched exactly
+                (max_offset)
+              - [optional] Instrumentation, receives stage and per-search
+                records (instrument)
+              - [optional] bool, search the members that could hold the
+                largest cost distance so the normaliser is exact
+                (exact_normaliser)
+    Outputs:  tuple, (InfluenceAccumulator, dict of run statistics)
+    Features: Approximate SPI with one search per cluster; the statistics
+              give the number of features, merged features, clusters and
+              searches, the range the exact normaliser lies in
+              (max_cost_dist_range; a single value when it was found
+              exactly) and the error bound (error_bound, in
+              SPI units; one per scenario for scenario weights)
+    """
+    features = list(features)
+    scenarios = None
+    if features and numpy.ndim(features[0][2]) > 0:
+        scenarios = len(features[0][2])
+    acc = InfluenceAccumulator(surface.shape, weighted, scenarios)
+    cap = float(max_cost) if max_cost else numpy.inf
+    limit = cap
+    if max_offset is not None:
+        limit = min(limit, float(max_offset))
+
+    def report(featID, cd_max, stats):
+        if instrument is not None:
+            instrument.feature(featID, cd_max=cd_max, **stats)
+        if progress is not None:
+            progress(featID, cd_max)
+
+    with stage(instrument, "clustering"):
+        merged = merge_features(features)
+        clusters, exact = cluster_features(surface, merged, radius)
+
+    searches = 0
+    weighted_offset = 0.0
+    # Upper limits of the members' maximum cost distances
+    limits = []
+    with stage(instrument, "clusters"):
+        for rep, members in clusters:
+            ids, seeds, weight = merged[rep]
+            stats = {}
+            window = cost_window(surface, seeds, max_cost, stats)
+            searches += 1
+
+            # Offsets are read off the representative's own search
+            cells = numpy.array([int(merged[k][1][0]) for k in members])
+            rows, cols = numpy.divmod(cells, surface.shape[1])
+            rows = rows - window.row0
+            cols = cols - window.col0
+            inside = ((rows >= 0) & (rows < window.block.shape[0]) &
+                      (cols >= 0) & (cols < window.block.shape[1]))
+            offsets = numpy.full(len(members), numpy.inf)
+            offsets[inside] = window.block[rows[inside], cols[inside]]
+            offsets[numpy.isnan(offsets)] = numpy.inf
+
+            # Members beyond the threshold or unreachable are searched
+            # on their own
+            near = offsets < limit
+            near[members.index(rep)] = True
+            exact.extend(k for k, ok in zip(members, near) if not ok)
+            members = [k for k, ok in zip(members, near) if ok]
+            offsets = offsets[near]
+            weights = numpy.array([merged[k][2] for k in members])
+            cd_max = acc.add_cluster(window, offsets, weights)
+            weighted_offset = weighted_offset + numpy.dot(
+                offsets, numpy.abs(weights))
+            limits.extend((min(cap, cd_max + d), k)
+                          for k, d in zip(members, offsets) if k != rep)
+            stats["members"] = sum(len(merged[k][0]) for k in members)
+            stats["window_cells"] = window.block.size
+            report(ids[0], cd_max, stats)
+
+    with stage(instrument, "exact features"):
+        for k in exact:
+            ids, seeds, weight = merged[k]
+            cd_max, stats = run_feature(surface, seeds, weight, acc, max_cost)
+            searches += 1
+            stats["members"] = len(ids)
+            report(ids[0], cd_max, stats)
+
+    # Normaliser: search the members that could go further than the
+    # running maximum, largest limit first
+    limits.sort(key=lambda item: -item[0])
+    normaliser_searches = 0
+    if exact_normaliser:
+        with stage(instrument, "normaliser"):
+            for bound, k in limits:
+                if bound <= acc.max_cost_dist:
+                    break
+                window = cost_window(surface, merged[k][1], max_cost)
+                acc.max_cost_dist = max(acc.max_cost_dist,
+                                        window.max_cost_dist)
+                normaliser_searches += 1
+    max_cost_hi = acc.max_cost_dist
+    if limits and not exact_normaliser:
+        max_cost_hi = max(max_cost_hi, limits[0][0])
+
+    weight_total = 0.0
+    if features:
+        weight_total = numpy.abs(numpy.array(
+            [f[2] for f in features], dtype=numpy.float64)).sum(axis=0)
+    info = {
+        "features": len(features),
+        "merged": len(merged),
+        "clusters": len(clusters),
+        "exact": len(exact),
+        "searches": searches + normaliser_searches,
+        "normaliser_searches": normaliser_searches,
+        "weighted_offset": weighted_offset,
+        "max_cost_dist_range": (acc.max_cost_dist, max_cost_hi),
+        "error_bound": error_bound(weighted_offset, weight_total,
+                                   acc.max_cost_dist, max_cost_hi),
+    }
+    return acc, info
+
+
+def error_bound(weighted_offset, weight_total, max_cost_dist, max_cost_hi):
+    """
+    Name:     error_bound
+    Inputs:   - float or numpy.ndarray, sum of |w_i| d_i over clustered
+                members, per scenario (weighted_offset)
+              - float or numpy.ndarray, sum of |w_i| over all features, per
+                scenario (weight_total)
+              - float, the run's (approximate) normaliser M
+                (max_cost_dist)
+              - float, upper limit M+ of the exact normaliser (max_cost_hi)
+    Outputs:  float or numpy.ndarray, largest SPI error of any cell
+    """
+    if max_cost_hi <= 0:
+        return weighted_offset*0.0
+    if max_cost_dist <= 0:
+        return weighted_offset*0.0 + numpy.inf
+    return (weighted_offset/max_cost_dist +
+            weight_total*(max_cost_hi - max_cost_dist)/max_cost_hi)
+
+
+def error_stats(approx, exact, bound=None):
+    """
+    Name:     error_stats
+    Inputs:   - numpy.ndarray, approximate SPI surface(s) (approx)
+              - numpy.ndarray, exact SPI surface(s) (exact)
+              - [optional] float, reported error bound (bound)
+    Outputs:  dict, per-cell absolute error statistics: max, mean, RMSE,
+              99th percentile, max relative to the exact range, and
+              whether every cell is within the bound
+    Features: Compares an approximate run against an exact run of the same
+              inputs, ignoring NoData cells
+    """
+    approx = numpy.asarray(approx, dtype=numpy.float64)
+    exact = numpy.asarray(exact, dtype=numpy.float64)
+    valid = numpy.isfinite(approx) & numpy.isfinite(exact)
+    err = numpy.abs(approx[valid] - exact[valid])
+    if err.size == 0:
+        return {"cells": 0}
+    span = float(exact[valid].max() - exact[valid].min())
+    stats = {
+        "cells": int(err.size),
+        "max_abs": float(err.max()),
+        "mean_abs": float(err.mean()),
+        "rmse": float(numpy.sqrt(numpy.mean(err**2))),
+        "p99_abs": float(numpy.percentile(err, 99)),
+        "max_rel": float(err.max()/span) if span > 0 else 0.0,
+        "nodata_mismatch": int(
+            (numpy.isfinite(approx) != numpy.isfinite(exact)).sum()),
+    }
+    if bound is not None:
+        stats["bound"] = float(bound)
+        stats["within_bound"] = bool(err.max() <= bound*(1 + 1e-9) + 1e-9)
+    return stats
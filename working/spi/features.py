@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# features.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Feature readers for headless runs, without arcpy: point tables (CSV with
+# coordinate columns) and GeoJSON (points, lines and polygons). Features
+# come back as (feature ID, [flat cell index], weight) tuples ready for the
+# engine, rasterised to the cost surface as spi.arcio does in ArcGIS.
+# Coordinates must be in the cost raster's coordinate system.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import csv
+import json
+import os
+
+import numpy
+
+from . import rasterize
+from .validate import point_cells
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def _weight(properties, weight_field):
+    """
+    Name:     _weight
+    Inputs:   - dict, feature attributes (properties)
+              - str or list, weight field name(s) or None (weight_field)
+    Outputs:  float or list, weight(s); NaN where missing, 1 without a
+              weight field
+    """
+    def value(name):
+        v = properties.get(name)
+        if v is None or v == "":
+            return numpy.nan
+        return float(v)
+
+    if isinstance(weight_field, (list, tuple)):
+        return [value(name) for name in weight_field]
+    if weight_field:
+        return value(weight_field)
+    return 1.0
+
+
+def read_csv_features(surface, path, weight_field=None, id_field=None,
+                      x_field="x", y_field="y"):
+    """
+    Name:     read_csv_features
+    Inputs:   - CostSurface, cost raster (surface)
+              - str, CSV file with a header row (path)
+              - [optional] str or list, weight column(s) (weight_field)
+              - [optional] str, ID column; row numbers (from 0) without
+                one (id_field)
+              - [optional] str, x coordinate column (x_field)
+              - [optional] str, y coordinate column (y_field)
+    Outputs:  list, (feature ID, [flat cell index], weight) tuples
+    Features: Each row is a point seeded from the cell under it
+    """
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    xs = numpy.array([float(r[x_field]) for r in rows], dtype=numpy.float64)
+    ys = numpy.array([float(r[y_field]) for r in rows], dtype=numpy.float64)
+    idx = point_cells(surface, xs, ys)
+    features = []
+    for k, row in enumerate(rows):
+        featID = row[id_field] if id_field else k
+        try:
+            featID = int(featID)
+        except ValueError:
+            pass
+        seeds = [int(idx[k])] if idx[k] >= 0 else []
+        features.append((featID, numpy.array(seeds, dtype=numpy.int64),
+                         _weight(row, weight_field)))
+    return features
+
+
+def geojson_cells(surface, geometry):
+    """
+    Name:     geojson_cells
+    Inputs:   - CostSurface, cost raster (surface)
+              - dict, GeoJSON geometry (geometry)
+    Outputs:  numpy.ndarray, flat indexes of the cells the geometry covers
+    """
+    if not geometry:
+        return numpy.empty(0, dtype=numpy.int64)
+    kind = geometry["type"]
+    coords = geometry.get("coordinates")
+    if kind == "GeometryCollection":
+        parts = [geojson_cells(surface, g) for g in geometry["geometries"]]
+        return numpy.unique(numpy.concatenate(
+            parts + [numpy.empty(0, dtype=numpy.int64)]))
+    if kind in ("Point", "MultiPoint"):
+        xy = numpy.asarray(coords, dtype=numpy.float64).reshape(-1, 2)
+        idx = point_cells(surface, xy[:, 0], xy[:, 1])
+        return numpy.unique(idx[idx >= 0])
+    if kind == "LineString":
+        return rasterize.line_cells(surface, [coords])
+    if kind == "MultiLineString":
+        return rasterize.line_cells(surface, coords)
+    if kind == "Polygon":
+        return rasterize.polygon_cells(surface, coords)
+    if kind == "MultiPolygon":
+        parts = [rasterize.polygon_cells(surface, rings) for rings in coords]
+        return numpy.unique(numpy.concatenate(
+            parts + [numpy.empty(0, dtype=numpy.int64)]))
+    raise ValueError("Unsupported GeoJSON geometry: %s" % kind)
+
+
+def read_geojson_features(surface, path, weight_field=None, id_field=None):
+    """
+    Name:     read_geojson_features
+    Inputs:   - CostSurface, cost raster (surface)
+              - str, GeoJSON FeatureCollection file (path)
+              - [optional] str or list, weight property name(s)
+                (weight_field)
+              - [optional] str, ID property; the feature "id" member or
+                its position (from 0) without one (id_field)
+    Outputs:  list, (feature ID, [flat cell index], weight) tuples
+    Features: Points seed from the cell under them, polygons from every
+              cell whose centre they contain and lines from every cell
+              they cross
+    """
+    with open(path) as f:
+        collection = json.load(f)
+    if collection.get("type") == "Feature":
+        collection = {"features": [collection]}
+    features = []
+    for k, feat in enumerate(collection.get("features", [])):
+        props = feat.get("properties") or {}
+        if id_field:
+            featID = props.get(id_field)
+        else:
+            featID = feat.get("id", k)
+        features.append((featID, geojson_cells(surface, feat["geometry"]),
+                         _weight(props, weight_field)))
+    return features
+
+
+def read_features(surface, path, weight_field=None, id_field=None,
+                  x_field="x", y_field="y"):
+    """
+    Name:     read_features
+    Inputs:   - CostSurface, cost raster (surface)
+              - str, .csv, .geojson or .json feature file (path)
+              - [optional] str or list, weight field name(s)
+                (weight_field)
+              - [optional] str, ID field (id_field)
+              - [optional] str, CSV x coordinate column (x_field)
+              - [optional] str, CSV y coordinate column (y_field)
+    Outputs:  list, (feature ID, [flat cell index], weight) tuples
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return read_csv_features(
+            surface, path, weight_field, id_field, x_field, y_field)
+    if ext in (".geojson", ".json"):
+        return read_geojson_features(surface, path, weight_field, id_field)
+    raise ValueError("Unsupported feature file (use .csv or .geojson): %s"
+                     % path)
+
+
+def read_sites(surface, path, id_field=None, x_field="x", y_field="y"):
+    """
+    Name:     read_sites
+    Inputs:   - CostSurface, cost raster (surface)
+              - str, .csv, .geojson or .json site file (path)
+              - [optional] str, ID field (id_field)
+              - [optional] str, CSV x coordinate column (x_field)
+              - [optional] str, CSV y coordinate column (y_field)
+    Outputs:  list, (site ID, flat cell index) pairs, -1 for sites off the
+              raster
+    Features: Sites are points; a line or polygon site takes the first
+              cell it covers
+    """
+    return [(siteID, int(cells[0]) if len(cells) else -1)
+            for siteID, cells, _ in read_features(
+                surface, path, None, id_field, x_field, y_field)]
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# influence.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Single-pass influence accumulation. The SPI surface is
+#
+#     sum_i w_i * (1 - cd_i / M) = sum_i w_i - (1/M) * sum_i w_i * cd_i
+#
+# where M is the largest cost distance over all features. Keeping a running
+# float64 sum of w_i * cd_i together with sum_i w_i and the running M gives
+# the same surface as normalising, inverting and summing every feature's
+# raster, without writing any per-feature rasters.
+#
+# Features arrive as CostWindows. Cells outside a window all share the same
+# cost distance (the threshold), so that part of w_i * cd_i is kept as a
+# scalar offset and only the window itself touches the array.
+#
+# Several weighting scenarios can share one cost distance pass: with a
+# weight vector per feature the sums carry a leading scenario axis and each
+# window is added as the outer product of the weights and the window, so
+# the K surfaces are the weight matrix multiplied into the cost distances.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import numpy
+
+from .costdist import CostWindow
+
+
+##############################################################################
+# CLASSES
+##############################################################################
+class InfluenceAccumulator(object):
+    """
+    Name:     InfluenceAccumulator
+    Features: Running sums for the fused SPI calculation, for one weight
+              per feature or for K weighting scenarios at once
+    """
+    def __init__(self, shape, weighted=None, scenarios=None):
+        """
+        Name:     InfluenceAccumulator.__init__
+        Inputs:   - tuple, raster shape as (rows, columns) (shape)
+                  - [optional] numpy.ndarray, zeroed float64 array to
+                    accumulate into, e.g. backed by shared memory
+                    (weighted)
+                  - [optional] int, number of weighting scenarios K; each
+                    feature weight is then a length-K vector (scenarios)
+        """
+        shape = tuple(shape)
+        if scenarios is not None:
+            shape = (int(scenarios),) + shape
+        if weighted is None:
+            weighted = numpy.zeros(shape, dtype=numpy.float64)
+        self.weighted = weighted
+        self.scenarios = scenarios
+        self.offset = numpy.zeros(shape[:-2]) if scenarios else 0.0
+        self.weight_sum = numpy.zeros(shape[:-2]) if scenarios else 0.0
+        self.max_cost_dist = 0.0
+        self.count = 0
+
+    def add(self, cd, weight):
+        """
+        Name:     InfluenceAccumulator.add
+        Inputs:   - numpy.ndarray, full-extent feature cost distance, NaN
+                    where unreachable (cd)
+                  - float or list, feature weight(s) (weight)
+        Outputs:  float, the feature's maximum cost distance
+        Features: Folds one feature's cost distance into the running sums
+        """
+        cd_max = 0.0
+        if numpy.isfinite(cd).any():
+            cd_max = float(numpy.nanmax(cd))
+        return self.add_window(
+            CostWindow(0, 0, cd, numpy.nan, cd_max, cd.shape), weight)
+
+    def add_window(self, window, weight):
+        """
+        Name:     InfluenceAccumulator.add_window
+        Inputs:   - CostWindow, feature cost distance (window)
+                  - float or list, feature weight, one per scenario when
+                    accumulating scenarios (weight)
+        Outputs:  float, the feature's maximum cost distance
+        Features: Folds one feature's windowed cost distance into the
+                  running sums by window offset
+        """
+        if self.scenarios:
+            weight = numpy.asarray(weight, dtype=numpy.float64)
+            if weight.shape != (self.scenarios,):
+                raise ValueError(
+                    "Expected %d scenario weights, got %r" % (
+                        self.scenarios, weight.shape))
+        else:
+            weight = float(weight)
+
+        block = window.block
+        if numpy.isnan(window.fill):
+            if not window.covers():
+                self._unreachable_outside(window)
+        else:
+            # Outside the window every passable cell sits at the fill value
+            self.offset += window.fill*weight
+            block = block - window.fill
+        if self.scenarios:
+            self.weighted[(Ellipsis,) + window.slices()] += (
+                numpy.multiply.outer(weight, block))
+        else:
+            self.weighted[window.slices()] += block*weight
+        self.weight_sum += weight
+        self.count += 1
+        if window.max_cost_dist > self.max_cost_dist:
+            self.max_cost_dist = window.max_cost_dist
+        return window.max_cost_dist
+
+    def add_cluster(self, window, offsets, weights):
+        """
+        Name:     InfluenceAccumulator.add_cluster
+        Inputs:   - CostWindow, cost distance from the cluster's
+                    representative (window)
+                  - numpy.ndarray, cost distance from the representative
+                    to each member, d_i (offsets)
+                  - numpy.ndarray, member weights, shaped (m,) or (m, K)
+                    for scenarios (weights)
+        Outputs:  float, the representative's maximum cost distance
+        Features: Folds a cluster of features in as if each member's cost
+                  distance were max(cd_rep, d_i), the midpoint of the range
+                  [|cd_rep - d_i|, cd_rep + d_i] the triangle inequality
+                  allows. With the offsets sorted, sum_i w_i max(c, d_i) is
+                  c times the weight of the members with d_i <= c plus the
+                  sum of w_i d_i over the rest, so every cell takes one
+                  searchsorted lookup however many members there are
+        """
+        d = numpy.asarray(offsets, dtype=numpy.float64)
+        order = numpy.argsort(d)
+        d = d[order]
+        w = numpy.asarray(weights, dtype=numpy.float64)[order]
+        if self.scenarios and w.shape != (len(d), self.scenarios):
+            raise ValueError(
+                "Expected %d scenario weights per member, got %r" % (
+                    self.scenarios, w.shape))
+        wd = w*d.reshape((-1,) + (1,)*(w.ndim - 1))
+        zero = numpy.zeros((1,) + w.shape[1:])
+        w_le = numpy.concatenate([zero, numpy.cumsum(w, axis=0)])
+        wd_gt = wd.sum(axis=0) - numpy.concatenate(
+            [zero, numpy.cumsum(wd, axis=0)])
+
+        def summed(c):
+            # sum_i w_i max(c, d_i), scenario axis leading
+            c = numpy.asarray(c, dtype=numpy.float64)
+            j = numpy.searchsorted(d, c, side="right")
+            if w.ndim == 1:
+                return c*w_le[j] + wd_gt[j]
+            return numpy.moveaxis(c[..., None]*w_le[j] + wd_gt[j], -1, 0)
+
+        terms = summed(window.block)
+        if numpy.isnan(window.fill):
+            if not window.covers():
+                self._unreachable_outside(window)
+        else:
+            fill = summed(window.fill)
+            self.offset += fill
+            terms = terms - numpy.reshape(fill, (-1, 1, 1)[:terms.ndim])
+        self.weighted[(Ellipsis,) + window.slices()] += terms
+        self.weight_sum += w.sum(axis=0)
+        self.count += len(d)
+        if window.max_cost_dist > self.max_cost_dist:
+            self.max_cost_dist = window.max_cost_dist
+        return window.max_cost_dist
+
+    def add_stack(self, row0, col0, stack, fill, weights, maxima):
+        """
+        Name:     InfluenceAccumulator.add_stack
+        Inputs:   - int, first row of the stack window (row0)
+                  - int, first column of the stack window (col0)
+                  - numpy.ndarray, (K, rows, columns) cost distances of K
+                    features, NaN where impassable or unreachable (stack)
+                  - float, value outside the window (fill)
+                  - numpy.ndarray, feature weights, shaped (K,) or (K, S)
+                    for S scenarios (weights)
+                  - numpy.ndarray, maximum cost distance of each feature
+                    (maxima)
+        Outputs:  None.
+        Features: Folds a batch of features sharing one window into the
+                  running sums with a single tensordot over the batch axis
+        """
+        w = numpy.asarray(weights, dtype=numpy.float64)
+        window = CostWindow(row0, col0, stack[0], fill, 0.0,
+                            self.weighted.shape[-2:])
+        if numpy.isnan(fill):
+            if not window.covers():
+                self._unreachable_outside(window)
+        else:
+            self.offset += fill*w.sum(axis=0)
+            stack = stack - fill
+        self.weighted[(Ellipsis,) + window.slices()] += numpy.tensordot(
+            w, stack, axes=([0], [0]))
+        self.weight_sum += w.sum(axis=0)
+        self.count += len(w)
+        if len(maxima) and max(maxima) > self.max_cost_dist:
+            self.max_cost_dist = float(max(maxima))
+
+    def merge(self, other):
+        """
+        Name:     InfluenceAccumulator.merge
+        Inputs:   InfluenceAccumulator, partial sums over other features
+                  (other)
+        Outputs:  None.
+        Features: Adds another accumulator's running sums into this one
+        """
+        nrows = self.weighted.shape[-2]
+        for row in range(0, nrows, 1024):
+            self.weighted[..., row:row + 1024, :] += (
+                other.weighted[..., row:row + 1024, :])
+        self.offset += other.offset
+        self.weight_sum += other.weight_sum
+        self.count += other.count
+        self.max_cost_dist = max(self.max_cost_dist, other.max_cost_dist)
+
+    def _unreachable_outside(self, window):
+        """
+        Name:     InfluenceAccumulator._unreachable_outside
+        Inputs:   CostWindow, unbounded feature cost distance (window)
+        Outputs:  None.
+        Features: Marks every cell outside the window as NoData; only
+                  happens when the surface has disconnected regions
+        """
+        rows, cols = window.slices()
+        self.weighted[..., :rows.start, :] = numpy.nan
+        self.weighted[..., rows.stop:, :] = numpy.nan
+        self.weighted[..., rows, :cols.start] = numpy.nan
+        self.weighted[..., rows, cols.stop:] = numpy.nan
+
+    def blocks(self, surface=None, chunk_rows=1024):
+        """
+        Name:     InfluenceAccumulator.blocks
+        Inputs:   - [optional] CostSurface, cells impassable on this surface
+                    are set to NaN (surface)
+                  - [optional] int, rows per block (chunk_rows)
+        Outputs:  generator, (first row, block) pairs of SPI values with
+                  NaN for NoData, shaped (rows, columns) or (K, rows,
+                  columns) for scenarios
+        Features: Applies the global normalisation to the running sums a
+                  block of rows at a time, so memory-mapped sums are never
+                  fully materialised
+        """
+        nrows, ncols = self.weighted.shape[-2:]
+        offset = numpy.reshape(self.offset, (-1, 1, 1)[:self.weighted.ndim])
+        weight_sum = numpy.reshape(
+            self.weight_sum, (-1, 1, 1)[:self.weighted.ndim])
+        for row in range(0, nrows, chunk_rows):
+            block = self.weighted[..., row:row + chunk_rows, :] + offset
+            if self.max_cost_dist > 0:
+                block /= -self.max_cost_dist
+            else:
+                # Every reached cell is a source cell
+                block *= 0.0
+            block += weight_sum
+            if surface is not None:
+                mask = surface.passable_window(row, 0, chunk_rows, ncols)
+                block[..., ~mask] = numpy.nan
+            yield row, block
+
+    def result(self, surface=None, out=None, nodata=numpy.nan,
+               chunk_rows=1024):
+        """
+        Name:     InfluenceAccumulator.result
+        Inputs:   - [optional] CostSurface, cells impassable on this surface
+                    are set to NaN (surface)
+                  - [optional] numpy.ndarray, float array to write into,
+                    e.g. a numpy.memmap output raster (out)
+                  - [optional] float, value written for NoData (nodata)
+                  - [optional] int, rows processed at a time (chunk_rows)
+        Outputs:  numpy.ndarray, SPI surface, or a (K, rows, columns)
+                  stack for scenarios (nodata where any feature's cost
+                  distance is NoData)
+        Features: Writes the blocks from InfluenceAccumulator.blocks into
+                  one array
+        """
+        if out is None:
+            out = numpy.empty(self.weighted.shape, dtype=numpy.float64)
+        for row, block in self.blocks(surface, chunk_rows):
+            if not numpy.isnan(nodata):
+                block[numpy.isnan(block)] = nodata
+            out[..., row:row + chunk_rows, :] = block
+        return out
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# instrument.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Structured run instrumentation. Stages (load, search, output, ...) and
+# individual features are timed and recorded with their search counters
+# (cells settled, heap pushes and pops, window size), cache hits and bytes
+# read and written. Every record is emitted as one JSON line to a log file
+# and/or passed to a callback, and a summary table shows where the time
+# went and which features were slowest.
+#
+# -----
+# USAGE
+# -----
+#   inst = Instrumentation("run.jsonl")
+#   with inst.stage("run"):
+#       acc = summed_influence(surface, features, instrument=inst)
+#   print(inst.summary())
+#   inst.close()
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import contextlib
+import json
+import time
+
+from .costdist import cost_window
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+# Linux per-process I/O counters (bytes that actually hit storage)
+PROC_IO = "/proc/self/io"
+
+# Per-feature counters summed in the summary table
+FEATURE_COUNTERS = ("settled", "heap_pushes", "heap_pops", "window_cells",
+                    "bytes_read", "bytes_written")
+
+
+##############################################################################
+# CLASSES
+##############################################################################
+class Instrumentation(object):
+    """
+    Name:     Instrumentation
+    Features: Collects stage and per-feature records, emits them as JSON
+              lines and summarises them at the end of a run
+    """
+    def __init__(self, path=None, callback=None):
+        """
+        Name:     Instrumentation.__init__
+        Inputs:   - [optional] str, JSON lines file to append to (path)
+                  - [optional] function, called with each record dict
+                    (callback)
+        """
+        self.path = path
+        self.callback = callback
+        self.stages = {}
+        self.features = []
+        self._start = time.perf_counter()
+        self._file = open(path, "a") if path else None
+
+    def emit(self, record):
+        """
+        Name:     Instrumentation.emit
+        Inputs:   dict, record to emit (record)
+        Outputs:  None.
+        Features: Stamps the record with the time since the run started and
+                  writes it to the log file and callback
+        """
+        record["t"] = round(time.perf_counter() - self._start, 6)
+        if self._file is not None:
+            self._file.write(json.dumps(record, default=float) + "\n")
+            self._file.flush()
+        if self.callback is not None:
+            self.callback(record)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Name:     Instrumentation.stage
+        Inputs:   str, stage name (name)
+        Outputs:  dict, the stage record; callers may add fields to it
+        Features: Context manager timing a stage; process I/O is taken from
+                  the OS counters unless the caller sets bytes_read or
+                  bytes_written itself
+        """
+        record = {"event": "stage", "stage": name}
+        io0 = io_counters()
+        t0 = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = round(time.perf_counter() - t0, 6)
+            io1 = io_counters()
+            if io0 is not None and io1 is not None:
+                for key in ("bytes_read", "bytes_written"):
+                    record.setdefault(key, io1[key] - io0[key])
+            totals = self.stages.setdefault(
+                name, {"calls": 0, "wall_s": 0.0, "bytes_read": 0,
+                       "bytes_written": 0})
+            totals["calls"] += 1
+            for key in ("wall_s", "bytes_read", "bytes_written"):
+                totals[key] += record.get(key) or 0
+            self.emit(record)
+
+    def feature(self, featID, **fields):
+        """
+        Name:     Instrumentation.feature
+        Inputs:   - feature ID (featID)
+                  - keyword fields, e.g. cd_max, search_s and the counters
+                    returned by run_feature (fields)
+        Outputs:  None.
+        """
+        record = {"event": "feature", "id": featID}
+        record.update(fields)
+        self.features.append(record)
+        self.emit(record)
+
+    def summary(self, top=10):
+        """
+        Name:     Instrumentation.summary
+        Inputs:   [optional] int, number of slowest features to list (top)
+        Outputs:  str, plain text summary table
+        """
+        total = time.perf_counter() - self._start
+        lines = ["%-20s %6s %10s %6s %12s %12s" % (
+            "Stage", "Calls", "Wall (s)", "Share", "Read (MB)",
+            "Written (MB)")]
+        for name, s in self.stages.items():
+            lines.append("%-20s %6d %10.3f %5.1f%% %12.1f %12.1f" % (
+                name[:20], s["calls"], s["wall_s"],
+                100.0*s["wall_s"]/total if total > 0 else 0.0,
+                s["bytes_read"]/1048576.0, s["bytes_written"]/1048576.0))
+        lines.append("%-20s %6s %10.3f" % ("Total", "", total))
+
+        feats = self.features
+        if feats:
+            search = sum(f.get("search_s") or 0.0 for f in feats)
+            add = sum(f.get("add_s") or 0.0 for f in feats)
+            hits = sum(1 for f in feats if f.get("cache") == "hit")
+            lines.append("")
+            lines.append(
+                "Features: %d  search %.3f s  accumulate %.3f s  "
+                "cache hits %d" % (len(feats), search, add, hits))
+            lines.append("  " + "  ".join(
+                "%s %d" % (key, sum(f.get(key) or 0 for f in feats))
+                for key in FEATURE_COUNTERS))
+            slow = sorted(feats, key=lambda f: -(f.get("search_s") or 0.0))
+            lines.append("")
+            lines.append("%-12s %10s %12s %12s %6s" % (
+                "Slowest ID", "Search (s)", "Settled", "Window", "Cache"))
+            for f in slow[:top]:
+                lines.append("%-12s %10.3f %12d %12d %6s" % (
+                    str(f["id"])[:12], f.get("search_s") or 0.0,
+                    f.get("settled") or 0, f.get("window_cells") or 0,
+                    f.get("cache") or "-"))
+        return "\n".join(lines)
+
+    def close(self):
+        """Closes the log file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def io_counters():
+    """
+    Name:     io_counters
+    Inputs:   None.
+    Outputs:  dict, bytes_read and bytes_written by this process so far,
+              or None where the OS does not report them
+    """
+    try:
+        with open(PROC_IO) as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return {"bytes_read": int(fields["read_bytes"]),
+                "bytes_written": int(fields["write_bytes"])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def stage(instrument, name):
+    """
+    Name:     stage
+    Inputs:   - Instrumentation, or None (instrument)
+              - str, stage name (name)
+    Outputs:  context manager timing the stage, or doing nothing without
+              an Instrumentation
+    """
+    if instrument is None:
+        return contextlib.nullcontext({})
+    return instrument.stage(name)
+
+
+def run_feature(surface, seeds, weight, acc, max_cost=None, cache=None,
+                keep=None, lookup=True):
+    """
+    Name:     run_feature
+    Inputs:   - CostSurface, cost raster (surface)
+              - list, flat cell indexes of the source (seeds)
+              - float or numpy.ndarray, weight or scenario weights (weight)
+              - InfluenceAccumulator, running sums, or None to leave the
+                window to keep (acc)
+              - [optional] float, maximum cost distance (max_cost)
+              - [optional] CostDistanceCache, per-feature cache (cache)
+              - [optional] function, called with the feature's CostWindow,
+                e.g. to archive it (keep)
+              - [optional] bool, look the feature up in the cache; False
+                when the caller has already missed it, so the search is
+                only stored (lookup)
+    Outputs:  tuple, (cd_max, dict of timings and counters)
+    Features: One feature of the streaming loop: search (or cache lookup)
+              then accumulate, timed separately
+    """
+    stats = {"cache": None}
+    t0 = time.perf_counter()
+    if cache is None:
+        window = cost_window(surface, seeds, max_cost, stats)
+    else:
+        hits, read, written = cache.hits, cache.bytes_read, cache.bytes_written
+        window = cache.window(surface, seeds, max_cost, stats, lookup)
+        stats["cache"] = "hit" if cache.hits > hits else "miss"
+        stats["bytes_read"] = cache.bytes_read - read
+        stats["bytes_written"] = cache.bytes_written - written
+    t1 = time.perf_counter()
+    stats["search_s"] = round(t1 - t0, 6)
+    if acc is None:
+        cd_max = window.max_cost_dist
+    else:
+        cd_max = acc.add_window(window, weight)
+        stats["add_s"] = round(time.perf_counter() - t1, 6)
+    stats["window_cells"] = window.block.size
+    if keep is not None:
+        keep(window)
+    return cd_max, stats
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# journal.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Checkpoint and resume for long per-feature runs. A run journal is a
+# folder holding state.json (the content hash of the inputs, the feature
+# IDs already folded in, and the accumulator's scalar sums and running
+# maximum cost distance) and the matching copy of the weighted sum array
+# (sum_<generation>.npy).
+#
+# A checkpoint writes the next generation's array, syncs it, then replaces
+# state.json atomically and removes the old generation, so a crash at any
+# point leaves a consistent state to resume from. Restarting with the same
+# inputs restores the sums and skips the features already done; if the
+# cost surface, features, weights or threshold have changed, the journal
+# refuses to resume.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import glob
+import hashlib
+import json
+import os
+import time
+
+import numpy
+from numpy.lib.format import open_memmap
+
+from .validate import ValidationError
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+# Default checkpoint frequency: whichever comes first
+DEFAULT_EVERY = 100
+DEFAULT_SECONDS = 600.0
+
+STATE_FILE = "state.json"
+CHUNK_ROWS = 1024
+
+
+##############################################################################
+# CLASSES
+##############################################################################
+class RunJournal(object):
+    """
+    Name:     RunJournal
+    Features: Records completed features and periodically checkpoints the
+              influence accumulator so an interrupted run can resume
+    """
+    def __init__(self, directory, digest, every=DEFAULT_EVERY,
+                 seconds=DEFAULT_SECONDS):
+        """
+        Name:     RunJournal.__init__
+        Inputs:   - str, journal folder, created if missing (directory)
+                  - str, content hash of the run inputs, from
+                    inputs_digest (digest)
+                  - [optional] int, checkpoint after this many features
+                    (every)
+                  - [optional] float, or after this many seconds
+                    (seconds)
+        Features: Opens an existing journal; raises ValidationError if it
+                  was written for different inputs
+        """
+        self.directory = directory
+        self.digest = digest
+        self.every = max(1, int(every))
+        self.seconds = float(seconds)
+        self.state = None
+        self.done = []
+        self._done = set()
+        self._pending = 0
+        self._last = time.time()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        path = os.path.join(directory, STATE_FILE)
+        if os.path.isfile(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get("inputs") != digest:
+                raise ValidationError(
+                    "JournalMismatchError",
+                    "The checkpoint in %s was written for different inputs "
+                    "(cost surface, features, weights or maximum cost "
+                    "distance changed); it cannot be resumed." % directory)
+            self.state = state
+            self.done = list(state["done"])
+            self._done = set(_key(i) for i in self.done)
+
+    @property
+    def generation(self):
+        """Generation number of the last checkpoint, 0 if none"""
+        return self.state["generation"] if self.state else 0
+
+    def is_done(self, featID):
+        """Whether the feature is already in the checkpointed sums"""
+        return _key(featID) in self._done
+
+    def restore(self, acc):
+        """
+        Name:     RunJournal.restore
+        Inputs:   InfluenceAccumulator, freshly created (acc)
+        Outputs:  int, number of features restored
+        Features: Loads the last checkpoint into the accumulator
+        """
+        if self.state is None:
+            return 0
+        saved = open_memmap(self._sum_path(self.generation), mode="r")
+        if saved.shape != acc.weighted.shape:
+            raise ValidationError(
+                "JournalMismatchError",
+                "The checkpoint in %s does not match the output shape." %
+                self.directory)
+        for row in range(0, saved.shape[-2], CHUNK_ROWS):
+            acc.weighted[..., row:row + CHUNK_ROWS, :] = (
+                saved[..., row:row + CHUNK_ROWS, :])
+        del saved
+        state = self.state
+        if acc.scenarios:
+            acc.offset = numpy.array(state["offset"], dtype=numpy.float64)
+            acc.weight_sum = numpy.array(
+                state["weight_sum"], dtype=numpy.float64)
+        else:
+            acc.offset = float(state["offset"])
+            acc.weight_sum = float(state["weight_sum"])
+        acc.max_cost_dist = float(state["max_cost_dist"])
+        acc.count = int(state["count"])
+        return len(self.done)
+
+    def record(self, featID, acc):
+        """
+        Name:     RunJournal.record
+        Inputs:   - feature ID just folded into the accumulator (featID)
+                  - InfluenceAccumulator, running sums (acc)
+        Outputs:  bool, whether a checkpoint was written
+        """
+        self.mark([featID])
+        if self._pending >= self.every or \
+                time.time() - self._last >= self.seconds:
+            self.checkpoint(acc)
+            return True
+        return False
+
+    def mark(self, featIDs):
+        """
+        Name:     RunJournal.mark
+        Inputs:   list, feature IDs already folded into the accumulator
+                  (featIDs)
+        Outputs:  None.
+        Features: Adds the features to the completed list without writing
+                  a checkpoint, for callers that fold in a whole batch at
+                  once and checkpoint after it
+        """
+        for featID in featIDs:
+            self.done.append(featID)
+            self._done.add(_key(featID))
+            self._pending += 1
+
+    def checkpoint(self, acc):
+        """
+        Name:     RunJournal.checkpoint
+        Inputs:   InfluenceAccumulator, running sums (acc)
+        Outputs:  None.
+        Features: Writes the next generation and switches state.json to it
+                  atomically
+        """
+        generation = self.generation + 1
+        path = self._sum_path(generation)
+        out = open_memmap(path, mode="w+", dtype=numpy.float64,
+                          shape=acc.weighted.shape)
+        for row in range(0, out.shape[-2], CHUNK_ROWS):
+            out[..., row:row + CHUNK_ROWS, :] = (
+                acc.weighted[..., row:row + CHUNK_ROWS, :])
+        out.flush()
+        del out
+        _fsync(path)
+
+        state = {
+            "inputs": self.digest,
+            "generation": generation,
+            "done": [_json_id(i) for i in self.done],
+            "offset": numpy.asarray(acc.offset).tolist(),
+            "weight_sum": numpy.asarray(acc.weight_sum).tolist(),
+            "max_cost_dist": acc.max_cost_dist,
+            "count": acc.count,
+            "time": time.time(),
+        }
+        tmp = os.path.join(self.directory, STATE_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.directory, STATE_FILE))
+        self.state = state
+        self._pending = 0
+        self._last = time.time()
+        for old in glob.glob(os.path.join(self.directory, "sum_*.npy")):
+            if old != path:
+                os.remove(old)
+
+    def reset(self):
+        """Discards the journal's checkpoint and completed features"""
+        self.finish()
+        self.state = None
+        self.done = []
+        self._done = set()
+        self._pending = 0
+
+    def finish(self):
+        """Removes the journal files once the output is written"""
+        remove_journal(self.directory)
+
+    def _sum_path(self, generation):
+        """Path of a generation's weighted sum array"""
+        return os.path.join(self.directory, "sum_%06d.npy" % generation)
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def _key(featID):
+    """Hashable, JSON-stable form of a feature ID"""
+    return json.dumps(_json_id(featID))
+
+
+def _json_id(featID):
+    """Feature ID as a JSON value"""
+    if isinstance(featID, numpy.generic):
+        return featID.item()
+    return featID
+
+
+def _fsync(path):
+    """Flushes a file to disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def remove_journal(directory):
+    """
+    Name:     remove_journal
+    Inputs:   str, journal folder (directory)
+    Outputs:  None.
+    Features: Deletes a journal's state and checkpoints, whatever inputs
+              it was written for
+    """
+    paths = glob.glob(os.path.join(directory, "sum_*.npy"))
+    paths += [os.path.join(directory, STATE_FILE),
+              os.path.join(directory, STATE_FILE + ".tmp")]
+    for path in paths:
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def inputs_digest(surface, features, max_cost=None, extra=None):
+    """
+    Name:     inputs_digest
+    Inputs:   - CostSurface, cost raster (surface)
+              - list, (feature ID, [flat cell index], weight) tuples
+                (features)
+              - [optional] float, maximum cost distance (max_cost)
+              - [optional] str, any other setting the result depends on
+                (extra)
+    Outputs:  str, SHA-256 hex digest of everything the SPI sums depend on
+    """
+    h = hashlib.sha256(surface.digest().encode("ascii"))
+    h.update(repr(float(max_cost) if max_cost else 0.0).encode("ascii"))
+    h.update(repr(extra).encode("utf-8"))
+    for featID, seeds, weight in features:
+        h.update(_key(featID).encode("utf-8"))
+        h.update(numpy.unique(numpy.asarray(seeds, dtype=numpy.int64))
+                 .tobytes())
+        h.update(numpy.asarray(weight, dtype=numpy.float64).tobytes())
+    return h.hexdigest()
@@ -0,0 +1,618 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# output.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# One-pass SPI output. The normalised surface is produced a block of rows
+# at a time from the running sums, and each block is (optionally) rounded
+# to integers, folded into the band statistics and histogram, and written
+# out, so the output is never reread to calculate statistics or build
+# pyramids.
+#
+# GeoTIFF outputs (.tif, .tiff) are tiled and deflate-compressed (with the
+# TIFF predictor for integer or floating point data), and carry 2x overview
+# levels averaged from the same rows as they pass through. Tiles are
+# written as soon as a row of them is complete and the directories go at
+# the end of the file. ENVI outputs are memory-mapped as before. Either
+# way the statistics and histograms are saved next to the raster in a
+# GDAL/ArcGIS .aux.xml file, together with the cost raster's coordinate
+# system (WKT); GeoTIFFs also carry it as GeoKeys when it has an EPSG code.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import math
+import os
+import struct
+import zlib
+from xml.sax.saxutils import escape
+
+import numpy
+
+from .raster import CHUNK_ROWS, OUT_NODATA, create_envi
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+# Extensions written as tiled GeoTIFFs
+TIFF_EXTS = (".tif", ".tiff")
+
+# GeoTIFF tile size (cells) and deflate level
+TILE_SIZE = 256
+DEFLATE_LEVEL = 6
+
+# Histogram bins per band
+HIST_BINS = 256
+
+# Classic TIFF offsets are 32-bit; larger outputs are written as BigTIFF
+BIGTIFF_BYTES = 3*1024**3
+
+# TIFF field types: (code, struct format)
+SHORT = (3, "H")
+LONG = (4, "I")
+DOUBLE = (12, "d")
+ASCII = (2, "s")
+LONG8 = (16, "Q")
+
+# GeoKeys: model type (projected or geographic), raster type (PixelIsArea)
+# and the EPSG coordinate system codes
+GT_MODEL_TYPE = 1024
+GT_RASTER_TYPE = 1025
+GEOGRAPHIC_TYPE = 2048
+PROJECTED_CS_TYPE = 3072
+
+
+##############################################################################
+# CLASSES
+##############################################################################
+class RasterStats(object):
+    """
+    Name:     RasterStats
+    Features: Streaming statistics of one band: count, minimum, maximum,
+              mean and standard deviation (blocks merged with Chan's
+              update) and a histogram whose power-of-two bin width doubles
+              whenever new values fall outside it
+    """
+    def __init__(self, bins=HIST_BINS):
+        """
+        Name:     RasterStats.__init__
+        Inputs:   [optional] int, number of histogram bins (bins)
+        """
+        self.bins = int(bins)
+        self.count = 0
+        self.minimum = numpy.inf
+        self.maximum = -numpy.inf
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.width = None
+        self.base = 0
+        self.counts = numpy.zeros(self.bins, dtype=numpy.int64)
+
+    def update(self, values):
+        """
+        Name:     RasterStats.update
+        Inputs:   numpy.ndarray, valid (non-NoData) values (values)
+        Outputs:  None.
+        """
+        values = numpy.asarray(values, dtype=numpy.float64).reshape(-1)
+        n = values.size
+        if not n:
+            return
+        lo = float(values.min())
+        hi = float(values.max())
+        mean = float(values.mean())
+        m2 = float(((values - mean)**2).sum())
+        total = self.count + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta*delta*self.count*n/total
+        self.mean += delta*n/total
+        self.count = total
+        self.minimum = min(self.minimum, lo)
+        self.maximum = max(self.maximum, hi)
+
+        if self.width is None:
+            span = max(hi - lo, abs(hi)*1e-12, 1e-12)
+            self.width = 2.0**math.ceil(math.log2(span/self.bins))
+            self.base = int(math.floor(lo/self.width))
+        while math.floor(lo/self.width) < self.base or \
+                math.floor(hi/self.width) >= self.base + self.bins:
+            self._coarsen()
+        index = numpy.floor(values/self.width).astype(numpy.int64)
+        index -= self.base
+        numpy.clip(index, 0, self.bins - 1, out=index)
+        self.counts += numpy.bincount(index, minlength=self.bins)
+
+    def _coarsen(self):
+        """Doubles the bin width, merging neighbouring bins"""
+        index = numpy.arange(self.base, self.base + self.bins) // 2
+        self.base //= 2
+        counts = numpy.zeros(self.bins, dtype=numpy.int64)
+        numpy.add.at(counts, index - self.base, self.counts)
+        self.counts = counts
+        self.width *= 2.0
+
+    @property
+    def std(self):
+        """Population standard deviation"""
+        return math.sqrt(self.m2/self.count) if self.count else 0.0
+
+    def summary(self, cells=None):
+        """
+        Name:     RasterStats.summary
+        Inputs:   [optional] int, cells in the band, for the valid
+                  percentage (cells)
+        Outputs:  dict, statistics and histogram
+        """
+        out = {"count": self.count, "min": None, "max": None,
+               "mean": None, "std": None}
+        if self.count:
+            out.update({"min": self.minimum, "max": self.maximum,
+                        "mean": self.mean, "std": self.std})
+            out["hist_min"] = self.base*self.width
+            out["hist_max"] = (self.base + self.bins)*self.width
+            out["hist"] = self.counts.tolist()
+        if cells:
+            out["valid_percent"] = 100.0*self.count/cells
+        return out
+
+
+class _Level(object):
+    """
+    Name:     _Level
+    Features: One resolution level of a tiled GeoTIFF; rows arrive in
+              strips, are written a row of tiles at a time and are halved
+              into the next overview level
+    """
+    def __init__(self, writer, rows, cols):
+        self.writer = writer
+        self.rows = rows
+        self.cols = cols
+        size = writer.tile
+        self.across = -(-cols//size)
+        self.down = -(-rows//size)
+        bands = writer.bands
+        self.offsets = numpy.zeros((bands, self.down, self.across),
+                                   dtype=numpy.uint64)
+        self.counts = numpy.zeros((bands, self.down, self.across),
+                                  dtype=numpy.uint64)
+        self.strip = numpy.empty((bands, 0, cols))
+        self.carry = numpy.empty((bands, 0, cols))
+        self.tile_row = 0
+        self.next = None
+        if max(rows, cols) > size:
+            self.next = _Level(writer, -(-rows//2), -(-cols//2))
+
+    def push(self, block):
+        """
+        Name:     _Level.push
+        Inputs:   numpy.ndarray, (bands, rows, columns) float values with
+                  NaN for NoData (block)
+        Outputs:  None.
+        """
+        size = self.writer.tile
+        self.strip = numpy.concatenate([self.strip, block], axis=1)
+        while self.strip.shape[1] >= size:
+            self._write_tiles(self.strip[:, :size])
+            self.strip = self.strip[:, size:]
+        if self.next is not None:
+            pending = numpy.concatenate([self.carry, block], axis=1)
+            even = pending.shape[1]//2*2
+            if even:
+                self.next.push(halve(pending[:, :even]))
+            self.carry = pending[:, even:]
+
+    def finish(self):
+        """Writes the last partial row of tiles and flushes the overviews"""
+        if self.strip.shape[1]:
+            self._write_tiles(self.strip)
+        if self.next is not None:
+            if self.carry.shape[1]:
+                self.next.push(halve(self.carry))
+            self.next.finish()
+
+    def _write_tiles(self, strip):
+        """Converts, pads, compresses and writes one row of tiles"""
+        writer = self.writer
+        size = writer.tile
+        values = writer.convert(strip)
+        full = numpy.full((writer.bands, size, self.across*size),
+                          writer.nodata, dtype=writer.dtype)
+        full[:, :values.shape[1], :self.cols] = values
+        for band in range(writer.bands):
+            for k in range(self.across):
+                tile = full[band, :, k*size:(k + 1)*size]
+                offset, count = writer.write_tile(tile)
+                self.offsets[band, self.tile_row, k] = offset
+                self.counts[band, self.tile_row, k] = count
+        self.tile_row += 1
+
+
+class TiledTiffWriter(object):
+    """
+    Name:     TiledTiffWriter
+    Features: Writes a tiled, deflate-compressed GeoTIFF with 2x overviews
+              in a single pass over the rows
+    """
+    def __init__(self, path, georef, bands=1, integer=False,
+                 nodata=OUT_NODATA, tile=TILE_SIZE, level=DEFLATE_LEVEL,
+                 overviews=True):
+        """
+        Name:     TiledTiffWriter.__init__
+        Inputs:   - str, output file (path)
+                  - CostSurface, surface providing shape and
+                    georeferencing (georef)
+                  - [optional] int, number of bands (bands)
+                  - [optional] bool, write int32 rounded values rather
+                    than float32 (integer)
+                  - [optional] float, NoData value (nodata)
+                  - [optional] int, tile size in cells, a multiple of 16
+                    (tile)
+                  - [optional] int, deflate level (level)
+                  - [optional] bool, build overview levels (overviews)
+        """
+        self.path = path
+        self.georef = georef
+        self.bands = int(bands)
+        self.integer = integer
+        self.dtype = numpy.dtype("<i4" if integer else "<f4")
+        self.nodata = nodata
+        self.tile = int(tile)
+        self.level = int(level)
+        rows, cols = georef.shape
+        self.big = self.bands*rows*cols*4 > BIGTIFF_BYTES
+        self.file = open(path, "wb")
+        if self.big:
+            self.file.write(b"II" + struct.pack("<HHHQ", 43, 8, 0, 0))
+        else:
+            self.file.write(b"II" + struct.pack("<HI", 42, 0))
+        self.root = _Level(self, rows, cols)
+        if not overviews:
+            self.root.next = None
+
+    def convert(self, block):
+        """Output values of a float block (see output_values)"""
+        return output_values(block, self.integer, self.nodata)
+
+    def write(self, block):
+        """
+        Name:     TiledTiffWriter.write
+        Inputs:   numpy.ndarray, the next rows as (bands, rows, columns)
+                  float values with NaN for NoData (block)
+        Outputs:  None.
+        """
+        self.root.push(numpy.reshape(
+            block, (self.bands,) + block.shape[-2:]))
+
+    def write_tile(self, tile):
+        """
+        Name:     TiledTiffWriter.write_tile
+        Inputs:   numpy.ndarray, one full tile of output values (tile)
+        Outputs:  tuple, (file offset, compressed byte count)
+        """
+        data = zlib.compress(predict(tile, self.dtype), self.level)
+        offset = self.file.tell()
+        if offset % 2:
+            self.file.write(b"\0")
+            offset += 1
+        self.file.write(data)
+        return offset, len(data)
+
+    def close(self):
+        """
+        Name:     TiledTiffWriter.close
+        Inputs:   None.
+        Outputs:  None.
+        Features: Flushes the last tiles and writes the image file
+                  directories, full resolution first, then the overviews
+        """
+        self.root.finish()
+        f = self.file
+        pointer = 8 if self.big else 4
+        level = self.root
+        first = True
+        while level is not None:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            pos += pos % 2
+            data, next_at = self._ifd(level, pos, first)
+            f.seek(pointer)
+            f.write(struct.pack("<Q" if self.big else "<I", pos))
+            f.seek(pos)
+            f.write(data)
+            pointer = next_at
+            level = level.next
+            first = False
+        f.close()
+
+    def _ifd(self, level, pos, first):
+        """
+        Name:     TiledTiffWriter._ifd
+        Inputs:   - _Level, level to describe (level)
+                  - int, file offset of the directory (pos)
+                  - bool, full resolution image (first)
+        Outputs:  tuple, (directory bytes with its out-of-line values,
+                  file offset of its next-directory pointer)
+        """
+        offset_type = LONG8 if self.big else LONG
+        sample_format = 2 if self.integer else 3
+        entries = [
+            (254, LONG, [0 if first else 1]),
+            (256, LONG, [level.cols]),
+            (257, LONG, [level.rows]),
+            (258, SHORT, [32]*self.bands),
+            (259, SHORT, [8]),
+            (262, SHORT, [1]),
+            (277, SHORT, [self.bands]),
+            (284, SHORT, [2 if self.bands > 1 else 1]),
+            (317, SHORT, [2 if self.integer else 3]),
+            (322, SHORT, [self.tile]),
+            (323, SHORT, [self.tile]),
+            (324, offset_type, level.offsets.reshape(-1).tolist()),
+            (325, offset_type, level.counts.reshape(-1).tolist()),
+            (339, SHORT, [sample_format]*self.bands),
+        ]
+        if first:
+            g = self.georef
+            entries += [
+                (33550, DOUBLE, [g.cell_size, g.cell_size, 0.0]),
+                (33922, DOUBLE, [0.0, 0.0, 0.0, g.x_min, g.y_max, 0.0]),
+                (34735, SHORT, geo_keys(g)),
+            ]
+        entries.append((42113, ASCII, [_nodata_text(self.nodata)]))
+        return _ifd_bytes(entries, pos, self.big)
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def _nodata_text(nodata):
+    """NoData value as GDAL writes it"""
+    if float(nodata).is_integer():
+        return "%d" % nodata
+    return repr(float(nodata))
+
+
+def _ifd_bytes(entries, pos, big):
+    """
+    Name:     _ifd_bytes
+    Inputs:   - list, (tag, field type, values) entries (entries)
+              - int, file offset of the directory (pos)
+              - bool, BigTIFF layout (big)
+    Outputs:  tuple, (directory bytes followed by the values too long to
+              fit in their entries, file offset of the next-directory
+              pointer)
+    """
+    count_fmt, entry_fmt, ptr_fmt = ("<Q", "<HHQ", "<Q") if big else \
+        ("<H", "<HHI", "<I")
+    inline = 8 if big else 4
+    entries = sorted(entries, key=lambda e: e[0])
+    head = struct.calcsize(count_fmt)
+    size = struct.calcsize(entry_fmt) + inline
+    ptr_at = pos + head + len(entries)*size
+    extra_at = ptr_at + struct.calcsize(ptr_fmt)
+
+    ifd = [struct.pack(count_fmt, len(entries))]
+    extra = []
+    for tag, (code, fmt), values in entries:
+        if fmt == "s":
+            value = values[0].encode("ascii") + b"\0"
+            count = len(value)
+        else:
+            value = struct.pack("<%d%s" % (len(values), fmt), *values)
+            count = len(values)
+        ifd.append(struct.pack(entry_fmt, tag, code, count))
+        if len(value) <= inline:
+            ifd.append(value.ljust(inline, b"\0"))
+        else:
+            ifd.append(struct.pack("<Q" if big else "<I", extra_at))
+            if len(value) % 2:
+                value += b"\0"
+            extra.append(value)
+            extra_at += len(value)
+    ifd.append(struct.pack(ptr_fmt, 0))
+    return b"".join(ifd + extra), ptr_at
+
+
+def geo_keys(georef):
+    """
+    Name:     geo_keys
+    Inputs:   CostSurface, surface providing the coordinate system
+              (georef)
+    Outputs:  list, GeoKeyDirectoryTag values: PixelIsArea, plus the model
+              type and EPSG code where known; a coordinate system without
+              an EPSG code is left to the .aux.xml
+    """
+    wkt = (georef.spatial_ref or "").lstrip().upper()
+    epsg = georef.epsg
+    keys = {GT_RASTER_TYPE: 1}
+    if wkt.startswith("PROJ"):
+        keys[GT_MODEL_TYPE] = 1
+        if epsg:
+            keys[PROJECTED_CS_TYPE] = epsg
+    elif wkt.startswith(("GEOGCS", "GEOGCRS", "GEODCRS")):
+        keys[GT_MODEL_TYPE] = 2
+        if epsg:
+            keys[GEOGRAPHIC_TYPE] = epsg
+    out = [1, 1, 0, len(keys)]
+    for key in sorted(keys):
+        out += [key, 0, 1, keys[key]]
+    return out
+
+
+def halve(block):
+    """
+    Name:     halve
+    Inputs:   numpy.ndarray, (bands, rows, columns) values with NaN for
+              NoData (block)
+    Outputs:  numpy.ndarray, 2x2 block means ignoring NoData; odd edges
+              are averaged over the cells they have
+    """
+    bands, rows, cols = block.shape
+    padded = numpy.full((bands, rows + rows % 2, cols + cols % 2), numpy.nan)
+    padded[:, :rows, :cols] = block
+    quads = padded.reshape(bands, padded.shape[1]//2, 2,
+                           padded.shape[2]//2, 2)
+    valid = ~numpy.isnan(quads)
+    total = numpy.where(valid, quads, 0.0).sum(axis=(2, 4))
+    count = valid.sum(axis=(2, 4))
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        return numpy.where(count > 0, total/count, numpy.nan)
+
+
+def predict(tile, dtype):
+    """
+    Name:     predict
+    Inputs:   - numpy.ndarray, one tile of output values (tile)
+              - numpy.dtype, little-endian int32 or float32 (dtype)
+    Outputs:  bytes, tile bytes after the TIFF predictor: horizontal
+              differencing for integers; for floats each row's bytes are
+              regrouped most significant first and differenced bytewise
+              (floating point predictor), so deflate sees smooth runs
+    """
+    tile = numpy.ascontiguousarray(tile, dtype=dtype)
+    if dtype.kind == "i":
+        out = tile.copy()
+        out[:, 1:] -= tile[:, :-1]
+        return out.tobytes()
+    rows, cols = tile.shape
+    planes = tile.view(numpy.uint8).reshape(rows, cols, 4)[:, :, ::-1]
+    planes = numpy.ascontiguousarray(
+        planes.transpose(0, 2, 1)).reshape(rows, 4*cols)
+    out = planes.copy()
+    out[:, 1:] -= planes[:, :-1]
+    return out.tobytes()
+
+
+def output_values(block, integer=False, nodata=OUT_NODATA):
+    """
+    Name:     output_values
+    Inputs:   - numpy.ndarray, float values with NaN for NoData (block)
+              - [optional] bool, round to int32 as int(v + 0.5), the
+                legacy tool's "convert to integer" step (integer)
+              - [optional] float, NoData value (nodata)
+    Outputs:  numpy.ndarray, int32 or float32 values to write
+    """
+    missing = numpy.isnan(block)
+    if integer:
+        values = numpy.trunc(numpy.where(missing, 0.0, block) + 0.5)
+        values = values.astype(numpy.int32)
+    else:
+        values = block.astype(numpy.float32)
+    values[missing] = nodata
+    return values
+
+
+def write_aux(path, stats, names=None, cells=None, spatial_ref=None):
+    """
+    Name:     write_aux
+    Inputs:   - str, raster path; statistics go to <path>.aux.xml (path)
+              - list, RasterStats, one per band (stats)
+              - [optional] list, band names (names)
+              - [optional] int, cells per band (cells)
+              - [optional] str, coordinate system as WKT (spatial_ref)
+    Outputs:  str, path of the .aux.xml file
+    Features: Writes the band statistics and histograms (and coordinate
+              system) in the GDAL PAM format that ArcGIS also reads, so
+              neither rereads the raster
+    """
+    lines = ["<PAMDataset>"]
+    if spatial_ref:
+        lines.append("  <SRS>%s</SRS>" % escape(spatial_ref))
+    for band, st in enumerate(stats):
+        summary = st.summary(cells)
+        lines.append('  <PAMRasterBand band="%d">' % (band + 1))
+        if names:
+            lines.append("    <Description>%s</Description>" % names[band])
+        if summary["count"]:
+            lines += [
+                "    <Histograms>",
+                "      <HistItem>",
+                "        <HistMin>%r</HistMin>" % summary["hist_min"],
+                "        <HistMax>%r</HistMax>" % summary["hist_max"],
+                "        <BucketCount>%d</BucketCount>" % st.bins,
+                "        <IncludeOutOfRange>0</IncludeOutOfRange>",
+                "        <Approximate>0</Approximate>",
+                "        <HistCounts>%s</HistCounts>" % "|".join(
+                    "%d" % c for c in summary["hist"]),
+                "      </HistItem>",
+                "    </Histograms>",
+                "    <Metadata>",
+                '      <MDI key="STATISTICS_MAXIMUM">%r</MDI>' %
+                summary["max"],
+                '      <MDI key="STATISTICS_MEAN">%r</MDI>' % summary["mean"],
+                '      <MDI key="STATISTICS_MINIMUM">%r</MDI>' %
+                summary["min"],
+                '      <MDI key="STATISTICS_STDDEV">%r</MDI>' % summary["std"],
+            ]
+            if cells:
+                lines.append('      <MDI key="STATISTICS_VALID_PERCENT">%r'
+                             '</MDI>' % summary["valid_percent"])
+            lines.append("    </Metadata>")
+        lines.append("  </PAMRasterBand>")
+    lines.append("</PAMDataset>")
+    aux = path + ".aux.xml"
+    with open(aux, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return aux
+
+
+def save_result(acc, surface, out_path, names=None, integer=False,
+                nodata=OUT_NODATA, overviews=True, stats=None):
+    """
+    Name:     save_result
+    Inputs:   - InfluenceAccumulator, finished accumulator (acc)
+              - CostSurface, surface providing the georeferencing (surface)
+              - str, output raster; .tif/.tiff for a tiled GeoTIFF,
+                otherwise ENVI (out_path)
+              - [optional] list, scenario names (names)
+              - [optional] bool, round to integers (integer)
+              - [optional] float, NoData value (nodata)
+              - [optional] bool, build GeoTIFF overviews (overviews)
+              - [optional] list, filled with each band's statistics
+                summary (stats)
+    Outputs:  list, paths of the rasters written
+    Features: Streams the SPI surface a block of rows at a time, one band
+              per scenario, gathering statistics and overviews on the way
+    """
+    if acc.scenarios and not names:
+        names = ["s%d" % (k + 1) for k in range(acc.scenarios)]
+    bands = acc.scenarios or 1
+    band_names = names if acc.scenarios else None
+    dtype = numpy.int32 if integer else numpy.float32
+    tiff = os.path.splitext(out_path)[1].lower() in TIFF_EXTS
+
+    if tiff:
+        writer = TiledTiffWriter(out_path, surface, bands, integer, nodata,
+                                 overviews=overviews)
+    else:
+        writer = create_envi(out_path, surface, dtype, nodata, "SPI output",
+                             band_names)
+    band_stats = [RasterStats() for _ in range(bands)]
+    try:
+        for row, block in acc.blocks(surface, CHUNK_ROWS):
+            block = numpy.reshape(block, (bands,) + block.shape[-2:])
+            values = output_values(block, integer, nodata)
+            valid = ~numpy.isnan(block)
+            for band, st in enumerate(band_stats):
+                st.update(values[band][valid[band]])
+            if tiff:
+                writer.write(block)
+            else:
+                writer[..., row:row + block.shape[1], :] = numpy.reshape(
+                    values, writer.shape[:-2] + values.shape[-2:])
+    finally:
+        if tiff:
+            writer.close()
+        else:
+            writer.flush()
+            del writer
+    write_aux(out_path, band_stats, band_names, surface.size,
+              surface.spatial_ref)
+    if stats is not None:
+        stats.extend(st.summary(surface.size) for st in band_stats)
+    return [out_path]
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# parallel.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Process-pool execution of the per-feature cost distance loop. The cost
+# array is copied into shared memory once (memory-mapped surfaces are
+# instead mapped by each worker from the same file); workers pull features
+# from a queue and fold them into their own partial accumulator (also in
+# shared memory), and the partial sums are reduced by the parent at the end,
+# a block of rows at a time.
+#
+# The partial sums cost workers x scenarios x cells x 8 bytes of RAM on top
+# of the parent's accumulator. When that would not fit in the available
+# memory the workers keep no sums: they send each feature's CostWindow
+# back and the parent folds it into its accumulator (which may be a
+# memory-mapped file), so memory no longer grows with the worker count.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import ctypes
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import numpy
+
+from .costdist import CostSurface
+from .influence import InfluenceAccumulator
+from .instrument import run_feature
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+# Seconds between checks that the workers are still alive while waiting
+# for their results
+POLL_SECONDS = 1.0
+
+# Linux memory statistics, for the memory available to new allocations
+PROC_MEMINFO = "/proc/meminfo"
+
+# Share of the available memory the workers' partial sums may take
+PARTIAL_SHARE = 0.5
+
+# Rows per block when reducing the partial sums
+REDUCE_ROWS = 1024
+
+
+##############################################################################
+# CLASSES
+##############################################################################
+class _MemoryStatus(ctypes.Structure):
+    """MEMORYSTATUSEX for GlobalMemoryStatusEx on Windows"""
+    _fields_ = [("dwLength", ctypes.c_ulong),
+                ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong),
+                ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong),
+                ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong),
+                ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def get_context():
+    """
+    Name:     get_context
+    Inputs:   None.
+    Outputs:  multiprocessing context
+    Features: Returns a spawn context; inside ArcGIS Pro sys.executable is
+              the application rather than Python, so the interpreter of the
+              active environment is used for the worker processes
+    """
+    ctx = multiprocessing.get_context("spawn")
+    exe = os.path.basename(sys.executable).lower()
+    if sys.platform == "win32" and not exe.startswith("python"):
+        ctx.set_executable(os.path.join(sys.exec_prefix, "python.exe"))
+    return ctx
+
+
+def available_memory():
+    """
+    Name:     available_memory
+    Inputs:   None.
+    Outputs:  int, bytes of physical memory available without swapping,
+              or None where the OS does not report it
+    """
+    if sys.platform == "win32":
+        status = _MemoryStatus()
+        status.dwLength = ctypes.sizeof(_MemoryStatus)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return int(status.ullAvailPhys)
+        return None
+    try:
+        with open(PROC_MEMINFO) as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["MemAvailable"].split()[0])*1024
+    except (OSError, KeyError, ValueError, IndexError):
+        return None
+
+
+def partial_bytes(surface, workers, scenarios=None):
+    """
+    Name:     partial_bytes
+    Inputs:   - CostSurface, cost raster (surface)
+              - int, number of worker processes (workers)
+              - [optional] int, number of weighting scenarios (scenarios)
+    Outputs:  int, shared memory taken by the workers' partial sums
+    """
+    return int(workers)*(scenarios or 1)*surface.size*8
+
+
+def _worker(cost_source, acc_name, shape, dtype, georef, max_cost, cache,
+            scenarios, send_windows, tasks, results):
+    """
+    Name:     _worker
+    Inputs:   - tuple, ("shm", shared memory name) or ("file", path,
+                offset) of the cost array (cost_source)
+              - str, shared memory name of this worker's partial sum, or
+                None to keep no sums and send every window back
+                (acc_name)
+              - tuple, raster shape (shape)
+              - str, cost array dtype (dtype)
+              - tuple, (cell size, x_min, y_max, nodata) (georef)
+              - float, maximum cost distance or None (max_cost)
+              - tuple, (CostDistanceCache, surface digest) or None
+                (cache)
+              - int, number of weighting scenarios or None (scenarios)
+              - bool, send each feature's CostWindow back (send_windows)
+              - multiprocessing.Queue, feature tasks (tasks)
+              - multiprocessing.Queue, progress and results (results)
+    Outputs:  None.
+    Features: Worker loop; reports ("feature", ID, cd_max, stats, window
+              or None) per feature and ("done", process ID, offset, weight
+              sum, max cost distance, count) or ("error", traceback text)
+              when finished
+    """
+    cost_shm = acc_shm = None
+    values = surface = acc = None
+    try:
+        if cost_source[0] == "file":
+            values = numpy.memmap(
+                cost_source[1], dtype=dtype, mode="r", shape=shape,
+                offset=cost_source[2])
+        else:
+            cost_shm = shared_memory.SharedMemory(name=cost_source[1])
+            values = numpy.ndarray(shape, dtype=dtype, buffer=cost_shm.buf)
+        surface = CostSurface(values, *georef)
+        if cache is not None:
+            cache, surface._digest = cache
+        if acc_name is not None:
+            acc_shm = shared_memory.SharedMemory(name=acc_name)
+            acc_shape = shape if scenarios is None else (scenarios,) + shape
+            acc = InfluenceAccumulator(
+                shape,
+                weighted=numpy.ndarray(
+                    acc_shape, dtype=numpy.float64, buffer=acc_shm.buf),
+                scenarios=scenarios)
+        kept = []
+        task = tasks.get()
+        while task is not None:
+            featID, seeds, weight = task
+            cd_max, stats = run_feature(
+                surface, seeds, weight, acc, max_cost, cache,
+                kept.append if send_windows else None, lookup=False)
+            stats["worker"] = os.getpid()
+            window = kept.pop() if kept else None
+            results.put(("feature", featID, cd_max, stats, window))
+            task = tasks.get()
+        if acc is None:
+            results.put(("done", os.getpid(), 0.0, 0.0, 0.0, 0))
+        else:
+            results.put(("done", os.getpid(), acc.offset, acc.weight_sum,
+                         acc.max_cost_dist, acc.count))
+    except Exception:
+        results.put(("error", traceback.format_exc()))
+    finally:
+        del values, surface, acc
+        if cost_shm is not None:
+            cost_shm.close()
+        if acc_shm is not None:
+            acc_shm.close()
+
+
+def parallel_summed_influence(surface, features, workers, progress=None,
+                              max_cost=None, weighted=None, cache=None,
+                              scenarios=None, keep=None, partials=None):
+    """
+    Name:     parallel_summed_influence
+    Inputs:   - CostSurface, cost raster (surface)
+              - list, (feature ID, [flat cell index], weight) tuples
+                (features)
+              - int, number of worker processes (workers)
+              - [optional] function, called as progress(featID, cd_max,
+                stats) after each feature, stats being the timings and
+                counters from run_feature (progress)
+              - [optional] float, maximum cost distance (max_cost)
+              - [optional] numpy.ndarray, zeroed float64 array to reduce
+                the partial sums into (weighted)
+              - [optional] CostDistanceCache, cache the workers store
+                their results in; the features are ones the caller has
+                already looked up and missed (cache)
+              - [optional] int, number of weighting scenarios (scenarios)
+              - [optional] function, called as keep(featID, window) with
+                each feature's CostWindow, sent back by the workers (keep)
+              - [optional] bool, whether the workers keep partial sums;
+                by default they do when partial_bytes fits in
+                PARTIAL_SHARE of the available memory (partials)
+    Outputs:  InfluenceAccumulator
+    Features: Runs the streaming SPI calculation over a pool of processes
+              sharing one copy of the cost array; a worker that dies
+              without reporting (killed, out of memory, crashed) raises a
+              RuntimeError instead of leaving the run waiting. Without
+              partial sums the parent adds every window itself, which
+              bounds memory at one accumulator but serialises the adds
+    """
+    features = list(features)
+    workers = max(1, min(int(workers), len(features)))
+    shape = surface.shape
+    acc_shape = shape if scenarios is None else (scenarios,) + shape
+    ctx = get_context()
+    if partials is None:
+        free = available_memory()
+        partials = free is None or partial_bytes(
+            surface, workers, scenarios) <= PARTIAL_SHARE*free
+    weights = None
+    if not partials:
+        weights = dict((f[0], f[2]) for f in features)
+
+    cost_shm = None
+    acc_shms = []
+    procs = []
+    try:
+        if isinstance(surface.values, numpy.memmap) and \
+                surface.values.filename:
+            cost_source = ("file", surface.values.filename,
+                           surface.values.offset)
+        else:
+            cost_shm = shared_memory.SharedMemory(
+                create=True, size=max(1, surface.values.nbytes))
+            values = numpy.ndarray(
+                shape, dtype=surface.values.dtype, buffer=cost_shm.buf)
+            values[...] = surface.values
+            del values
+            cost_source = ("shm", cost_shm.name)
+        georef = (surface.cell_size, surface.x_min, surface.y_max,
+                  surface.nodata)
+        if cache is not None:
+            # Hash once here rather than once per worker
+            cache = (cache, surface.digest())
+
+        tasks = ctx.Queue()
+        results = ctx.Queue()
+        for feat in features:
+            tasks.put(feat)
+        for _ in range(workers):
+            tasks.put(None)
+
+        for _ in range(workers):
+            acc_name = None
+            if partials:
+                shm = shared_memory.SharedMemory(
+                    create=True,
+                    size=max(1, partial_bytes(surface, 1, scenarios)))
+                partial = numpy.ndarray(
+                    acc_shape, dtype=numpy.float64, buffer=shm.buf)
+                partial[...] = 0
+                del partial
+                acc_shms.append(shm)
+                acc_name = shm.name
+            proc = ctx.Process(
+                target=_worker,
+                args=(cost_source, acc_name, shape,
+                      surface.values.dtype.str, georef, max_cost, cache,
+                      scenarios, keep is not None or not partials, tasks,
+                      results))
+            proc.start()
+            procs.append(proc)
+
+        # Collect progress until every worker has reported back
+        acc = InfluenceAccumulator(shape, weighted, scenarios)
+        totals = {}
+        suspects = set()
+        while len(totals) < workers:
+            try:
+                msg = results.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                # A worker that has exited leaves its report in the queue;
+                # if none has come a poll after it exited, it never will
+                lost = [proc for proc in procs if proc.exitcode is not None
+                        and proc.pid not in totals]
+                for proc in lost:
+                    if proc.pid in suspects:
+                        raise RuntimeError(
+                            "SPI worker %d exited with code %s without "
+                            "reporting its results" % (
+                                proc.pid, proc.exitcode))
+                suspects = set(proc.pid for proc in lost)
+                continue
+            if msg[0] == "feature":
+                if weights is not None:
+                    t0 = time.perf_counter()
+                    acc.add_window(msg[4], weights[msg[1]])
+                    msg[3]["add_s"] = round(time.perf_counter() - t0, 6)
+                if keep is not None:
+                    keep(msg[1], msg[4])
+                if progress is not None:
+                    progress(msg[1], msg[2], msg[3])
+            elif msg[0] == "done":
+                totals[msg[1]] = msg[2:]
+            else:
+                raise RuntimeError("SPI worker failed:\n%s" % msg[1])
+        for proc in procs:
+            proc.join()
+
+        # Reduce the partial sums
+        for shm in acc_shms:
+            partial = numpy.ndarray(
+                acc_shape, dtype=numpy.float64, buffer=shm.buf)
+            for row in range(0, shape[0], REDUCE_ROWS):
+                acc.weighted[..., row:row + REDUCE_ROWS, :] += (
+                    partial[..., row:row + REDUCE_ROWS, :])
+            del partial
+        for offset, weight_sum, max_cost_dist, count in totals.values():
+            acc.offset += offset
+            acc.weight_sum += weight_sum
+            acc.count += count
+            acc.max_cost_dist = max(acc.max_cost_dist, max_cost_dist)
+        return acc
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+        if cost_shm is not None:
+            acc_shms.append(cost_shm)
+        for shm in acc_shms:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pipeline.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# End-to-end SPI run on the native engine: one cost distance search per
+# feature, folded straight into the influence accumulator. With a run
+# journal the sums are checkpointed as features complete, and a restarted
+# run picks up from the last checkpoint (see journal.py).
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import time
+
+import numpy
+
+from .influence import InfluenceAccumulator
+from .instrument import run_feature, stage
+from .parallel import parallel_summed_influence
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def summed_influence(surface, features, progress=None, workers=1,
+                     max_cost=None, weighted=None, cache=None,
+                     instrument=None, journal=None, archive=None):
+    """
+    Name:     summed_influence
+    Inputs:   - CostSurface, cost raster (surface)
+              - list, (feature ID, [flat cell index], weight) tuples; the
+                weight may be a length-K vector to evaluate K weighting
+                scenarios in one pass (features)
+              - [optional] function, called as progress(featID, cd_max)
+                after each feature (progress)
+              - [optional] int, number of worker processes (workers)
+              - [optional] float, maximum cost distance (max_cost)
+              - [optional] numpy.ndarray, zeroed float64 array (e.g. a
+                numpy.memmap) to accumulate into (weighted)
+              - [optional] CostDistanceCache, cache of per-feature results
+                shared across runs (cache)
+              - [optional] Instrumentation, receives stage and per-feature
+                records (instrument)
+              - [optional] RunJournal, restores the last checkpoint, skips
+                the features it holds and checkpoints as features complete
+                (journal)
+              - [optional] ArchiveWriter, receives every feature's cost
+                distance window (archive)
+    Outputs:  InfluenceAccumulator
+    Features: Streams every feature's windowed cost distance into a single
+              running accumulator; no per-feature rasters are kept. With a
+              cache, only the features missing from it are searched
+    """
+    features = list(features)
+    scenarios = None
+    if features and numpy.ndim(features[0][2]) > 0:
+        scenarios = len(features[0][2])
+
+    acc = InfluenceAccumulator(surface.shape, weighted, scenarios)
+    if journal is not None:
+        with stage(instrument, "resume") as record:
+            record["features"] = journal.restore(acc)
+        features = [f for f in features if not journal.is_done(f[0])]
+
+    def report(featID, cd_max, stats):
+        if instrument is not None:
+            instrument.feature(featID, cd_max=cd_max, **stats)
+        if progress is not None:
+            progress(featID, cd_max)
+
+    keep = None
+    if archive is not None:
+        keep = archive.add
+
+    hits = []
+    if cache is not None:
+        misses = []
+        with stage(instrument, "cache lookup"):
+            for featID, seeds, weight in features:
+                read = cache.bytes_read
+                t0 = time.perf_counter()
+                window = cache.get(cache.key(surface, seeds, max_cost))
+                if window is None:
+                    misses.append((featID, seeds, weight))
+                else:
+                    hits.append((featID, window, weight, {
+                        "cache": "hit",
+                        "search_s": round(time.perf_counter() - t0, 6),
+                        "bytes_read": cache.bytes_read - read,
+                        "window_cells": window.block.size}))
+        features = misses
+
+    with stage(instrument, "features"):
+        if workers > 1 and features and journal is not None:
+            # Workers keep partial sums to themselves, so run the features
+            # a checkpoint's worth at a time, merge after each batch and
+            # checkpoint the whole batch at once; the completed list must
+            # never lag behind the sums
+            size = max(journal.every, workers)
+            for start in range(0, len(features), size):
+                batch = features[start:start + size]
+                acc.merge(parallel_summed_influence(
+                    surface, batch, workers, report, max_cost, None, cache,
+                    scenarios, keep))
+                journal.mark([f[0] for f in batch])
+                journal.checkpoint(acc)
+        elif workers > 1 and features:
+            acc = parallel_summed_influence(
+                surface, features, workers, report, max_cost, weighted,
+                cache, scenarios, keep)
+        else:
+            for featID, seeds, weight in features:
+                # Cache misses were counted by the lookup above
+                cd_max, stats = run_feature(
+                    surface, seeds, weight, acc, max_cost, cache,
+                    None if keep is None else
+                    lambda window: keep(featID, window), lookup=False)
+                report(featID, cd_max, stats)
+                if journal is not None:
+                    journal.record(featID, acc)
+
+    with stage(instrument, "cached features"):
+        for featID, window, weight, stats in hits:
+            t0 = time.perf_counter()
+            cd_max = acc.add_window(window, weight)
+            stats["add_s"] = round(time.perf_counter() - t0, 6)
+            if keep is not None:
+                keep(featID, window)
+            report(featID, cd_max, stats)
+            if journal is not None:
+                journal.record(featID, acc)
+    return acc
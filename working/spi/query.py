@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# query.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# SPI at sample sites without computing the surface. Each step costs the
+# mean of the two cells' costs (times sqrt(2) on diagonals) whichever way
+# it is taken, so a feature's cost distance at a site equals the cost
+# distance from the site to the nearest of the feature's source cells,
+# which is the first of them the search settles. One search from each
+# site, stopped once every feature has a settled cell (or at the maximum
+# cost distance), gives all N cost distances at that site; Q sites take Q
+# searches instead of N full-extent ones.
+#
+# The values match the surface from summed_influence at the site cells,
+#
+#     SPI(site) = sum_i w_i - (1/M) * sum_i w_i * cd_i(site)
+#
+# where M is the largest cost distance of any feature anywhere on the
+# raster. M is taken, in order, from an explicit normaliser (e.g. the
+# max_cost_dist of an earlier full run), from the maximum cost distance
+# when the site searches show some feature leaves cells beyond it, or
+# otherwise from one search per feature for its largest cost distance.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import csv
+import heapq
+import sys
+
+import numpy
+
+from .costdist import NEIGHBOURS, cost_window
+from .instrument import stage
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def site_distances(surface, site, owners, count, max_cost=None,
+                   stats=None):
+    """
+    Name:     site_distances
+    Inputs:   - CostSurface, cost raster (surface)
+              - int, flat cell index of the site (site)
+              - dict, positions of the features each source cell belongs
+                to, by flat cell index (owners)
+              - int, number of features among the owners (count)
+              - [optional] float, maximum cost distance (max_cost)
+              - [optional] dict, filled with the cells settled (stats)
+    Outputs:  dict, cost distance from the site to every feature reached
+              (within the threshold), by feature position
+    Features: cost_window's search from one cell; a feature is done at
+              the first of its cells to settle, its nearest, and the
+              search stops as soon as no feature is left
+    """
+    nrows, ncols = surface.shape
+    cost = surface.flat()
+    nodata = surface.nodata
+    moves = [(dr, dc, f, dr*ncols + dc) for (dr, dc, f) in NEIGHBOURS]
+
+    found = {}
+    site = int(site)
+    cs = cost[site]
+    if not cs > 0 or cs == nodata:
+        return found
+    remaining = count
+    dist = {site: 0.0}
+    heap = [(0.0, site)]
+    heappop = heapq.heappop
+    heappush = heapq.heappush
+    inf = float("inf")
+    limit = float(max_cost) if max_cost else inf
+    settled = 0
+    while heap and remaining:
+        d, i = heappop(heap)
+        if d > dist[i]:
+            continue
+        settled += 1
+        if i in owners:
+            for k in owners[i]:
+                if k not in found:
+                    found[k] = d
+                    remaining -= 1
+        r, c = divmod(i, ncols)
+        ci = cost[i]
+        for dr, dc, f, off in moves:
+            rr = r + dr
+            cc = c + dc
+            if rr < 0 or rr >= nrows or cc < 0 or cc >= ncols:
+                continue
+            j = i + off
+            cj = cost[j]
+            if not cj > 0 or cj == nodata:
+                continue
+            nd = d + f*(ci + cj)
+            if nd <= limit and nd < dist.get(j, inf):
+                dist[j] = nd
+                heappush(heap, (nd, j))
+    if stats is not None:
+        stats["settled"] = settled
+    return found
+
+
+def query_sites(surface, features, sites, max_cost=None, normaliser=None,
+                progress=None, cache=None, instrument=None):
+    """
+    Name:     query_sites
+    Inputs:   - CostSurface, cost raster (surface)
+              - list, (feature ID, [flat cell index], weight) tuples; the
+                weight may be a length-K vector of scenario weights
+                (features)
+              - list, (site ID, flat cell index) pairs, -1 for a site off
+                the raster (sites)
+              - [optional] float, maximum cost distance (max_cost)
+              - [optional] float, the normaliser M; found from the inputs
+                when not given (normaliser)
+              - [optional] function, called as progress(siteID, settled)
+                after each site search (progress)
+              - [optional] CostDistanceCache, used for the per-feature
+                searches when M has to be computed (cache)
+              - [optional] Instrumentation, receives stage and per-site
+                records (instrument)
+    Outputs:  tuple, (values, info): SPI at each site, shaped (Q,) or
+              (Q, K) for scenarios, NaN where the surface is NoData; and a
+              dict with the normaliser, where it came from ("given",
+              "max_cost" or "exact"), the searches run and cells settled
+    """
+    features = list(features)
+    sites = list(sites)
+    limit = float(max_cost) if max_cost else None
+    weights = numpy.array([f[2] for f in features], dtype=numpy.float64)
+    scenarios = weights.shape[1:]
+    weight_sum = weights.sum(axis=0)
+
+    # Features owning each passable source cell; features without one
+    # reach nothing
+    passable = surface.passable().reshape(-1)
+    owners = {}
+    seeded = 0
+    for k, (_, seeds, _) in enumerate(features):
+        cells = numpy.unique(numpy.asarray(seeds, dtype=numpy.int64))
+        cells = cells[passable[cells]] if cells.size else cells
+        for i in cells.tolist():
+            owners.setdefault(i, []).append(k)
+        seeded += bool(len(cells))
+
+    # Distance sums at each site; a feature the site search did not reach
+    # sits beyond the threshold (bounded) or is cut off (unbounded)
+    info = {"sites": len(sites), "searches": 0, "settled": 0}
+    sums = numpy.full((len(sites),) + scenarios, numpy.nan)
+    beyond = False
+    with stage(instrument, "site searches"):
+        searched = {}
+        for k, (siteID, cell) in enumerate(sites):
+            cell = int(cell)
+            if cell < 0 or not passable[cell]:
+                continue
+            if cell not in searched:
+                stats = {}
+                found = site_distances(surface, cell, owners, seeded, limit,
+                                       stats)
+                info["searches"] += 1
+                info["settled"] += stats.get("settled", 0)
+                cd = numpy.full(len(features), numpy.inf)
+                cd[list(found)] = list(found.values())
+                searched[cell] = cd
+                if instrument is not None:
+                    instrument.feature(siteID, **stats)
+                if progress is not None:
+                    progress(siteID, stats.get("settled", 0))
+            cd = searched[cell]
+            unreached = numpy.isinf(cd)
+            if limit is None:
+                if unreached.any():
+                    continue
+            else:
+                beyond = beyond or bool(unreached.any())
+                cd = numpy.where(unreached, limit, cd)
+            sums[k] = numpy.tensordot(cd, weights, axes=(0, 0))
+
+    # Normaliser
+    if normaliser is not None:
+        m, source = float(normaliser), "given"
+    elif limit is not None and surface.passable_count() and (
+            beyond or seeded < len(features)):
+        # Some feature leaves passable cells beyond the threshold
+        m, source = limit, "max_cost"
+    else:
+        with stage(instrument, "normaliser"):
+            m = 0.0
+            for featID, seeds, _ in features:
+                if cache is not None:
+                    window = cache.window(surface, seeds, limit)
+                else:
+                    window = cost_window(surface, seeds, limit)
+                m = max(m, window.max_cost_dist)
+        source = "exact"
+        info["searches"] += len(features)
+    info["normaliser"] = m
+    info["normaliser_source"] = source
+
+    if m > 0:
+        values = weight_sum - sums/m
+    else:
+        # Every reached cell is a source cell
+        values = numpy.where(numpy.isnan(sums), numpy.nan,
+                             weight_sum + 0.0*sums)
+    return values, info
+
+
+def site_fields(names=None):
+    """
+    Name:     site_fields
+    Inputs:   [optional] list, scenario (weight field) names (names)
+    Outputs:  list, SPI column names of the site table: "spi", or
+              "spi_<name>" per scenario
+    """
+    if not names:
+        return ["spi"]
+    return ["spi_%s" % name for name in names]
+
+
+def write_site_table(path, sites, values, names=None, id_field="site"):
+    """
+    Name:     write_site_table
+    Inputs:   - str, CSV file, overwritten; "-" for standard output (path)
+              - list, (site ID, flat cell index) pairs (sites)
+              - numpy.ndarray, SPI per site from query_sites (values)
+              - [optional] list, scenario names (names)
+              - [optional] str, name of the ID column (id_field)
+    Outputs:  None.
+    Features: One row per site; NoData sites have empty SPI values
+    """
+    values = numpy.asarray(values, dtype=numpy.float64).reshape(
+        len(sites), -1)
+    f = sys.stdout if path == "-" else open(path, "w", newline="")
+    try:
+        writer = csv.writer(f)
+        writer.writerow([id_field] + site_fields(names))
+        for (siteID, _), row in zip(sites, values):
+            writer.writerow([siteID] + [
+                "" if numpy.isnan(v) else repr(float(v)) for v in row])
+    finally:
+        if f is not sys.stdout:
+            f.close()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# raster.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Memory-mapped raster I/O for the native SPI engine. Rasters are stored as
+# ENVI files (a flat binary file plus a text .hdr), which ArcGIS also reads;
+# cost inputs are single-band, outputs hold one band per weighting
+# scenario. Both the cost surface and the output surface are opened with
+# numpy.memmap, so pages are read from disk only when the search touches
+# them and rasters larger than RAM can be processed. The coordinate system
+# travels as the header's "coordinate system string" (WKT), as GDAL and
+# ENVI write it.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import os
+import re
+import sys
+
+import numpy
+
+from .costdist import CostSurface
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+# ENVI "data type" codes
+ENVI_DTYPES = {
+    1: numpy.uint8, 2: numpy.int16, 3: numpy.int32, 4: numpy.float32,
+    5: numpy.float64, 12: numpy.uint16, 13: numpy.uint32, 14: numpy.int64,
+    15: numpy.uint64,
+}
+
+# Extensions tried for the binary file that goes with a .hdr
+ENVI_DATA_EXTS = ("", ".dat", ".img", ".bsq", ".bin", ".raw")
+
+# Rows processed at a time when streaming over a memory-mapped raster
+CHUNK_ROWS = 1024
+
+# Extensions written as ENVI rasters
+ENVI_EXTS = (".dat", ".bsq", ".bin")
+
+# NoData value of SPI outputs
+OUT_NODATA = -9999.0
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def header_path(path):
+    """
+    Name:     header_path
+    Inputs:   str, path to an ENVI data or header file (path)
+    Outputs:  str, path to the .hdr file, or None if there is none
+    """
+    if path.lower().endswith(".hdr"):
+        return path if os.path.isfile(path) else None
+    for hdr in (os.path.splitext(path)[0] + ".hdr", path + ".hdr"):
+        if os.path.isfile(hdr):
+            return hdr
+    return None
+
+
+def is_envi(path):
+    """Whether path is an ENVI raster (has an .hdr next to it)"""
+    return header_path(path) is not None
+
+
+def read_header(hdr):
+    """
+    Name:     read_header
+    Inputs:   str, path to an ENVI .hdr file (hdr)
+    Outputs:  dict, lower-case header keys to string values
+    Features: Parses key = value pairs, including {...} values spanning
+              several lines
+    """
+    with open(hdr) as f:
+        text = f.read()
+    if not text.startswith("ENVI"):
+        raise ValueError("Not an ENVI header: %s" % hdr)
+    header = {}
+    for key, braced, plain in re.findall(
+            r"^\s*([^=\n]+?)\s*=\s*(?:\{([^}]*)\}|(.*))$", text, re.M):
+        value = braced if braced else plain
+        header[key.lower()] = " ".join(value.split())
+    return header
+
+
+def data_path(hdr):
+    """
+    Name:     data_path
+    Inputs:   str, path to an ENVI .hdr file (hdr)
+    Outputs:  str, path to the matching binary file
+    """
+    base = os.path.splitext(hdr)[0]
+    for ext in ENVI_DATA_EXTS:
+        if os.path.isfile(base + ext):
+            return base + ext
+    raise FileNotFoundError("No data file found for %s" % hdr)
+
+
+def read_envi(path, mode="r"):
+    """
+    Name:     read_envi
+    Inputs:   - str, path to the ENVI data or header file (path)
+              - [optional] str, numpy.memmap mode (mode)
+    Outputs:  CostSurface, backed by a numpy.memmap
+    Features: Opens a single-band ENVI raster without reading it into
+              memory; cells are paged in as they are accessed. The
+              georeferencing comes from "map info" and the coordinate
+              system from "coordinate system string"
+    """
+    hdr = header_path(path)
+    if hdr is None:
+        raise FileNotFoundError("No ENVI header found for %s" % path)
+    header = read_header(hdr)
+    if int(header.get("bands", 1)) != 1:
+        raise ValueError("Only single-band rasters are supported: %s" % hdr)
+
+    dtype = numpy.dtype(ENVI_DTYPES[int(header["data type"])])
+    big_endian = int(header.get("byte order", 0)) == 1
+    if big_endian != (sys.byteorder == "big"):
+        dtype = dtype.newbyteorder("S")
+    shape = (int(header["lines"]), int(header["samples"]))
+    values = numpy.memmap(
+        data_path(hdr), dtype=dtype, mode=mode, shape=shape,
+        offset=int(header.get("header offset", 0)))
+    if not dtype.isnative:
+        # The search needs native byte order; this is the one case that
+        # reads the whole raster into memory
+        values = values.astype(dtype.newbyteorder("="))
+
+    cell_size, x_min, y_max = 1.0, 0.0, float(shape[0])
+    if "map info" in header:
+        info = [v.strip() for v in header["map info"].split(",")]
+        px, py = float(info[1]), float(info[2])
+        x_tie, y_tie = float(info[3]), float(info[4])
+        cell_size = float(info[5])
+        x_min = x_tie - (px - 1.0)*cell_size
+        y_max = y_tie + (py - 1.0)*cell_size
+    nodata = header.get("data ignore value")
+    return CostSurface(
+        values, cell_size, x_min, y_max,
+        None if nodata is None else float(nodata),
+        header.get("coordinate system string"))
+
+
+def write_header(hdr, shape, dtype, georef, nodata=None, description=None,
+                 band_names=None):
+    """
+    Name:     write_header
+    Inputs:   - str, path to the .hdr file (hdr)
+              - tuple, raster shape as (rows, columns) or (bands, rows,
+                columns) (shape)
+              - numpy.dtype, cell type (dtype)
+              - CostSurface, surface providing the georeferencing and
+                coordinate system (georef)
+              - [optional] float, NoData value (nodata)
+              - [optional] str, header description (description)
+              - [optional] list, band names (band_names)
+    Outputs:  None.
+    """
+    bands = shape[0] if len(shape) == 3 else 1
+    dtype = numpy.dtype(dtype)
+    big_endian = dtype.byteorder == ">" or (
+        dtype.byteorder == "=" and sys.byteorder == "big")
+    codes = dict((numpy.dtype(v), k) for k, v in ENVI_DTYPES.items())
+    lines = [
+        "ENVI",
+        "description = {%s}" % (description or "SPI raster"),
+        "samples = %d" % shape[-1],
+        "lines = %d" % shape[-2],
+        "bands = %d" % bands,
+        "header offset = 0",
+        "file type = ENVI Standard",
+        "data type = %d" % codes[dtype.newbyteorder("=")],
+        "interleave = bsq",
+        "byte order = %d" % (1 if big_endian else 0),
+        "map info = {Arbitrary, 1, 1, %r, %r, %r, %r}" % (
+            georef.x_min, georef.y_max, georef.cell_size, georef.cell_size),
+    ]
+    if georef.spatial_ref:
+        lines.append("coordinate system string = {%s}" % " ".join(
+            georef.spatial_ref.split()))
+    if nodata is not None:
+        lines.append("data ignore value = %r" % float(nodata))
+    if band_names:
+        lines.append("band names = {%s}" % ", ".join(band_names))
+    with open(hdr, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def create_envi(path, georef, dtype=numpy.float64, nodata=None,
+                description=None, band_names=None):
+    """
+    Name:     create_envi
+    Inputs:   - str, path to the binary file to create (path)
+              - CostSurface, surface providing shape and georeferencing
+                (georef)
+              - [optional] numpy.dtype, cell type (dtype)
+              - [optional] float, NoData value (nodata)
+              - [optional] str, header description (description)
+              - [optional] list, band names; one band per name, stored
+                band-sequential (band_names)
+    Outputs:  numpy.memmap, zero-filled writable raster, shaped (bands,
+              rows, columns) when band names are given
+    """
+    shape = georef.shape
+    if band_names:
+        shape = (len(band_names),) + tuple(shape)
+    values = numpy.memmap(path, dtype=dtype, mode="w+", shape=shape)
+    write_header(os.path.splitext(path)[0] + ".hdr", shape, dtype, georef,
+                 nodata, description, band_names)
+    return values
+
+
+def write_envi(path, array, georef, nodata=None, description=None):
+    """
+    Name:     write_envi
+    Inputs:   - str, path to the binary file to create (path)
+              - numpy.ndarray, 2D values (array)
+              - CostSurface, surface providing the georeferencing (georef)
+              - [optional] float, NoData value (nodata)
+              - [optional] str, header description (description)
+    Outputs:  None.
+    Features: Writes an array to an ENVI raster a block of rows at a time
+    """
+    out = create_envi(path, georef, array.dtype, nodata, description)
+    for row in range(0, array.shape[0], CHUNK_ROWS):
+        out[row:row + CHUNK_ROWS] = array[row:row + CHUNK_ROWS]
+    out.flush()
+    del out
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# validate.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Vectorised pre-flight checks, replacing the cursor-and-tool loops of
+# v1.0beta/scripts/utilities.py (Sample to a disk table for points, one
+# SelectLayerByAttribute + GetCount per polygon, a row-by-row weight mean).
+# Features are checked by the source cells they are rasterised to (the
+# cells the run searches from) with a single bincount, or, for bare point
+# coordinates, a single cell-index lookup; weights are read into an array
+# once.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import numpy
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+# Largest mean weight allowed (as in the 1.0 beta tool)
+MAX_WEIGHT_MEAN = 100000
+
+
+##############################################################################
+# CLASSES
+##############################################################################
+class ValidationError(ValueError):
+    """
+    Name:     ValidationError
+    Features: Raised when an input fails a pre-flight check; errorType
+              matches the spiException error types of the 1.0 beta tool
+    """
+    def __init__(self, errorType, message, ids=None):
+        """
+        Name:     ValidationError.__init__
+        Inputs:   - str, error type, e.g. "NoDataFeatsError" (errorType)
+                  - str, message for the user (message)
+                  - [optional] list, offending feature IDs (ids)
+        """
+        ValueError.__init__(self, message)
+        self.errorType = errorType
+        self.ids = list(ids) if ids is not None else []
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def point_cells(surface, xs, ys):
+    """
+    Name:     point_cells
+    Inputs:   - CostSurface, cost raster (surface)
+              - numpy.ndarray, x coordinates (xs)
+              - numpy.ndarray, y coordinates (ys)
+    Outputs:  numpy.ndarray, flat cell index per point, -1 if off the raster
+    """
+    nrows, ncols = surface.shape
+    xs = numpy.asarray(xs, dtype=numpy.float64)
+    ys = numpy.asarray(ys, dtype=numpy.float64)
+    cols = numpy.floor((xs - surface.x_min)/surface.cell_size)
+    rows = numpy.floor((surface.y_max - ys)/surface.cell_size)
+    inside = (rows >= 0) & (rows < nrows) & (cols >= 0) & (cols < ncols)
+    idx = numpy.full(xs.shape, -1, dtype=numpy.int64)
+    idx[inside] = (rows[inside]*ncols + cols[inside]).astype(numpy.int64)
+    return idx
+
+
+def passable_cells(surface, idx):
+    """
+    Name:     passable_cells
+    Inputs:   - CostSurface, cost raster (surface)
+              - numpy.ndarray, flat cell indexes, -1 for none (idx)
+    Outputs:  numpy.ndarray, boolean, whether each cell is passable
+    """
+    idx = numpy.asarray(idx, dtype=numpy.int64)
+    ok = idx >= 0
+    values = surface.cell_values(idx[ok])
+    good = values > 0
+    if surface.nodata is not None:
+        good &= values != surface.nodata
+    out = numpy.zeros(idx.shape, dtype=bool)
+    out[ok] = good
+    return out
+
+
+def nodata_points(surface, ids, xs, ys):
+    """
+    Name:     nodata_points
+    Inputs:   - CostSurface, cost raster (surface)
+              - numpy.ndarray, feature IDs (ids)
+              - numpy.ndarray, x coordinates (xs)
+              - numpy.ndarray, y coordinates (ys)
+    Outputs:  list, sorted IDs of points off the raster or on NoData
+    """
+    good = passable_cells(surface, point_cells(surface, xs, ys))
+    return sorted(numpy.asarray(ids)[~good].tolist())
+
+
+def unseeded_features(surface, ids, seeds):
+    """
+    Name:     unseeded_features
+    Inputs:   - CostSurface, cost raster (surface)
+              - numpy.ndarray, feature IDs (ids)
+              - list, flat cell index arrays, one per feature (seeds)
+    Outputs:  list, sorted IDs of features with no passable source cell
+    """
+    lengths = numpy.array([len(s) for s in seeds], dtype=numpy.int64)
+    cells = numpy.concatenate(
+        [numpy.asarray(s, dtype=numpy.int64) for s in seeds] +
+        [numpy.empty(0, dtype=numpy.int64)])
+    good = passable_cells(surface, cells).astype(numpy.int64)
+    owner = numpy.repeat(numpy.arange(len(seeds)), lengths)
+    counts = numpy.bincount(owner, weights=good, minlength=len(seeds))
+    return sorted(numpy.asarray(ids)[counts == 0].tolist())
+
+
+def weight_mean(weights):
+    """
+    Name:     weight_mean
+    Inputs:   numpy.ndarray, feature weights; NaN for missing (weights)
+    Outputs:  float, mean weight
+    Features: Raises ValidationError for missing or out-of-range weights
+    """
+    weights = numpy.asarray(weights, dtype=numpy.float64)
+    if numpy.isnan(weights).any():
+        raise ValidationError(
+            "WeightError",
+            "A weight attribute was specified, but at least one influence "
+            "feature is missing.")
+    mean = float(weights.mean()) if weights.size else 0.0
+    if mean > MAX_WEIGHT_MEAN:
+        raise ValidationError(
+            "WeightRangeError",
+            "Mean weight for influence features is greater than %d. "
+            "Rescale to a narrower range." % MAX_WEIGHT_MEAN)
+    return mean
+
+
+def check_features(surface, ids, xs=None, ys=None, weights=None,
+                   seeds=None):
+    """
+    Name:     check_features
+    Inputs:   - CostSurface, cost raster (surface)
+              - numpy.ndarray, feature IDs (ids)
+              - [optional] numpy.ndarray, point x coordinates (xs)
+              - [optional] numpy.ndarray, point y coordinates (ys)
+              - [optional] numpy.ndarray, weights; a 2D array checks every
+                scenario column (weights)
+              - [optional] list, rasterised source cells per feature, in
+                place of coordinates (seeds)
+    Outputs:  None.
+    Features: Runs the feature checks of the 1.0 beta tool; raises
+              ValidationError on the first failure
+    """
+    if len(ids) == 0:
+        raise ValidationError(
+            "PointRangeError",
+            "Invalid number of influence features: you need more than 0.")
+    if weights is not None:
+        weights = numpy.asarray(weights, dtype=numpy.float64)
+        for column in weights.reshape(len(ids), -1).T:
+            weight_mean(column)
+    if seeds is not None:
+        bad = unseeded_features(surface, ids, seeds)
+    else:
+        bad = nodata_points(surface, ids, xs, ys)
+    if bad:
+        raise ValidationError(
+            "NoDataFeatsError",
+            "At least one influence feature is located in a cost surface "
+            "cell with NoData. Adjust cost surface or remove influence "
+            "features not on surface. OIDs: %s" % bad, bad)
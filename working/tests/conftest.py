@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# conftest.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Shared fixtures for the spi engine tests: a small random cost surface
+# with NoData holes and a barrier, and features seeded on it. Run from
+# working/ with "python -m pytest tests".
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from spi.costdist import CostSurface  # noqa: E402
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+# A coordinate system with an EPSG authority
+UTM33 = (
+    'PROJCS["WGS 84 / UTM zone 33N",GEOGCS["WGS 84",DATUM["WGS_1984",'
+    'SPHEROID["WGS 84",6378137,298.257223563]],PRIMEM["Greenwich",0],'
+    'UNIT["degree",0.0174532925199433]],PROJECTION["Transverse_Mercator"],'
+    'PARAMETER["central_meridian",15],PARAMETER["scale_factor",0.9996],'
+    'PARAMETER["false_easting",500000],UNIT["metre",1],'
+    'AUTHORITY["EPSG","32633"]]')
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def make_surface(shape=(40, 50), seed=3, holes=0.05, barrier=True):
+    """
+    Name:     make_surface
+    Inputs:   - [optional] tuple, raster shape (shape)
+              - [optional] int, random seed (seed)
+              - [optional] float, share of NoData cells (holes)
+              - [optional] bool, add a NoData wall with one gap (barrier)
+    Outputs:  CostSurface
+    """
+    rng = numpy.random.default_rng(seed)
+    values = rng.uniform(0.5, 5.0, shape)
+    values[rng.random(shape) < holes] = numpy.nan
+    if barrier:
+        row = shape[0]//4
+        values[row:row + 2, :] = numpy.nan
+        values[row:row + 2, shape[1]//10] = 1.0
+    return CostSurface(values, cell_size=30.0, x_min=500.0, y_max=9000.0)
+
+
+def make_features(surface, count=12, seed=5, scenarios=None):
+    """
+    Name:     make_features
+    Inputs:   - CostSurface, cost raster (surface)
+              - [optional] int, number of features (count)
+              - [optional] int, random seed (seed)
+              - [optional] int, scenario weights per feature (scenarios)
+    Outputs:  list, (feature ID, [flat cell index], weight) tuples on
+              passable cells, one to three seed cells each
+    """
+    rng = numpy.random.default_rng(seed)
+    cells = numpy.flatnonzero(surface.passable())
+    features = []
+    for k in range(count):
+        seeds = rng.choice(cells, rng.integers(1, 4), replace=False)
+        if scenarios:
+            weight = list(rng.uniform(1.0, 10.0, scenarios))
+        else:
+            weight = float(rng.uniform(1.0, 10.0))
+        features.append((k, numpy.sort(seeds), weight))
+    return features
+
+
+@pytest.fixture
+def surface():
+    return make_surface()
+
+
+@pytest.fixture
+def features(surface):
+    return make_features(surface)
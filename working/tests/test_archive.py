@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_archive.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Cost distance archives: round trips against the heap engine's windows,
+# empty archives, appending after a resume and reading an archive whose
+# index was never written.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import numpy
+import pytest
+
+from spi.archive import ArchiveReader, ArchiveWriter
+from spi.costdist import cost_window
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def windows(surface, features, max_cost=None):
+    """Heap engine cost distance window per feature"""
+    return [(featID, cost_window(surface, seeds, max_cost))
+            for featID, seeds, _ in features]
+
+
+def assert_same(surface, got, want, atol=0.0):
+    assert got.max_cost_dist == want.max_cost_dist
+    numpy.testing.assert_allclose(
+        got.expand(surface), want.expand(surface), atol=atol,
+        equal_nan=True)
+
+
+@pytest.mark.parametrize("encoding", ["u16", "f16", "f32"])
+@pytest.mark.parametrize("max_cost", [None, 40.0])
+def test_round_trip(surface, features, tmp_path, encoding, max_cost):
+    path = str(tmp_path/"cd.spia")
+    done = windows(surface, features, max_cost)
+    with ArchiveWriter(path, surface, encoding=encoding) as archive:
+        for featID, window in done:
+            archive.add(featID, window)
+    reader = ArchiveReader(path)
+    assert reader.complete and reader.shape == surface.shape
+    assert reader.ids() == [f[0] for f in features]
+    for featID, window in done:
+        span = window.max_cost_dist
+        atol = {"u16": span/30000.0, "f16": span*1e-3, "f32": span*1e-6}
+        assert_same(surface, reader.window(featID), window,
+                    atol[encoding])
+
+
+def test_empty(tmp_path):
+    # No features and no georeferencing
+    path = str(tmp_path/"cd.spia")
+    ArchiveWriter(path).close()
+    reader = ArchiveReader(path)
+    assert len(reader) == 0 and reader.shape == (0, 0)
+
+
+def test_append_after_resume(surface, features, tmp_path):
+    path = str(tmp_path/"cd.spia")
+    done = windows(surface, features)
+    with ArchiveWriter(path, surface, encoding="f32") as archive:
+        for featID, window in done[:5]:
+            archive.add(featID, window)
+    # The resumed run redoes feature 4, then the rest
+    with ArchiveWriter(path, surface, encoding="f32",
+                       append=True) as archive:
+        for featID, window in done[4:]:
+            archive.add(featID, window)
+    reader = ArchiveReader(path)
+    assert sorted(reader.ids()) == [f[0] for f in features]
+    for featID, window in done:
+        assert_same(surface, reader.window(featID), window, 1e-3)
+
+
+def test_crashed_archive(surface, features, tmp_path):
+    # Killed before close: no index, and the last frame cut short
+    path = str(tmp_path/"cd.spia")
+    done = windows(surface, features)
+    archive = ArchiveWriter(path, surface, encoding="f32", threads=1)
+    for featID, window in done[:6]:
+        archive.add(featID, window)
+    archive.flush()
+    archive._file.close()
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 10)
+    reader = ArchiveReader(path)
+    assert not reader.complete and reader.shape == surface.shape
+    assert reader.ids() == [f[0] for f in features[:5]]
+    assert_same(surface, reader.window(features[0][0]), done[0][1], 1e-3)
+
+    # Appending picks up after the last whole frame
+    with ArchiveWriter(path, surface, encoding="f32",
+                       append=True) as archive:
+        for featID, window in done[5:]:
+            archive.add(featID, window)
+    reader = ArchiveReader(path)
+    assert reader.complete and len(reader) == len(features)
+    for featID, window in done:
+        assert_same(surface, reader.window(featID), window, 1e-3)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_benchmark.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Benchmark smoke run on a tiny synthetic case.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import json
+
+import pytest
+
+from spi.benchmark import main, run_case
+from spi.instrument import io_counters
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+@pytest.mark.parametrize("engine, stages", [
+    ("heap", ["cost_prep", "calcCost", "calcInfluence", "summation",
+              "cleanup"]),
+    ("sweep", ["cost_prep", "features", "summation", "cleanup"]),
+])
+@pytest.mark.parametrize("kind", ["point", "polygon"])
+def test_run_case(tmp_path, engine, stages, kind):
+    result = run_case(24, "barriers", 4, kind, 10, seed=1,
+                      work_dir=str(tmp_path), engine=engine)
+    assert sorted(result["stages"]) == sorted(stages)
+    assert result["window_cells"] > 0 and result["max_cost"] > 0
+    for stage in result["stages"].values():
+        assert stage["wall_s"] >= 0
+        assert set(stage) >= {"stage_peak_rss", "rss_delta",
+                              "process_peak_rss", "bytes_read",
+                              "bytes_written"}
+    # None only where the OS has no I/O counters and no work directory
+    written = result["stages"]["cost_prep"]["bytes_written"]
+    assert written is None or written >= 24*24*4
+    if engine == "heap" and io_counters() is not None:
+        assert result["stages"]["calcCost"]["bytes_written"] > 0
+    assert not list(tmp_path.iterdir())
+
+
+def test_main(tmp_path):
+    out = str(tmp_path/"bench.json")
+    assert main(["--sizes", "16", "--terrains", "uniform", "--features",
+                 "3", "--kinds", "point", "--caps", "0", "--work-dir",
+                 str(tmp_path), "-o", out]) == 0
+    with open(out) as f:
+        results = json.load(f)
+    assert len(results) == 1 and results[0]["features"] == 3
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_cache.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Cost distance cache: hit and miss counts over cold and warm runs, and
+# damaged entries.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import os
+
+import numpy
+import pytest
+
+from spi.cache import CostDistanceCache
+from spi.pipeline import summed_influence
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+@pytest.mark.parametrize("workers", [1, 2])
+def test_counts(surface, features, tmp_path, workers):
+    exact = summed_influence(surface, features)
+    cache = CostDistanceCache(str(tmp_path))
+    cold = summed_influence(surface, features, workers=workers, cache=cache)
+    assert (cache.hits, cache.misses) == (0, len(features))
+
+    cache = CostDistanceCache(str(tmp_path))
+    warm = summed_influence(surface, features, workers=workers, cache=cache)
+    assert (cache.hits, cache.misses) == (len(features), 0)
+    for acc in (cold, warm):
+        numpy.testing.assert_allclose(
+            acc.result(surface), exact.result(surface), equal_nan=True)
+
+
+@pytest.mark.parametrize("damage", ["truncate", "garbage"])
+def test_bad_entry_removed(surface, features, tmp_path, damage):
+    cache = CostDistanceCache(str(tmp_path))
+    seeds = features[0][1]
+    key = cache.key(surface, seeds)
+    cache.window(surface, seeds)
+    path = cache.path(key)
+    with open(path, "r+b") as f:
+        if damage == "truncate":
+            f.truncate(os.path.getsize(path)//2)
+        else:
+            f.write(b"\0"*64)
+    assert cache.get(key) is None and cache.misses == 2
+    assert not os.path.exists(path)
+    # Searched and stored again
+    cache.window(surface, seeds)
+    assert cache.get(key) is not None
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_cli.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Headless runner: a failing job is reported and the rest still run;
+# unknown job names and options the engine ignores are rejected.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import json
+
+import pytest
+
+from conftest import make_surface
+from spi import raster
+from spi.cli import main, manifest_jobs
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def test_failed_job_recorded(tmp_path, capsys):
+    surface = make_surface(barrier=False)
+    raster.write_envi(str(tmp_path/"cost.dat"), surface.values, surface)
+    with open(str(tmp_path/"pts.csv"), "w") as f:
+        f.write("id,x,y,pop\n1,800.0,8500.0,5\n2,1500.0,8000.0,3\n")
+    job = {"features": "pts.csv", "weight": "pop", "id_field": "id"}
+    manifest = {"defaults": {"cost": "cost.dat"}, "jobs": [
+        dict(job, name="missing", features="nothing.csv",
+             output="out/missing.dat"),
+        dict(job, name="good", output="out/good.dat")]}
+    with open(str(tmp_path/"m.json"), "w") as f:
+        json.dump(manifest, f)
+
+    status = main(["run", str(tmp_path/"m.json"), "-q"])
+    results = json.loads(capsys.readouterr().out)
+    assert status == 1
+    assert [r["name"] for r in results] == ["missing", "good"]
+    assert "Traceback" in results[0]["traceback"]
+    assert "error" not in results[1] and results[1]["outputs"]
+
+
+def test_unknown_job_name(tmp_path):
+    manifest = {"jobs": [{"name": "a", "cost": "c.dat", "features": "f.csv",
+                          "output": "o.dat"}]}
+    with open(str(tmp_path/"m.json"), "w") as f:
+        json.dump(manifest, f)
+    with pytest.raises(ValueError, match="No job named b"):
+        main(["run", str(tmp_path/"m.json"), "--job", "a", "--job", "b"])
+
+
+@pytest.mark.parametrize("engine", ["sweep", "cluster"])
+@pytest.mark.parametrize("key, value", [
+    ("workers", 4), ("journal", "ckpt"), ("cache_dir", "cache")])
+def test_heap_only_options(engine, key, value):
+    job = {"name": "a", "cost": "c.dat", "features": "f.csv",
+           "output": "o.dat", "engine": engine}
+    assert manifest_jobs({"jobs": [job]})
+    with pytest.raises(ValueError, match="does not use %s" % key):
+        manifest_jobs({"jobs": [dict(job, **{key: value})]})
+    # Fine for the heap engine, and for site queries
+    manifest_jobs({"jobs": [dict(job, engine="heap", **{key: value})]})
+    manifest_jobs({"jobs": [dict(job, output="o.csv", sites="s.csv",
+                                 **{key: value})]})
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_cluster.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Approximate clustered SPI against exact runs: every cell must be within
+# the reported error bound, on rough (fractal) surfaces where the
+# clustered normaliser is furthest from the exact one.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import numpy
+import pytest
+
+from spi.cluster import clustered_influence, error_stats
+from spi.costdist import CostSurface
+from spi.pipeline import summed_influence
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def fractal_surface(shape, seed):
+    """Rough cost surface: octaves of bilinear value noise, cubed"""
+    rng = numpy.random.default_rng(seed)
+    out = numpy.zeros(shape)
+    for octave in range(1, 6):
+        n = 2**octave
+        grid = rng.random((n + 1, n + 1))
+        rows = numpy.linspace(0, n, shape[0])
+        cols = numpy.linspace(0, n, shape[1])
+        r0 = numpy.minimum(rows.astype(int), n - 1)
+        c0 = numpy.minimum(cols.astype(int), n - 1)
+        fr = (rows - r0)[:, None]
+        fc = (cols - c0)[None, :]
+        out += (grid[r0][:, c0]*(1 - fr)*(1 - fc) +
+                grid[r0 + 1][:, c0]*fr*(1 - fc) +
+                grid[r0][:, c0 + 1]*(1 - fr)*fc +
+                grid[r0 + 1][:, c0 + 1]*fr*fc)/octave
+    return CostSurface(0.2 + 20.0*(out - out.min())**3)
+
+
+def point_features(surface, count, seed, scenarios=None):
+    """Single-cell features with random weights"""
+    rng = numpy.random.default_rng(seed)
+    cells = rng.choice(surface.size, count, replace=False)
+    weights = rng.uniform(1.0, 10.0, (count, scenarios or 1))
+    if not scenarios:
+        weights = weights[:, 0]
+    return [(k, [int(c)], weights[k].tolist())
+            for k, c in enumerate(cells)]
+
+
+@pytest.mark.parametrize("exact_normaliser", [True, False])
+@pytest.mark.parametrize("max_cost", [None, 300.0])
+@pytest.mark.parametrize("seed", [1, 3, 5])
+def test_within_bound(seed, max_cost, exact_normaliser):
+    surface = fractal_surface((60, 60), seed)
+    features = point_features(surface, 150, seed)
+    exact = summed_influence(surface, features, max_cost=max_cost)
+    approx, info = clustered_influence(
+        surface, features, 8, max_cost=max_cost,
+        exact_normaliser=exact_normaliser)
+    lo, hi = info["max_cost_dist_range"]
+    assert lo <= exact.max_cost_dist*(1 + 1e-12) and \
+        exact.max_cost_dist <= hi*(1 + 1e-12)
+    if exact_normaliser:
+        assert approx.max_cost_dist == pytest.approx(exact.max_cost_dist)
+    stats = error_stats(approx.result(surface), exact.result(surface),
+                        info["error_bound"])
+    assert stats["nodata_mismatch"] == 0
+    assert stats["within_bound"], stats
+
+
+def test_scenarios_within_bound():
+    surface = fractal_surface((48, 48), 11)
+    features = point_features(surface, 80, 11, scenarios=2)
+    exact = summed_influence(surface, features)
+    approx, info = clustered_influence(surface, features, 6)
+    for k in range(2):
+        stats = error_stats(approx.result(surface)[k],
+                            exact.result(surface)[k], info["error_bound"][k])
+        assert stats["within_bound"], stats
+
+
+def test_merged_features_exact():
+    # One feature per cell, repeated: merging alone is exact
+    surface = fractal_surface((40, 40), 2)
+    features = point_features(surface, 30, 2)
+    features += [(k + 100, seeds, weight) for k, seeds, weight in features]
+    exact = summed_influence(surface, features)
+    approx, info = clustered_influence(surface, features, 1)
+    assert info["merged"] == 30 and info["error_bound"] == 0.0
+    numpy.testing.assert_allclose(
+        approx.result(surface), exact.result(surface), atol=1e-9)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_costdist.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Heap search against cost distances worked out by hand on a small grid.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import math
+
+import numpy
+import pytest
+
+from spi.costdist import CostSurface, cost_distance, cost_window
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+NAN = numpy.nan
+ROOT2 = math.sqrt(2.0)
+
+# NaN, the NoData value and a zero cost are all barriers; the bottom-right
+# cell is passable but walled off
+GRID = [[1.0, 3.0, 1.0, 2.0],
+        [2.0, NAN, 4.0, NAN],
+        [1.0, 2.0, NAN, -9999.0],
+        [0.0, NAN, NAN, 5.0]]
+
+# From the top-left cell: an orthogonal step costs the mean of the two
+# cells, a diagonal step sqrt(2) times that
+HAND = [[0.0, 2.0, 4.0, 5.5],
+        [1.5, NAN, 6.5, NAN],
+        [3.0, 1.5 + 2.0*ROOT2, NAN, NAN],
+        [NAN, NAN, NAN, NAN]]
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def hand_surface():
+    return CostSurface(numpy.array(GRID), cell_size=10.0, nodata=-9999.0)
+
+
+def test_hand_computed():
+    surface = hand_surface()
+    numpy.testing.assert_allclose(
+        cost_distance(surface, [0]), HAND, equal_nan=True)
+
+
+def test_steps():
+    surface = CostSurface(numpy.array([[1.0, 3.0], [2.0, 5.0]]))
+    cd = cost_distance(surface, [0])
+    assert cd[0, 1] == pytest.approx(0.5*(1.0 + 3.0))
+    assert cd[1, 0] == pytest.approx(0.5*(1.0 + 2.0))
+    # The diagonal beats both two-step paths (5.0 and 6.0)
+    assert cd[1, 1] == pytest.approx(ROOT2*0.5*(1.0 + 5.0))
+
+
+def test_unreachable():
+    surface = hand_surface()
+    window = cost_window(surface, [0])
+    # The walled-off cell is passable but NaN, as is everything off the
+    # block; the maximum is over reached cells only
+    assert surface.passable()[3, 3]
+    assert numpy.isnan(window.fill)
+    assert window.max_cost_dist == pytest.approx(6.5)
+    # Seeds on barriers are ignored
+    window = cost_window(surface, [5, 11, 12])
+    assert window.block.size == 0 and window.max_cost_dist == 0.0
+    assert numpy.isnan(cost_distance(surface, [5, 11, 12])).all()
+
+
+def test_bounded_window():
+    surface = hand_surface()
+    window = cost_window(surface, [0], max_cost=5.0)
+    # Reached: the costs up to 5 in the top-left 3x3
+    assert (window.row0, window.col0, window.block.shape) == (0, 0, (3, 3))
+    assert window.fill == 5.0 and window.max_cost_dist == 5.0
+    capped = numpy.where(numpy.isnan(HAND), NAN, numpy.minimum(HAND, 5.0))
+    capped[3, 3] = 5.0
+    numpy.testing.assert_allclose(
+        window.expand(surface), capped, equal_nan=True)
+
+
+def test_cap_on_disconnected_cells():
+    # Unlike the unbounded search, a bounded one gives a walled-off
+    # passable cell the cap, and the cap becomes the maximum even when
+    # every connected cell is well within it
+    surface = hand_surface()
+    window = cost_window(surface, [0], max_cost=100.0)
+    assert window.fill == 100.0 and window.max_cost_dist == 100.0
+    assert window.expand(surface)[3, 3] == 100.0
+    numpy.testing.assert_allclose(
+        window.block, numpy.array(HAND)[:3], equal_nan=True)
+
+    values = numpy.array(GRID)
+    values[3, 3] = NAN
+    window = cost_window(CostSurface(values, nodata=-9999.0), [0],
+                         max_cost=100.0)
+    assert window.max_cost_dist == pytest.approx(6.5)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_influence.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Running sums against the naive SPI, sum_i w_i (1 - cd_i / M), from full
+# per-feature cost distance grids.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import numpy
+import pytest
+
+from conftest import make_features, make_surface
+from spi.costdist import CostSurface, cost_distance, cost_window
+from spi.influence import InfluenceAccumulator
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def walled_surface():
+    """The shared test surface with its barrier gap closed"""
+    base = make_surface()
+    values = base.values.copy()
+    row = base.shape[0]//4
+    values[row:row + 2, :] = numpy.nan
+    return CostSurface(values, base.cell_size, base.x_min, base.y_max)
+
+
+def naive_spi(surface, features, max_cost):
+    """SPI from one full grid per feature, NaN wherever any grid is NaN"""
+    grids = [cost_distance(surface, seeds, max_cost)
+             for _, seeds, _ in features]
+    M = max(numpy.nanmax(cd) for cd in grids)
+    return sum(numpy.multiply.outer(numpy.asarray(w, dtype=float),
+                                    1.0 - cd/M)
+               for cd, (_, _, w) in zip(grids, features))
+
+
+@pytest.mark.parametrize("walled", [False, True])
+@pytest.mark.parametrize("scenarios", [None, 3])
+@pytest.mark.parametrize("max_cost", [None, 40.0])
+def test_matches_naive(walled, scenarios, max_cost):
+    surface = walled_surface() if walled else make_surface()
+    features = make_features(surface, 40, scenarios=scenarios)
+    if walled:
+        # All below the wall, so nothing above it is reachable
+        below = surface.shape[1]*(surface.shape[0]//4 + 2)
+        features = [f for f in features if min(f[1]) >= below]
+    features = features[:8]
+    want = naive_spi(surface, features, max_cost)
+
+    full = InfluenceAccumulator(surface.shape, scenarios=scenarios)
+    windowed = InfluenceAccumulator(surface.shape, scenarios=scenarios)
+    windows = [cost_window(surface, seeds, max_cost)
+               for _, seeds, _ in features]
+    for window, (_, seeds, w) in zip(windows, features):
+        full.add(window.expand(surface), w)
+        windowed.add_window(window, w)
+    if walled or max_cost:
+        assert not any(window.covers() for window in windows)
+    if max_cost:
+        # Cells past the threshold go into the scalar offset
+        assert numpy.all(windowed.offset > 0)
+    assert windowed.max_cost_dist == pytest.approx(full.max_cost_dist)
+    for acc in (full, windowed):
+        numpy.testing.assert_allclose(
+            acc.result(surface, chunk_rows=7), want, atol=1e-9,
+            equal_nan=True)
+    if walled and not max_cost:
+        assert numpy.isnan(want[..., :surface.shape[0]//4, :]).all()
+        assert not numpy.isnan(want).all()
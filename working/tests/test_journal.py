@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_journal.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Checkpoint and resume: a run interrupted part-way and resumed from its
+# journal must give the same SPI as an uninterrupted run.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import os
+
+import numpy
+import pytest
+
+from spi.journal import RunJournal, inputs_digest
+from spi.pipeline import summed_influence
+from spi.validate import ValidationError
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+class Crash(Exception):
+    pass
+
+
+def crash_after(n):
+    """Progress callback raising Crash after n features"""
+    seen = []
+
+    def progress(featID, cd_max):
+        seen.append(featID)
+        if len(seen) >= n:
+            raise Crash()
+    return progress
+
+
+def resumed(surface, features, directory, every, crash, workers=1,
+            max_cost=None):
+    """Runs until the crash, then resumes from the journal"""
+    digest = inputs_digest(surface, features, max_cost)
+    with pytest.raises(Crash):
+        summed_influence(
+            surface, features, crash_after(crash), workers=workers,
+            max_cost=max_cost,
+            journal=RunJournal(directory, digest, every=every))
+    journal = RunJournal(directory, digest, every=every)
+    assert 0 < len(journal.done) < len(features)
+    acc = summed_influence(surface, features, workers=workers,
+                           max_cost=max_cost, journal=journal)
+    journal.finish()
+    return acc
+
+
+@pytest.mark.parametrize("max_cost", [None, 40.0])
+def test_resume_serial(surface, features, tmp_path, max_cost):
+    exact = summed_influence(surface, features, max_cost=max_cost)
+    acc = resumed(surface, features, str(tmp_path), 3, 8,
+                  max_cost=max_cost)
+    assert acc.count == len(features)
+    numpy.testing.assert_allclose(
+        acc.result(surface), exact.result(surface), equal_nan=True)
+    assert not os.listdir(str(tmp_path))
+
+
+def test_resume_parallel(surface, features, tmp_path):
+    # Batches of max(every, workers) = 4 features; the crash comes in the
+    # third batch, after two checkpoints
+    exact = summed_influence(surface, features)
+    acc = resumed(surface, features, str(tmp_path), 3, 9, workers=4)
+    assert acc.count == len(features)
+    numpy.testing.assert_allclose(
+        acc.result(surface), exact.result(surface), equal_nan=True)
+
+
+def test_checkpoint_matches_done(surface, features, tmp_path):
+    digest = inputs_digest(surface, features)
+    with pytest.raises(Crash):
+        summed_influence(
+            surface, features, crash_after(9), workers=4,
+            journal=RunJournal(str(tmp_path), digest, every=3))
+    journal = RunJournal(str(tmp_path), digest)
+    assert journal.state["count"] == len(journal.done)
+
+
+def test_changed_inputs_refused(surface, features, tmp_path):
+    digest = inputs_digest(surface, features)
+    journal = RunJournal(str(tmp_path), digest)
+    journal.checkpoint(
+        summed_influence(surface, features[:4], journal=journal))
+    changed = [(f, s, w + 1.0) for f, s, w in features]
+    with pytest.raises(ValidationError):
+        RunJournal(str(tmp_path), inputs_digest(surface, changed))
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_output.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# One-pass SPI outputs, read back: GeoTIFF tags and coordinate system,
+# tiles, predictor, overviews and the BigTIFF layout, and the .aux.xml
+# statistics.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import re
+import struct
+import zlib
+
+import numpy
+import pytest
+
+from conftest import UTM33, make_features, make_surface
+from spi import output
+from spi.costdist import CostSurface
+from spi.output import TiledTiffWriter, halve, output_values, save_result
+from spi.pipeline import summed_influence
+
+
+##############################################################################
+# GLOBAL VARIABLES
+##############################################################################
+WGS84 = (
+    'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,'
+    '298.257223563]],PRIMEM["Greenwich",0],UNIT["degree",'
+    '0.0174532925199433],AUTHORITY["EPSG","4326"]]')
+CUSTOM = (
+    'PROJCS["Custom_Albers",GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984",'
+    'SPHEROID["WGS_1984",6378137.0,298.257223563]],PRIMEM["Greenwich",0.0],'
+    'UNIT["Degree",0.0174532925199433]],PROJECTION["Albers"],'
+    'UNIT["Meter",1.0]]')
+
+# struct formats of the TIFF field types
+TYPES = {2: "s", 3: "H", 4: "I", 12: "d", 16: "Q"}
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def read_tiff(path):
+    """Image file directories of a little-endian (Big)TIFF as tag dicts"""
+    with open(path, "rb") as f:
+        data = f.read()
+    assert data[:2] == b"II"
+    big = struct.unpack_from("<H", data, 2)[0] == 43
+    count_fmt, entry_fmt, ptr_fmt = ("<Q", "<HHQ", "<Q") if big else \
+        ("<H", "<HHI", "<I")
+    inline = 8 if big else 4
+    pos = struct.unpack_from(ptr_fmt, data, 8 if big else 4)[0]
+    ifds = []
+    while pos:
+        count = struct.unpack_from(count_fmt, data, pos)[0]
+        at = pos + struct.calcsize(count_fmt)
+        tags = {}
+        for _ in range(count):
+            tag, code, n = struct.unpack_from(entry_fmt, data, at)
+            at += struct.calcsize(entry_fmt)
+            fmt = TYPES[code]
+            size = struct.calcsize("<%d%s" % (n, fmt))
+            where = at
+            if size > inline:
+                where = struct.unpack_from(ptr_fmt, data, at)[0]
+            if fmt == "s":
+                tags[tag] = data[where:where + n].rstrip(b"\0").decode()
+            else:
+                tags[tag] = list(struct.unpack_from(
+                    "<%d%s" % (n, fmt), data, where))
+            at += inline
+        ifds.append(tags)
+        pos = struct.unpack_from(ptr_fmt, data, at)[0]
+    return big, ifds, data
+
+
+def unpredict(raw, rows, cols, integer):
+    """Tile values from deflated bytes, undoing the TIFF predictor"""
+    raw = zlib.decompress(raw)
+    if integer:
+        diff = numpy.frombuffer(raw, dtype="<i4").reshape(rows, cols)
+        return numpy.cumsum(diff, axis=1, dtype=numpy.int32)
+    diff = numpy.frombuffer(raw, dtype=numpy.uint8).reshape(rows, 4*cols)
+    planes = numpy.cumsum(diff, axis=1, dtype=numpy.uint8)
+    planes = planes.reshape(rows, 4, cols).transpose(0, 2, 1)[:, :, ::-1]
+    return numpy.ascontiguousarray(planes).view("<f4").reshape(rows, cols)
+
+
+def read_image(tags, data):
+    """(bands, rows, columns) values of one tiled directory"""
+    rows, cols, size = tags[257][0], tags[256][0], tags[322][0]
+    bands = tags[277][0]
+    integer = tags[339][0] == 2
+    down, across = -(-rows//size), -(-cols//size)
+    out = numpy.empty((bands, down*size, across*size),
+                      dtype="<i4" if integer else "<f4")
+    tiles = zip(tags[324], tags[325])
+    for band in range(bands):
+        for i in range(down):
+            for j in range(across):
+                offset, count = next(tiles)
+                out[band, i*size:(i + 1)*size, j*size:(j + 1)*size] = \
+                    unpredict(data[offset:offset + count], size, size,
+                              integer)
+    return out[:, :rows, :cols]
+
+
+def write_tiff(path, values, integer=False, tile=16, rows_at=7):
+    """Writes (bands, rows, columns) values a few rows at a time"""
+    writer = TiledTiffWriter(path, CostSurface(values[0]), len(values),
+                             integer, tile=tile)
+    for row in range(0, values.shape[1], rows_at):
+        writer.write(values[:, row:row + rows_at])
+    writer.close()
+
+
+def random_bands(bands=2, shape=(37, 50), seed=4):
+    rng = numpy.random.default_rng(seed)
+    values = rng.uniform(-50.0, 120.0, (bands,) + shape)
+    values[rng.random(values.shape) < 0.1] = numpy.nan
+    return values
+
+
+def aux_stats(path):
+    """STATISTICS_* values per band from an .aux.xml file"""
+    with open(path + ".aux.xml") as f:
+        bands = f.read().split("<PAMRasterBand")[1:]
+    return [dict((k, float(v)) for k, v in re.findall(
+        r'<MDI key="STATISTICS_(\w+)">([^<]+)</MDI>', band))
+        for band in bands]
+
+
+def geo_key_dict(values):
+    """GeoKeyDirectoryTag values as {key: value}"""
+    return dict((values[k], values[k + 3])
+                for k in range(4, len(values), 4))
+
+
+def spi_output(tmp_path, surface, name="spi.tif", **kw):
+    features = make_features(surface, 6)
+    acc = summed_influence(surface, features)
+    path = str(tmp_path/name)
+    save_result(acc, surface, path, **kw)
+    return path, acc
+
+
+@pytest.mark.parametrize("wkt, keys", [
+    (UTM33, {1024: 1, 1025: 1, 3072: 32633}),
+    (WGS84, {1024: 2, 1025: 1, 2048: 4326}),
+    (CUSTOM, {1024: 1, 1025: 1}),
+    (None, {1025: 1}),
+])
+def test_geokeys(tmp_path, wkt, keys):
+    base = make_surface()
+    surface = CostSurface(base.values, base.cell_size, base.x_min,
+                          base.y_max, spatial_ref=wkt)
+    path, _ = spi_output(tmp_path, surface)
+    _, ifds, _ = read_tiff(path)
+    assert geo_key_dict(ifds[0][34735]) == keys
+    assert ifds[0][33922][3:5] == [base.x_min, base.y_max]
+    with open(path + ".aux.xml") as f:
+        aux = f.read()
+    if wkt:
+        # The full definition, for coordinate systems without a code
+        assert "<SRS>%s</SRS>" % wkt in aux
+    else:
+        assert "<SRS>" not in aux
+
+
+@pytest.mark.parametrize("integer", [False, True])
+@pytest.mark.parametrize("bands", [1, 2])
+def test_tiles_and_overviews(tmp_path, integer, bands):
+    values = random_bands(bands)
+    path = str(tmp_path/"out.tif")
+    write_tiff(path, values, integer)
+    big, ifds, data = read_tiff(path)
+    assert not big
+    # 37x50 in 16-cell tiles, then overviews until one tile covers a level
+    assert [(t[257][0], t[256][0]) for t in ifds] == \
+        [(37, 50), (19, 25), (10, 13)]
+    assert [t[254][0] for t in ifds] == [0, 1, 1]
+    expected = values
+    for tags in ifds:
+        assert (tags[322][0], tags[323][0]) == (16, 16)
+        assert tags[317] == [2 if integer else 3]
+        assert tags[339] == [2 if integer else 3]*bands
+        assert len(tags[324]) == bands*(-(-tags[257][0]//16))*(
+            -(-tags[256][0]//16))
+        numpy.testing.assert_array_equal(
+            read_image(tags, data), output_values(expected, integer))
+        expected = halve(expected)
+    assert float(ifds[0][42113]) == output.OUT_NODATA
+
+
+def test_bigtiff(tmp_path, monkeypatch):
+    values = random_bands(1)
+    write_tiff(str(tmp_path/"classic.tif"), values)
+    monkeypatch.setattr(output, "BIGTIFF_BYTES", values.size)
+    write_tiff(str(tmp_path/"big.tif"), values)
+    # The switch is on the uncompressed size, strictly above the limit
+    monkeypatch.setattr(output, "BIGTIFF_BYTES", values.size*4)
+    write_tiff(str(tmp_path/"edge.tif"), values)
+    classic, big, edge = [read_tiff(str(tmp_path/name)) for name in
+                          ("classic.tif", "big.tif", "edge.tif")]
+    assert (classic[0], big[0], edge[0]) == (False, True, False)
+    assert len(big[1]) == len(classic[1])
+    for tags, want in zip(big[1], classic[1]):
+        # Same tags, only the tile offsets move
+        assert sorted(tags) == sorted(want)
+        assert all(tags[k] == want[k] for k in tags if k != 324)
+        numpy.testing.assert_array_equal(
+            read_image(tags, big[2]), read_image(want, classic[2]))
+
+
+def test_halve():
+    block = numpy.array([[[1.0, 3.0, 5.0],
+                          [numpy.nan, 8.0, 7.0],
+                          [2.0, 4.0, numpy.nan]]])
+    numpy.testing.assert_array_equal(
+        halve(block), [[[4.0, 6.0], [3.0, numpy.nan]]])
+
+
+@pytest.mark.parametrize("integer", [False, True])
+def test_predict(integer):
+    values = output_values(random_bands(1, (5, 9))[0], integer)
+    dtype = numpy.dtype("<i4" if integer else "<f4")
+    raw = zlib.compress(output.predict(values, dtype))
+    numpy.testing.assert_array_equal(unpredict(raw, 5, 9, integer), values)
+
+
+@pytest.mark.parametrize("integer", [False, True])
+@pytest.mark.parametrize("scenarios", [None, 2])
+def test_aux_statistics(tmp_path, integer, scenarios):
+    surface = make_surface()
+    features = make_features(surface, 6, scenarios=scenarios)
+    acc = summed_influence(surface, features, max_cost=200.0)
+    path = str(tmp_path/"spi.tif")
+    save_result(acc, surface, path, integer=integer)
+    spi = acc.result(surface).reshape((-1,) + surface.shape)
+    for band, st in zip(spi, aux_stats(path)):
+        values = output_values(band, integer).astype(numpy.float64)
+        values[numpy.isnan(band)] = numpy.nan
+        assert st["MINIMUM"] == pytest.approx(numpy.nanmin(values))
+        assert st["MAXIMUM"] == pytest.approx(numpy.nanmax(values))
+        assert st["MEAN"] == pytest.approx(numpy.nanmean(values))
+        assert st["STDDEV"] == pytest.approx(numpy.nanstd(values))
+        assert st["VALID_PERCENT"] == pytest.approx(
+            100.0*numpy.isfinite(values).mean())
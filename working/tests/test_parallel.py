@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_parallel.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Process pool against the serial loop, with and without partial sums in
+# the workers, and a worker dying mid-run.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import os
+
+import numpy
+import pytest
+
+from conftest import make_features
+from spi import parallel
+from spi.influence import InfluenceAccumulator
+from spi.parallel import parallel_summed_influence
+from spi.pipeline import summed_influence
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+class HardExit(object):
+    """Weight that kills the worker process unpickling it"""
+    def __reduce__(self):
+        return (os._exit, (3,))
+
+
+def test_matches_serial(surface, features):
+    exact = summed_influence(surface, features, max_cost=40.0)
+    acc = parallel_summed_influence(surface, features, 3, max_cost=40.0)
+    assert acc.count == len(features)
+    assert acc.max_cost_dist == pytest.approx(exact.max_cost_dist)
+    # Partial sums are added in a different order
+    numpy.testing.assert_allclose(
+        acc.result(surface), exact.result(surface), atol=1e-9,
+        equal_nan=True)
+
+
+@pytest.mark.parametrize("scenarios", [None, 2])
+@pytest.mark.parametrize("max_cost", [None, 40.0])
+def test_windows_to_parent(surface, scenarios, max_cost):
+    features = make_features(surface, 10, scenarios=scenarios)
+    exact = summed_influence(surface, features, max_cost=max_cost)
+    kept = []
+    weighted = numpy.zeros(exact.weighted.shape)
+    acc = parallel_summed_influence(
+        surface, features, 2, max_cost=max_cost, weighted=weighted,
+        scenarios=scenarios, keep=lambda featID, w: kept.append(featID),
+        partials=False)
+    assert acc.weighted is weighted
+    assert acc.count == len(features) and len(kept) == len(features)
+    assert acc.max_cost_dist == pytest.approx(exact.max_cost_dist)
+    numpy.testing.assert_allclose(
+        acc.result(surface), exact.result(surface), atol=1e-9,
+        equal_nan=True)
+
+
+def test_partials_need_memory(surface, features, monkeypatch):
+    # No room for the partial sums: the parent adds the windows (the
+    # workers are spawned, so they do not see the patches)
+    monkeypatch.setattr(parallel, "available_memory", lambda: 1024)
+    assert parallel.partial_bytes(surface, 2) == 2*surface.size*8
+    added = []
+    add_window = InfluenceAccumulator.add_window
+    monkeypatch.setattr(
+        InfluenceAccumulator, "add_window",
+        lambda self, window, weight: added.append(window) or add_window(
+            self, window, weight))
+    acc = parallel_summed_influence(surface, features, 2)
+    assert len(added) == len(features)
+    monkeypatch.undo()
+    numpy.testing.assert_allclose(
+        acc.result(surface), summed_influence(surface, features).result(
+            surface), atol=1e-9, equal_nan=True)
+
+
+def test_dead_worker_raises(surface, features):
+    features = features + [(99, features[0][1], HardExit())]
+    with pytest.raises(RuntimeError, match="exited with code 3"):
+        parallel_summed_influence(surface, features, 2)
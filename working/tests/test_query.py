@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_query.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# SPI at sample sites against the full SPI surface from the heap engine,
+# and site searches stopping at each feature's nearest cell.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import numpy
+import pytest
+
+from conftest import make_features
+from spi.costdist import CostSurface
+from spi.pipeline import summed_influence
+from spi.query import query_sites, site_distances
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def sample_sites(surface, count=40, seed=9):
+    """Random cells, NoData ones included, and one site off the raster"""
+    rng = numpy.random.default_rng(seed)
+    cells = rng.choice(surface.size, count, replace=False)
+    nodata = numpy.flatnonzero(~surface.passable())[:3]
+    cells = numpy.concatenate([cells, nodata, [-1]])
+    return [("s%d" % k, int(c)) for k, c in enumerate(cells)]
+
+
+def at_sites(grid, sites):
+    """Values of a (rows, cols) or (K, rows, cols) grid at the sites"""
+    flat = grid.reshape(grid.shape[:-2] + (-1,))
+    return numpy.stack([flat[..., c] if c >= 0 else flat[..., 0]*numpy.nan
+                        for _, c in sites])
+
+
+@pytest.mark.parametrize("scenarios", [None, 2])
+@pytest.mark.parametrize("max_cost", [None, 40.0, 1e6])
+def test_matches_full_grid(surface, scenarios, max_cost):
+    features = make_features(surface, 10, scenarios=scenarios)
+    sites = sample_sites(surface)
+    exact = summed_influence(surface, features, max_cost=max_cost)
+    values, info = query_sites(surface, features, sites, max_cost=max_cost)
+    assert info["normaliser"] == pytest.approx(exact.max_cost_dist)
+    want = at_sites(exact.result(surface), sites)
+    assert numpy.isnan(values[-4:]).all()
+    numpy.testing.assert_allclose(values, want, atol=1e-9, equal_nan=True)
+
+
+def test_given_normaliser(surface, features):
+    exact = summed_influence(surface, features)
+    sites = sample_sites(surface)
+    values, info = query_sites(surface, features, sites,
+                               normaliser=exact.max_cost_dist)
+    assert info["normaliser_source"] == "given"
+    # One search per passable site, none for the normaliser
+    passable = surface.passable().reshape(-1)
+    assert info["searches"] == sum(
+        1 for _, c in sites if c >= 0 and passable[c])
+    numpy.testing.assert_allclose(
+        values, at_sites(exact.result(surface), sites), atol=1e-9,
+        equal_nan=True)
+
+
+def test_search_stops_at_nearest_cell():
+    surface = CostSurface(numpy.ones((50, 50)))
+    # Feature 0 has a cell next to the site and one in the far corner
+    owners = {51: [0], 2499: [0], 53: [1]}
+    stats = {}
+    found = site_distances(surface, 52, owners, 2, stats=stats)
+    assert found == {0: 1.0, 1: 1.0}
+    # Settled within one step of the site, not out to the corner
+    assert stats["settled"] <= 9
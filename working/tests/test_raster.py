@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_raster.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# ENVI rasters written and read back: cell type, byte order,
+# georeferencing, NoData and coordinate system.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import numpy
+import pytest
+
+from conftest import UTM33
+from spi import raster
+from spi.costdist import CostSurface
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+@pytest.mark.parametrize("dtype", ["<f4", ">f4", "<f8", ">i2", "<i4",
+                                   "u1", "<u2"])
+def test_round_trip(tmp_path, dtype):
+    rng = numpy.random.default_rng(1)
+    values = (rng.random((7, 11))*100).astype(dtype)
+    georef = CostSurface(values, 25.0, 1000.5, 7000.25,
+                         spatial_ref=UTM33)
+    path = str(tmp_path/"cost.dat")
+    raster.write_envi(path, values, georef, nodata=3)
+
+    surface = raster.read_envi(path)
+    assert surface.values.dtype == numpy.dtype(dtype).newbyteorder("=")
+    numpy.testing.assert_array_equal(surface.values, values)
+    assert (surface.cell_size, surface.x_min, surface.y_max) == \
+        (25.0, 1000.5, 7000.25)
+    assert surface.nodata == 3.0
+    assert surface.spatial_ref == UTM33 and surface.epsg == 32633
+
+
+def test_no_coordinate_system(tmp_path):
+    values = numpy.ones((3, 4), dtype=numpy.float32)
+    path = str(tmp_path/"cost.dat")
+    raster.write_envi(path, values, CostSurface(values))
+    surface = raster.read_envi(path)
+    assert surface.spatial_ref is None and surface.epsg is None
+    assert surface.nodata is None
+
+
+def test_multiline_header(tmp_path):
+    # Headers from other software may wrap long values over lines
+    values = numpy.arange(12, dtype="<f4").reshape(3, 4)
+    values.tofile(str(tmp_path/"cost.dat"))
+    with open(str(tmp_path/"cost.hdr"), "w") as f:
+        f.write("ENVI\nsamples = 4\nlines = 3\nbands = 1\n"
+                "data type = 4\nbyte order = 0\n"
+                "map info = {Arbitrary, 1.5, 1.5, 10.0,\n  20.0, 2.0, "
+                "2.0}\ncoordinate system string = {%s,\n %s}\n" % tuple(
+                    UTM33.split(",", 1)))
+    surface = raster.read_envi(str(tmp_path/"cost.dat"))
+    assert (surface.x_min, surface.y_max) == (9.0, 21.0)
+    assert surface.epsg == 32633
+    numpy.testing.assert_array_equal(surface.values, values)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_rasterize.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Polygon and line seed cells against hand-worked cases and brute force.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import numpy
+import pytest
+
+from spi.costdist import CostSurface
+from spi.rasterize import line_cells, polygon_cells, segment_cells
+from spi.validate import point_cells
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def grid(shape=(10, 10)):
+    """Unit cells, the top-left corner at (0, 10)"""
+    return CostSurface(numpy.ones(shape), cell_size=1.0, x_min=0.0,
+                       y_max=10.0)
+
+
+def cells(rows_cols, ncols=10):
+    return sorted(r*ncols + c for r, c in rows_cols)
+
+
+def inside(rings, x, y):
+    """Even-odd point in polygon test"""
+    hit = False
+    for ring in rings:
+        for (xa, ya), (xb, yb) in zip(ring, ring[1:] + ring[:1]):
+            if (ya > y) != (yb > y) and \
+                    x < xa + (y - ya)*(xb - xa)/(yb - ya):
+                hit = not hit
+    return hit
+
+
+def test_polygon_centres():
+    surface = grid()
+    box = [(1.2, 5.4), (3.6, 5.4), (3.6, 7.7), (1.2, 7.7)]
+    # Centres at x 1.5-3.5 and y 5.5-7.5, i.e. rows 2-4 and columns 1-3
+    want = cells((r, c) for r in range(2, 5) for c in range(1, 4))
+    assert polygon_cells(surface, [box]).tolist() == want
+    # A hole around the middle centre drops just that cell
+    hole = [(2.2, 6.2), (2.8, 6.2), (2.8, 6.8), (2.2, 6.8)]
+    want.remove(3*10 + 2)
+    assert polygon_cells(surface, [box, hole]).tolist() == want
+
+
+def test_polygon_brute_force():
+    surface = grid((20, 30))
+    rng = numpy.random.default_rng(2)
+    for _ in range(10):
+        angles = numpy.sort(rng.uniform(0, 2*numpy.pi, 7))
+        radius = rng.uniform(2.0, 9.0, 7)
+        cx, cy = rng.uniform(0.0, 30.0), rng.uniform(-5.0, 15.0)
+        ring = list(zip(cx + radius*numpy.cos(angles),
+                        cy + radius*numpy.sin(angles)))
+        want = [r*30 + c for r in range(20) for c in range(30)
+                if inside([ring], c + 0.5, 10.0 - r - 0.5)]
+        assert polygon_cells(surface, [ring]).tolist() == want
+
+
+def test_polygon_vertex_fallback():
+    surface = grid()
+    # Inside one cell, clear of its centre
+    tiny = [(4.1, 6.1), (4.3, 6.1), (4.2, 6.3)]
+    assert polygon_cells(surface, [tiny]).tolist() == cells([(3, 4)])
+    # Across a cell edge, clear of both centres
+    sliver = [(4.8, 6.1), (5.2, 6.1), (5.2, 6.2), (4.8, 6.2)]
+    assert polygon_cells(surface, [sliver]).tolist() == \
+        cells([(3, 4), (3, 5)])
+    # Off the raster
+    assert polygon_cells(surface, [[(20, 20), (21, 20), (21, 21)]]).size == 0
+
+
+@pytest.mark.parametrize("path, want", [
+    # Along row 4
+    ([(0.5, 5.5), (9.5, 5.5)], [(4, c) for c in range(10)]),
+    # Entering and leaving the raster
+    ([(-5.0, 5.5), (15.0, 5.5)], [(4, c) for c in range(10)]),
+    ([(-5.0, 5.5), (-1.0, 5.5)], []),
+    # Through a corner: the cells it only touches are left out
+    ([(0.0, 10.0), (2.0, 8.0)], [(0, 0), (1, 1)]),
+    # Clipping the corner of a cell by a twentieth of a cell
+    ([(0.5, 9.45), (1.5, 10.45)], [(0, 0), (0, 1)]),
+    # Single vertex
+    ([(3.5, 3.5)], [(6, 3)]),
+])
+def test_line_cases(path, want):
+    assert line_cells(grid(), [path]).tolist() == cells(want)
+
+
+def test_line_brute_force():
+    surface = grid((20, 30))
+    rng = numpy.random.default_rng(6)
+    for _ in range(20):
+        xa, xb = rng.uniform(-3.0, 33.0, 2)
+        ya, yb = rng.uniform(-3.0, 13.0, 2)
+        t = numpy.linspace(0.0, 1.0, 200001)
+        idx = point_cells(surface, xa + t*(xb - xa), ya + t*(yb - ya))
+        want = numpy.unique(idx[idx >= 0])
+        got = segment_cells(surface, xa, ya, xb, yb)
+        assert len(got) == len(set(got.tolist()))
+        assert numpy.array_equal(numpy.sort(got), want)
+        # In order along the segment: each cell next to the one before
+        rows, cols = numpy.divmod(got, 30)
+        assert (numpy.abs(numpy.diff(rows)) <= 1).all()
+        assert (numpy.abs(numpy.diff(cols)) <= 1).all()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_sweep.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Batched sweeps against the heap engine, and batch planning against the
+# memory budget.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import numpy
+import pytest
+
+from conftest import make_features, make_surface
+from spi.costdist import CostSurface, cost_distance
+from spi.pipeline import summed_influence
+from spi.sweep import (plan_batches, reach_cells, seed_box,
+                       sweep_distances, sweep_influence)
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+@pytest.mark.parametrize("max_cost", [None, 40.0])
+def test_distances_match_heap(surface, features, max_cost):
+    row0, col0, stack, fill, maxima = sweep_distances(
+        surface, [f[1] for f in features], max_cost)
+    for k, (_, seeds, _) in enumerate(features):
+        full = numpy.full(surface.shape, fill)
+        full[row0:row0 + stack.shape[1], col0:col0 + stack.shape[2]] = \
+            stack[k]
+        full[~surface.passable()] = numpy.nan
+        numpy.testing.assert_allclose(
+            full, cost_distance(surface, seeds, max_cost), equal_nan=True)
+
+
+@pytest.mark.parametrize("max_cost", [None, 40.0])
+def test_influence_matches_heap(surface, max_cost):
+    features = make_features(surface, 10, scenarios=2)
+    exact = summed_influence(surface, features, max_cost=max_cost)
+    # A tiny budget forces many small batches
+    acc = sweep_influence(surface, features, max_cost=max_cost,
+                          batch_bytes=3*24*surface.size)
+    assert acc.max_cost_dist == pytest.approx(exact.max_cost_dist)
+    numpy.testing.assert_allclose(
+        acc.result(surface), exact.result(surface), equal_nan=True)
+
+
+def test_batches_within_budget():
+    # A wide raster with a short reach: raster order would put features
+    # from many full-width rows in one batch
+    surface = CostSurface(numpy.ones((2000, 2000)))
+    rng = numpy.random.default_rng(7)
+    sources = [[int(c)] for c in rng.choice(surface.size, 3000,
+                                            replace=False)]
+    budget = 64*1024**2
+    reach = reach_cells(surface, 200.0)
+    batches = plan_batches(surface, sources, 200.0, budget)
+    assert sorted(k for b in batches for k in b) == list(range(3000))
+    for batch in batches:
+        boxes = [seed_box(surface, sources[k], reach) for k in batch]
+        cells = ((max(b[2] for b in boxes) - min(b[0] for b in boxes)) *
+                 (max(b[3] for b in boxes) - min(b[1] for b in boxes)))
+        assert len(batch) == 1 or 24*cells*len(batch) <= budget
+
+
+def test_unseeded_batch():
+    surface = make_surface(barrier=False)
+    features = [(0, [], 1.0), (1, [], 2.0)]
+    acc = sweep_influence(surface, features, max_cost=20.0)
+    exact = summed_influence(surface, features, max_cost=20.0)
+    numpy.testing.assert_allclose(
+        acc.result(surface), exact.result(surface), equal_nan=True)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# test_validate.py
+# part of the CGA SPI toolbox (see myspi.pyt)
+#
+# VERSION:   2.1
+# LAST EDIT: 2026-10-18
+#
+# Pre-flight checks on the rasterised source cells.
+#
+##############################################################################
+# REQUIRED MODULES
+##############################################################################
+import numpy
+import pytest
+
+from spi import rasterize
+from spi.costdist import CostSurface
+from spi.validate import ValidationError, check_features
+
+
+##############################################################################
+# FUNCTIONS
+##############################################################################
+def test_line_through_nodata_passes():
+    # A line whose middle (and centroid) lies on NoData still has
+    # passable source cells at both ends
+    values = numpy.ones((10, 10))
+    values[:, 4:6] = numpy.nan
+    surface = CostSurface(values, cell_size=1.0, x_min=0.0, y_max=10.0)
+    seeds = rasterize.line_cells(surface, [[(0.5, 5.5), (9.5, 5.5)]])
+    assert not numpy.isnan(values.reshape(-1)[seeds]).all()
+    check_features(surface, [1], seeds=[seeds])
+
+
+def test_unseeded_feature_rejected():
+    values = numpy.ones((10, 10))
+    values[:, 4:6] = numpy.nan
+    surface = CostSurface(values, cell_size=1.0, x_min=0.0, y_max=10.0)
+    seeds = [numpy.array([4, 15]), numpy.array([0])]
+    with pytest.raises(ValidationError) as err:
+        check_features(surface, [7, 8], weights=[1.0, 2.0], seeds=seeds)
+    assert err.value.errorType == "NoDataFeatsError"
+    assert err.value.ids == [7]